@@ -0,0 +1,211 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+
+@dataclass
+class ArchitectureAdapter:
+    """
+    Parameter naming of a decoder architecture, as suffixes of the parameter names
+    (e.g., `self_attn.q_proj.weight`), for profiling, pruning and quantization.
+
+    - `input_linears`: layernorm -> the linears it feeds, smoothed into the layernorm.
+    - `output_linears`: linear -> the linear whose output rows absorb its input smoothing.
+    - `plain_linears`: linears quantized without smoothing.
+    - `fused_linears`: linear -> the fused linear the engine loads it into.
+    - `expert_linears`: MoE expert linears (`...experts.{e}.<suffix>`), quantized
+      without smoothing and profiled stacked over the experts.
+    - `exclude`: substrings of parameters that are never quantized.
+    """
+
+    name: str
+    model_types: List[str]
+    input_linears: Dict[str, List[str]]
+    output_linears: Dict[str, str] = field(default_factory=dict)
+    plain_linears: List[str] = field(default_factory=list)
+    fused_linears: Dict[str, str] = field(default_factory=dict)
+    expert_linears: List[str] = field(default_factory=list)
+    exclude: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.smoothed_by = {linear: norm for norm, linears in self.input_linears.items() for linear in linears}
+        self.output_sources = set(self.output_linears.values())
+        # linear observed during calibration -> where its input smoothing goes
+        self.calibration_inputs = {linears[0]: norm for norm, linears in self.input_linears.items()}
+        self.calibration_inputs.update(self.output_linears)
+
+        suffixes = set(self.input_linears) | set(self.smoothed_by) | set(self.output_linears) | set(self.plain_linears)
+        # longest first, so that no suffix shadows a longer one ending the same way
+        alternatives = '|'.join(re.escape(s) for s in sorted(suffixes, key=len, reverse=True))
+        self._index = re.compile(rf'(?P<prefix>(?:.*\.)?)(?P<suffix>{alternatives})')
+        self._exclude = re.compile('|'.join(re.escape(e) for e in self.exclude)) if self.exclude else None
+        experts = '|'.join(re.escape(s) for s in sorted(self.expert_linears, key=len, reverse=True))
+        self._expert_index = re.compile(rf'(?P<prefix>(?:.*\.)?experts\.)(?:(?P<expert>\d+)\.)?(?P<suffix>{experts})') \
+            if self.expert_linears else None
+
+    def match(self, name):
+        """`(prefix, suffix)` of a parameter named by a declared suffix, else None."""
+        m = self._index.fullmatch(name)
+        return None if m is None else (m.group('prefix'), m.group('suffix'))
+
+    def expert_match(self, name):
+        """
+        `(stacked_name, expert)` of a per-expert weight (`...experts.3.gate_proj.weight`),
+        `(stacked_name, None)` of a stacked one (`...experts.gate_proj.weight`), else None.
+        """
+        m = self._expert_index.fullmatch(name) if self._expert_index is not None else None
+        if m is None or self.excluded(name):
+            return None
+        expert = m.group('expert')
+        return m.group('prefix') + m.group('suffix'), None if expert is None else int(expert)
+
+    def excluded(self, name):
+        return self._exclude is not None and self._exclude.search(name) is not None
+
+    def matches(self, names):
+        """`{name: (prefix, suffix)}` of the declared, non-excluded parameters among `names`."""
+        matched = dict()
+        for name in names:
+            m = self.match(name)
+            if m is not None and not self.excluded(name):
+                matched[name] = m
+        return matched
+
+    def fused_linear_of(self, name):
+        """Name of the (fused) engine linear a weight is loaded into, without the `.weight` suffix."""
+        m = self.match(name)
+        if m is not None and m[1] in self.fused_linears:
+            return m[0] + self.fused_linears[m[1]]
+        return name[:-len('.weight')] if name.endswith('.weight') else name
+
+
+_expert_pattern = re.compile(r'(?P<prefix>.*\.experts\.)(?P<expert>\d+)\.(?P<suffix>.+)')
+
+
+def split_expert(name):
+    """`(stacked_name, expert)` of a per-expert MoE weight, e.g., `(...experts.gate_proj.weight, 3)`, else None."""
+    m = _expert_pattern.fullmatch(name)
+    return None if m is None else (m.group('prefix') + m.group('suffix'), int(m.group('expert')))
+
+
+LLAMA_ADAPTER = ArchitectureAdapter(
+    name='llama',
+    model_types=['llama', 'mistral', 'qwen2', 'qwen3'],
+    input_linears={
+        'input_layernorm.weight': ['self_attn.q_proj.weight', 'self_attn.k_proj.weight', 'self_attn.v_proj.weight'],
+        'post_attention_layernorm.weight': ['mlp.gate_proj.weight', 'mlp.up_proj.weight'],
+    },
+    output_linears={'mlp.down_proj.weight': 'mlp.up_proj.weight'},
+    plain_linears=['self_attn.o_proj.weight'],
+    fused_linears={
+        'self_attn.q_proj.weight': 'self_attn.qkv_proj',
+        'self_attn.k_proj.weight': 'self_attn.qkv_proj',
+        'self_attn.v_proj.weight': 'self_attn.qkv_proj',
+        'mlp.gate_proj.weight': 'mlp.gate_up_proj',
+        'mlp.up_proj.weight': 'mlp.gate_up_proj',
+    },
+    exclude=['bias', 'lm_head.weight', 'model.norm.weight', 'embed_tokens'],
+)
+
+# checkpoints store q/k/v and gate/up fused; down_proj takes the product of the
+# gate and up halves, which cannot absorb a smoothing of the up rows alone
+PHI3_ADAPTER = ArchitectureAdapter(
+    name='phi3',
+    model_types=['phi3'],
+    input_linears={
+        'input_layernorm.weight': ['self_attn.qkv_proj.weight'],
+        'post_attention_layernorm.weight': ['mlp.gate_up_proj.weight'],
+    },
+    plain_linears=['self_attn.o_proj.weight', 'mlp.down_proj.weight'],
+    exclude=['bias', 'lm_head.weight', 'model.norm.weight', 'embed_tokens'],
+)
+
+# MLP inputs stay unsmoothed: the router, shared expert and every expert read them
+QWEN_MOE_ADAPTER = ArchitectureAdapter(
+    name='qwen_moe',
+    model_types=['qwen2_moe', 'qwen3_moe'],
+    input_linears={
+        'input_layernorm.weight': ['self_attn.q_proj.weight', 'self_attn.k_proj.weight', 'self_attn.v_proj.weight'],
+    },
+    plain_linears=[
+        'self_attn.o_proj.weight',
+        'mlp.shared_expert.gate_proj.weight',
+        'mlp.shared_expert.up_proj.weight',
+        'mlp.shared_expert.down_proj.weight',
+    ],
+    fused_linears={
+        'self_attn.q_proj.weight': 'self_attn.qkv_proj',
+        'self_attn.k_proj.weight': 'self_attn.qkv_proj',
+        'self_attn.v_proj.weight': 'self_attn.qkv_proj',
+        'mlp.shared_expert.gate_proj.weight': 'mlp.shared_expert.gate_up_proj',
+        'mlp.shared_expert.up_proj.weight': 'mlp.shared_expert.gate_up_proj',
+    },
+    expert_linears=['gate_proj.weight', 'up_proj.weight', 'down_proj.weight'],
+    exclude=['bias', 'lm_head.weight', 'model.norm.weight', 'embed_tokens', 'mlp.gate.weight', 'shared_expert_gate'],
+)
+
+MIXTRAL_ADAPTER = ArchitectureAdapter(
+    name='mixtral',
+    model_types=['mixtral'],
+    input_linears={
+        'input_layernorm.weight': ['self_attn.q_proj.weight', 'self_attn.k_proj.weight', 'self_attn.v_proj.weight'],
+    },
+    plain_linears=['self_attn.o_proj.weight'],
+    fused_linears={
+        'self_attn.q_proj.weight': 'self_attn.qkv_proj',
+        'self_attn.k_proj.weight': 'self_attn.qkv_proj',
+        'self_attn.v_proj.weight': 'self_attn.qkv_proj',
+    },
+    expert_linears=['w1.weight', 'w2.weight', 'w3.weight'],
+    exclude=['bias', 'lm_head.weight', 'model.norm.weight', 'embed_tokens', 'block_sparse_moe.gate.weight'],
+)
+
+_adapters = dict()
+
+
+def register_adapter(adapter):
+    """Register `adapter` under its name and model types (`config.model_type`)."""
+    for key in [adapter.name] + list(adapter.model_types):
+        _adapters[key] = adapter
+    return adapter
+
+
+def get_adapter(model_type):
+    if model_type not in _adapters:
+        raise ValueError(
+            f"no flash_rl architecture adapter for {model_type}, "
+            f"register one with flash_rl.adapters.register_adapter (known: {registered_adapters()})"
+        )
+    return _adapters[model_type]
+
+
+def registered_adapters():
+    """Names and model types with a registered adapter."""
+    return sorted(_adapters)
+
+
+def adapter_for(names, model_type=None):
+    """
+    Adapter of `model_type` if registered, else the registered adapter declaring
+    most of the parameter `names` (e.g., the keys of a profile).
+    """
+    if model_type in _adapters:
+        return _adapters[model_type]
+    names = list(names)
+    candidates = list({id(a): a for a in _adapters.values()}.values())
+    scores = [
+        sum(adapter.match(name) is not None or adapter.expert_match(name) is not None for name in names)
+        for adapter in candidates
+    ]
+    if len(candidates) == 0 or max(scores) == 0:
+        raise ValueError(
+            f"no flash_rl architecture adapter matches parameters such as {names[:2]}, "
+            "register one with flash_rl.adapters.register_adapter"
+        )
+    return candidates[scores.index(max(scores))]
+
+
+register_adapter(LLAMA_ADAPTER)
+register_adapter(PHI3_ADAPTER)
+register_adapter(QWEN_MOE_ADAPTER)
+register_adapter(MIXTRAL_ADAPTER)
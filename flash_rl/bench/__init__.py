@@ -0,0 +1,5 @@
+from .compare import compare_results
+from .shapes import MODEL_SHAPES, VOCAB_SIZES, spec_from_config
+from .suite import ALL_BENCHES, run_suite
+
+__all__ = ['ALL_BENCHES', 'MODEL_SHAPES', 'VOCAB_SIZES', 'compare_results', 'run_suite', 'spec_from_config']
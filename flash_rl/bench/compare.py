@@ -0,0 +1,58 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOLERANCE = 0.1
+
+# metrics compared with a baseline; higher is worse for all of them
+COMPARED_METRICS = ('latency_p50_ms', 'allocations')
+
+
+def _key(record):
+    return record['bench'], json.dumps(record['params'], sort_keys=True)
+
+
+def _metrics(record):
+    metrics = {'latency_p50_ms': record['latency_ms']['p50']}
+    if 'allocations' in record:
+        metrics['allocations'] = record['allocations']
+    return metrics
+
+
+def compare_results(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare suite `results` with a `baseline` run (both `run_suite` documents).
+
+    Returns one row per benchmark configuration found in both runs, with the
+    current / baseline value and ratio of every compared metric, and whether any
+    metric regressed by more than `tolerance` (e.g., 0.1 for 10% slower).
+    """
+    baseline_records = {_key(r): r for r in baseline['results']}
+    rows = []
+    for record in results['results']:
+        previous = baseline_records.get(_key(record))
+        if previous is None:
+            continue
+        current_metrics, previous_metrics = _metrics(record), _metrics(previous)
+        metrics = {}
+        for name in COMPARED_METRICS:
+            if name in current_metrics and name in previous_metrics:
+                ratio = current_metrics[name] / max(previous_metrics[name], 1e-9)
+                metrics[name] = {
+                    'current': current_metrics[name],
+                    'baseline': previous_metrics[name],
+                    'ratio': ratio,
+                    'regressed': ratio > 1 + tolerance,
+                }
+        rows.append({
+            'bench': record['bench'],
+            'params': record['params'],
+            'metrics': metrics,
+            'regressed': any(m['regressed'] for m in metrics.values()),
+        })
+
+    unmatched = len(results['results']) - len(rows)
+    if unmatched > 0:
+        logger.warning(f"flash_rl bench: {unmatched} results have no baseline counterpart")
+    return rows
@@ -0,0 +1,270 @@
+from functools import partial
+
+import torch
+from torch import nn
+
+from ..flash_quantization import get_quantize_fn
+from ..weight_reload import hacked_process_weights_after_loading, make_hacked_load_weights
+from .shapes import layer_weight_shapes, synthetic_layers, synthetic_profile
+
+# quantization functions the mock supports: a w8a8 int8 checkpoint, or fp8 with per-channel
+# or block-wise scales, or w4a16 in the compressed-tensors layout; the `fast` variants rely on vllm kernels and module types
+MOCK_QUANT_FNS = ('int8', 'int8_wo_prune', 'fp8_channel', 'fp8_block', 'w4a16')
+
+# vllm stacked_params_mapping of Qwen2 / Llama: (param_name, shard_name, shard_id)
+STACKED_PARAMS_MAPPING = [
+    ('qkv_proj', 'q_proj', 'q'),
+    ('qkv_proj', 'k_proj', 'k'),
+    ('qkv_proj', 'v_proj', 'v'),
+    ('gate_up_proj', 'gate_proj', 0),
+    ('gate_up_proj', 'up_proj', 1),
+]
+
+# size of the scratch tensor a quant method (re)creates per layer, like the marlin `workspace`
+WORKSPACE_NUMEL = 64
+
+
+def default_weight_loader(param, loaded_weight):
+    param.data.copy_(loaded_weight)
+
+
+def set_weight_attrs(weight, weight_attrs):
+    for key, value in weight_attrs.items():
+        assert not hasattr(weight, key), f"Overwriting existing tensor attribute: {key}"
+        setattr(weight, key, value)
+
+
+class MockLinearMethod:
+    """
+    Stand-in for a vllm per-channel quant method (w8a8 int8 or fp8): weights are
+    loaded as [out, in] with a [out, 1] `weight_scale`, then
+    `process_weights_after_loading` replaces both by new parameters (the weight
+    transposed), dropping their loader attributes, and recreates a `workspace`.
+    """
+
+    block_size = None
+
+    def __init__(self, weight_dtype):
+        self.weight_dtype = weight_dtype
+
+    def create_weights(self, layer, input_size, output_sizes):
+        weight = nn.Parameter(torch.empty(sum(output_sizes), input_size, dtype=self.weight_dtype), requires_grad=False)
+        set_weight_attrs(weight, {'input_dim': 1, 'output_dim': 0, 'weight_loader': layer.weight_loader})
+        layer.register_parameter('weight', weight)
+
+        weight_scale = nn.Parameter(torch.empty(sum(output_sizes), 1, dtype=torch.float32), requires_grad=False)
+        set_weight_attrs(weight_scale, {'output_dim': 0, 'weight_loader': layer.weight_loader})
+        layer.register_parameter('weight_scale', weight_scale)
+
+    def process_weights_after_loading(self, layer):
+        layer.weight = nn.Parameter(layer.weight.t(), requires_grad=False)
+        layer.weight_scale = nn.Parameter(layer.weight_scale.data, requires_grad=False)
+        layer.workspace = torch.zeros(WORKSPACE_NUMEL, dtype=torch.int32)
+
+
+class MockBlockFp8LinearMethod:
+    """
+    Stand-in for the vllm block-fp8 linear method: [out, in] fp8 weights with a
+    [ceil(out / block_n), ceil(in / block_k)] `weight_scale_inv`, both replaced by
+    new (not transposed) parameters after loading.
+    """
+
+    def __init__(self, weight_dtype, block_size=(128, 128)):
+        self.weight_dtype = weight_dtype
+        self.block_size = block_size
+
+    def create_weights(self, layer, input_size, output_sizes):
+        block_n, block_k = self.block_size
+        assert all(size % block_n == 0 for size in output_sizes), \
+            f"output sizes {output_sizes} are not multiples of block_n {block_n}"
+        weight = nn.Parameter(torch.empty(sum(output_sizes), input_size, dtype=self.weight_dtype), requires_grad=False)
+        set_weight_attrs(weight, {'input_dim': 1, 'output_dim': 0, 'weight_loader': layer.weight_loader})
+        layer.register_parameter('weight', weight)
+
+        scale_shape = (sum(output_sizes) // block_n, -(-input_size // block_k))
+        weight_scale_inv = nn.Parameter(torch.empty(scale_shape, dtype=torch.float32), requires_grad=False)
+        set_weight_attrs(weight_scale_inv, {'input_dim': 1, 'output_dim': 0, 'weight_loader': layer.weight_loader})
+        layer.register_parameter('weight_scale_inv', weight_scale_inv)
+
+    def process_weights_after_loading(self, layer):
+        layer.weight = nn.Parameter(layer.weight.data, requires_grad=False)
+        layer.weight_scale_inv = nn.Parameter(layer.weight_scale_inv.data, requires_grad=False)
+        layer.workspace = torch.zeros(WORKSPACE_NUMEL, dtype=torch.int32)
+
+
+class MockW4A16LinearMethod:
+    """
+    Stand-in for the vllm compressed-tensors w4a16 linear method: `weight_packed`
+    ([out, in / 8] int32), group-wise `weight_scale` and `weight_shape`; after
+    loading, the packed weight is repacked (here, into a new transposed storage)
+    as the marlin kernels do.
+    """
+
+    block_size = None
+
+    def __init__(self, group_size, dtype):
+        self.group_size = group_size
+        self.dtype = dtype
+
+    def create_weights(self, layer, input_size, output_sizes):
+        output_size = sum(output_sizes)
+        weight_packed = nn.Parameter(torch.empty(output_size, input_size // 8, dtype=torch.int32), requires_grad=False)
+        set_weight_attrs(weight_packed, {
+            'input_dim': 1, 'output_dim': 0, 'packed_dim': 1, 'packed_factor': 8, 'weight_loader': layer.weight_loader,
+        })
+        layer.register_parameter('weight_packed', weight_packed)
+
+        weight_scale = nn.Parameter(torch.empty(output_size, input_size // self.group_size, dtype=self.dtype), requires_grad=False)
+        set_weight_attrs(weight_scale, {'input_dim': 1, 'output_dim': 0, 'weight_loader': layer.weight_loader})
+        layer.register_parameter('weight_scale', weight_scale)
+
+        weight_shape = nn.Parameter(torch.empty(2, dtype=torch.int64), requires_grad=False)
+        set_weight_attrs(weight_shape, {'weight_loader': layer.weight_loader})
+        layer.register_parameter('weight_shape', weight_shape)
+
+    def process_weights_after_loading(self, layer):
+        layer.weight_packed = nn.Parameter(layer.weight_packed.data.t().contiguous(), requires_grad=False)
+        layer.weight_scale = nn.Parameter(layer.weight_scale.data, requires_grad=False)
+        layer.weight_shape = nn.Parameter(layer.weight_shape.data, requires_grad=False)
+        layer.workspace = torch.zeros(WORKSPACE_NUMEL, dtype=torch.int32)
+
+
+class MockLinear(nn.Module):
+    """A (possibly stacked, e.g. qkv / gate_up) linear layer with a vllm-style `weight_loader`."""
+
+    def __init__(self, input_size, output_sizes, quant_method, shard_ids=None):
+        super().__init__()
+        self.output_sizes = list(output_sizes)
+        self.shard_ids = list(shard_ids) if shard_ids is not None else None
+        self.quant_method = quant_method
+        quant_method.create_weights(self, input_size, self.output_sizes)
+
+    def weight_loader(self, param, loaded_weight, loaded_shard_id=None):
+        if loaded_shard_id is None or not hasattr(param, 'output_dim'):
+            # e.g., `weight_shape`: every shard loads the same shape-less metadata
+            assert param.data.shape == loaded_weight.shape, \
+                f"shape mismatch: {tuple(param.data.shape)} vs {tuple(loaded_weight.shape)}"
+            param.data.copy_(loaded_weight)
+            return
+        index = self.shard_ids.index(loaded_shard_id)
+        offset, size = sum(self.output_sizes[:index]), self.output_sizes[index]
+        if param.data.shape[param.output_dim] != sum(self.output_sizes):
+            # block scales: shards are laid out in units of blocks
+            block_n = self.quant_method.block_size[0]
+            offset, size = offset // block_n, size // block_n
+        param.data.narrow(param.output_dim, offset, size).copy_(loaded_weight)
+
+
+class MockRMSNorm(nn.Module):
+    def __init__(self, hidden_size, dtype):
+        super().__init__()
+        self.weight = nn.Parameter(torch.empty(hidden_size, dtype=dtype), requires_grad=False)
+
+
+class MockDecoderLayer(nn.Module):
+    def __init__(self, spec, make_quant_method, dtype):
+        super().__init__()
+        shapes = layer_weight_shapes(spec)
+        hidden, inter = spec['hidden_size'], spec['intermediate_size']
+        q, kv = shapes['model.layers.0.self_attn.q_proj.weight'][0], shapes['model.layers.0.self_attn.k_proj.weight'][0]
+
+        self.input_layernorm = MockRMSNorm(hidden, dtype)
+        self.self_attn = nn.Module()
+        self.self_attn.qkv_proj = MockLinear(hidden, [q, kv, kv], make_quant_method(), shard_ids=['q', 'k', 'v'])
+        self.self_attn.o_proj = MockLinear(q, [hidden], make_quant_method())
+        self.post_attention_layernorm = MockRMSNorm(hidden, dtype)
+        self.mlp = nn.Module()
+        self.mlp.gate_up_proj = MockLinear(hidden, [inter, inter], make_quant_method(), shard_ids=[0, 1])
+        self.mlp.down_proj = MockLinear(inter, [hidden], make_quant_method())
+
+
+class MockVLLMModel(nn.Module):
+    """
+    CPU stand-in for a vllm Qwen2 / Llama model: same `named_parameters` layout
+    (stacked `qkv_proj` / `gate_up_proj`), parameter loader attributes,
+    `quant_method` hooks and `load_weights` contract (HF-named weights in, the set
+    of loaded param names out), without embeddings or a forward pass.
+    """
+
+    def __init__(self, spec, num_layers=1, fn='int8', dtype=torch.bfloat16, group_size=128):
+        super().__init__()
+        if fn not in MOCK_QUANT_FNS:
+            raise ValueError(f"mock vllm model supports {MOCK_QUANT_FNS}, got {fn}")
+        if fn == 'w4a16':
+            make_quant_method = partial(MockW4A16LinearMethod, group_size, dtype)
+        else:
+            weight_dtype = torch.int8 if fn.startswith('int8') else torch.float8_e4m3fn
+            make_quant_method = partial(MockBlockFp8LinearMethod if fn == 'fp8_block' else MockLinearMethod, weight_dtype)
+
+        self.model = nn.Module()
+        self.model.layers = nn.ModuleList([MockDecoderLayer(spec, make_quant_method, dtype) for _ in range(num_layers)])
+
+    def load_weights(self, weights):
+        params_dict = dict(self.named_parameters())
+        loaded_params = set()
+        for name, loaded_weight in weights:
+            for param_name, weight_name, shard_id in STACKED_PARAMS_MAPPING:
+                if weight_name not in name:
+                    continue
+                name = name.replace(weight_name, param_name)
+                param = params_dict[name]
+                param.weight_loader(param, loaded_weight, shard_id)
+                break
+            else:
+                param = params_dict[name]
+                getattr(param, 'weight_loader', default_weight_loader)(param, loaded_weight)
+            loaded_params.add(name)
+        return loaded_params
+
+
+def process_weights_after_loading(model, model_config, target_device):
+    """Stand-in for vllm's `_process_weights_after_loading`: run every quant method hook."""
+    for _, module in model.named_modules():
+        quant_method = getattr(module, 'quant_method', None)
+        if quant_method is not None:
+            quant_method.process_weights_after_loading(module)
+
+
+def synthetic_checkpoint(weights, fn, profile, seed=0):
+    """A quantized checkpoint of bf16 `weights`: quantized by `fn`, plus w8a8 scales for int8."""
+    checkpoint = dict(get_quantize_fn(fn)(iter(weights.items()), profile))
+    if fn.startswith('int8'):
+        generator = torch.Generator().manual_seed(seed)
+        for name in profile:
+            if 'layernorm' not in name:
+                checkpoint[name + '_scale'] = torch.rand(weights[name].shape[0], 1, generator=generator) * 1e-3
+    return checkpoint
+
+
+def build_mock_model(spec, num_layers=1, fn='int8', module_attribute_to_preserve=(), seed=0):
+    """
+    Build a mock model, load a synthetic quantized checkpoint, and install the
+    Flash-RL `load_weights` the same way the vllm patch does on an engine:
+    post-processing goes through `hacked_process_weights_after_loading`, and
+    `model.load_weights` is replaced by `make_hacked_load_weights`.
+
+    Returns the model and the profile updated weights are quantized with.
+    """
+    weights = synthetic_layers(spec, num_layers, seed=seed)
+    profile = synthetic_profile(fn, weights)
+    group_size = min((v['group_size'] for v in profile.values()), default=128) if fn == 'w4a16' else 128
+    model = MockVLLMModel(spec, num_layers, fn, group_size=group_size)
+
+    model.load_weights(iter(synthetic_checkpoint(weights, fn, profile, seed).items()))
+    patched_process = partial(hacked_process_weights_after_loading, process_weights_after_loading)
+    patched_process(model, {'model': 'mock'}, torch.device('cpu'))
+
+    model.flashrl_quant_fn = fn
+    original_load_weights = model.load_weights
+    model.beforeflashrl_load_weights = original_load_weights
+    model.load_weights = make_hacked_load_weights(
+        model,
+        original_load_weights,
+        get_quantize_fn(fn),
+        lambda: profile,
+        list(module_attribute_to_preserve),
+        lambda m, hacked_data_dict, updated_params: patched_process(
+            m, None, None, hacked_data_dict=hacked_data_dict, updated_params=updated_params,
+        ),
+    )
+    return model, profile
@@ -0,0 +1,141 @@
+import torch
+
+# decoder layer shapes of the models FlashRL is tuned on
+MODEL_SHAPES = {
+    'qwen2.5-0.5b': {
+        'hidden_size': 896,
+        'intermediate_size': 4864,
+        'num_attention_heads': 14,
+        'num_key_value_heads': 2,
+        'vocab_size': 151936,
+    },
+    'qwen2.5-32b': {
+        'hidden_size': 5120,
+        'intermediate_size': 27648,
+        'num_attention_heads': 40,
+        'num_key_value_heads': 8,
+        'vocab_size': 152064,
+    },
+}
+
+VOCAB_SIZES = (32000, 151936)
+
+LINEAR_NAMES = [
+    'self_attn.q_proj.weight',
+    'self_attn.k_proj.weight',
+    'self_attn.v_proj.weight',
+    'self_attn.o_proj.weight',
+    'mlp.gate_proj.weight',
+    'mlp.up_proj.weight',
+    'mlp.down_proj.weight',
+]
+
+
+def layer_weight_shapes(spec, layer=0):
+    """Shapes of the parameters of one decoder layer, with HF names."""
+    hidden, inter = spec['hidden_size'], spec['intermediate_size']
+    head_dim = hidden // spec['num_attention_heads']
+    kv = spec['num_key_value_heads'] * head_dim
+    prefix = f'model.layers.{layer}.'
+    return {
+        prefix + 'input_layernorm.weight': (hidden,),
+        prefix + 'self_attn.q_proj.weight': (hidden, hidden),
+        prefix + 'self_attn.k_proj.weight': (kv, hidden),
+        prefix + 'self_attn.v_proj.weight': (kv, hidden),
+        prefix + 'self_attn.o_proj.weight': (hidden, hidden),
+        prefix + 'post_attention_layernorm.weight': (hidden,),
+        prefix + 'mlp.gate_proj.weight': (inter, hidden),
+        prefix + 'mlp.up_proj.weight': (inter, hidden),
+        prefix + 'mlp.down_proj.weight': (hidden, inter),
+    }
+
+
+def synthetic_layers(spec, num_layers=1, dtype=torch.bfloat16, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    weights = {}
+    for layer in range(num_layers):
+        for name, shape in layer_weight_shapes(spec, layer).items():
+            if 'layernorm' in name:
+                weights[name] = (1.0 + 0.1 * torch.randn(shape, generator=generator)).to(dtype)
+            else:
+                weights[name] = (0.02 * torch.randn(shape, generator=generator)).to(dtype)
+    return weights
+
+
+def is_linear(name):
+    return any(name.endswith(k) for k in LINEAR_NAMES)
+
+
+def synthetic_int8_profile(weights):
+    """int8 profile with the structure produced by `build_int8_profile`."""
+    profile = {}
+    for name, w in weights.items():
+        if 'layernorm' in name:
+            profile[name] = {'input_scale': torch.rand(w.shape) + 0.5, 'output_scale': 1., 'type': w.dtype}
+        elif is_linear(name):
+            profile[name] = {
+                'input_scale': torch.rand(1, w.shape[1]) + 0.5,
+                'output_scale': 127. / w.float().abs().amax(dim=1, keepdim=True).clamp_min(1e-6),
+                'type': torch.int8,
+            }
+    return profile
+
+
+def synthetic_fp8_profile(weights):
+    return [name for name in weights if is_linear(name)]
+
+
+def synthetic_w4a16_profile(weights, group_size=128):
+    """w4a16 profile (`pack_quantized` layout); the group size is reduced to divide small synthetic shapes."""
+    import math
+
+    linear = [name for name in weights if is_linear(name)]
+    group_size = math.gcd(group_size, *(weights[name].shape[1] for name in linear))
+    return {name: {'group_size': group_size, 'format': 'pack_quantized', 'num_bits': 4} for name in linear}
+
+
+def synthetic_profile(fn, weights):
+    """Synthetic profile of the quantization function `fn`."""
+    if fn.startswith('int8'):
+        return synthetic_int8_profile(weights)
+    if fn == 'w4a16':
+        return synthetic_w4a16_profile(weights)
+    return synthetic_fp8_profile(weights)
+
+
+def synthetic_w8a8_params(weights):
+    """Parameters of a SmoothQuant w8a8 checkpoint of `weights`, as consumed by `build_int8_profile`."""
+    qparam = {}
+    for name, w in weights.items():
+        if 'layernorm' in name:
+            qparam[name] = w.float() * (torch.rand(w.shape) + 0.5)
+        elif is_linear(name):
+            qparam[name] = torch.randint(-127, 128, w.shape, dtype=torch.int8)
+            qparam[name + '_scale'] = torch.rand(w.shape[0], 1) * 1e-3
+    return qparam
+
+
+def spec_from_config(path):
+    """Shape spec of a HF model `config.json`, of the model directory holding it, or of a hub model id."""
+    import json
+    import os
+
+    if os.path.isdir(path):
+        path = os.path.join(path, 'config.json')
+    if os.path.exists(path):
+        with open(path) as fin:
+            config = json.load(fin)
+    else:
+        from transformers import AutoConfig
+        config = AutoConfig.from_pretrained(path).to_dict()
+    config = config.get('text_config', config)
+    missing = [k for k in ('hidden_size', 'intermediate_size', 'num_attention_heads', 'vocab_size') if k not in config]
+    if len(missing) > 0:
+        raise ValueError(f"{path} is not a decoder model config, missing {missing}")
+    return {
+        'hidden_size': config['hidden_size'],
+        'intermediate_size': config['intermediate_size'],
+        'num_attention_heads': config['num_attention_heads'],
+        'num_key_value_heads': config.get('num_key_value_heads', config['num_attention_heads']),
+        'vocab_size': config['vocab_size'],
+    }
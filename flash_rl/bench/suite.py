@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import platform
+import tempfile
+import time
+
+import torch
+
+from ..flash_quantization import build_int8_profile, load_flashrl_profile, quant_fn_map
+from ..sampling_ops import apply_top_k_top_p
+from ..sglang_patch.sampler_patch import compute_post_filter_distribution, compute_post_filter_logprob
+from .shapes import (
+    MODEL_SHAPES,
+    VOCAB_SIZES,
+    synthetic_int8_profile,
+    synthetic_layers,
+    synthetic_profile,
+    synthetic_w8a8_params,
+)
+from .mock_vllm import build_mock_model
+from .timing import count_allocations, measure
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 64
+
+
+def _nbytes(tensors):
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def _record(bench, params, stats, **throughput):
+    record = {'bench': bench, 'params': params}
+    record.update(stats)
+    record['throughput'] = throughput
+    logger.info(
+        f"flash_rl bench {bench} {params}: p50 {stats['latency_ms']['p50']:.2f} ms "
+        + ' '.join(f"{k} {v:.2f}" for k, v in throughput.items())
+    )
+    return record
+
+
+def bench_quantize(model, spec, num_layers=1, device='cpu', warmup=1, repeats=3):
+    """Every `quant_fn_map` function over synthetic decoder layers of `spec`."""
+    weights = {k: v.to(device) for k, v in synthetic_layers(spec, num_layers).items()}
+    gb = _nbytes(weights.values()) / 2**30
+
+    records = []
+    for fn_name, fn in quant_fn_map.items():
+        profile = synthetic_profile(fn_name, weights)
+        run = lambda: list(fn(iter(weights.items()), profile))  # noqa: E731
+        stats = measure(run, warmup=warmup, repeats=repeats, device=device)
+        records.append(_record(
+            'quantize', {'model': model, 'fn': fn_name, 'num_layers': num_layers, 'device': str(device)},
+            stats, gb_per_s=gb / (stats['latency_ms']['p50'] / 1e3),
+        ))
+    return records
+
+
+def bench_profiling_int8(model, spec, num_layers=1, warmup=1, repeats=3):
+    """The `profiling_int8` math (`build_int8_profile`) over synthetic original / w8a8 parameters."""
+    param = {k: v.float() for k, v in synthetic_layers(spec, num_layers).items()}
+    qparam = synthetic_w8a8_params(param)
+    stats = measure(lambda: build_int8_profile(param, qparam), warmup=warmup, repeats=repeats)
+    gb = _nbytes(param.values()) / 2**30
+    return [_record(
+        'profiling_int8', {'model': model, 'num_layers': num_layers},
+        stats, gb_per_s=gb / (stats['latency_ms']['p50'] / 1e3),
+    )]
+
+
+def bench_sampler(vocab_size, batch_size=DEFAULT_BATCH_SIZE, device='cpu', warmup=1, repeats=3):
+    """`apply_top_k_top_p` and the SGLang post-filter distribution / logprob over [batch, vocab] logits."""
+    generator = torch.Generator().manual_seed(0)
+    logits = torch.randn(batch_size, vocab_size, generator=generator).to(device)
+    token_ids = torch.randint(0, vocab_size, (batch_size,), generator=generator).to(device)
+    top_k = torch.full((batch_size,), 50, dtype=torch.long, device=device)
+    top_p = torch.full((batch_size,), 0.9, device=device)
+    params = {'vocab_size': vocab_size, 'batch_size': batch_size, 'device': str(device)}
+
+    runs = {
+        'apply_top_k_top_p': lambda: apply_top_k_top_p(logits.clone(), top_k, top_p),
+        'post_filter_distribution': lambda: compute_post_filter_distribution(
+            logits, top_k=50, top_p=0.9, min_p=0.05
+        ),
+        'post_filter_logprob': lambda: compute_post_filter_logprob(
+            logits, token_ids, top_k=50, top_p=0.9, min_p=0.05
+        ),
+    }
+    records = []
+    for bench, run in runs.items():
+        stats = measure(run, warmup=warmup, repeats=repeats, device=device)
+        records.append(_record(
+            bench, params, stats, tokens_per_s=batch_size / (stats['latency_ms']['p50'] / 1e3),
+        ))
+    return records
+
+
+def bench_profile_io(model, spec, num_layers=1, warmup=1, repeats=3):
+    """Saving an int8 profile and loading it back with `load_flashrl_profile`."""
+    profile = synthetic_int8_profile(synthetic_layers(spec, num_layers))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'profile.pt')
+        save = measure(lambda: torch.save(profile, path), warmup=warmup, repeats=repeats)
+        load = measure(lambda: load_flashrl_profile(path), warmup=warmup, repeats=repeats)
+        mb = os.path.getsize(path) / 2**20
+    params = {'model': model, 'num_layers': num_layers}
+    return [
+        _record('profile_save', params, save, mb_per_s=mb / (save['latency_ms']['p50'] / 1e3)),
+        _record('profile_load', params, load, mb_per_s=mb / (load['latency_ms']['p50'] / 1e3)),
+    ]
+
+
+def bench_weight_sync(model, spec, num_layers=1, fns=('int8', 'fp8_channel'), warmup=1, repeats=3):
+    """
+    A full weight update (`make_hacked_load_weights` and
+    `hacked_process_weights_after_loading`) of a CPU mock vllm model, with the
+    tensor allocations of one update.
+    """
+    weights = synthetic_layers(spec, num_layers, seed=1)
+    gb = _nbytes(weights.values()) / 2**30
+
+    records = []
+    for fn in fns:
+        mock, _ = build_mock_model(spec, num_layers, fn, module_attribute_to_preserve=['workspace'])
+        run = lambda: mock.load_weights(iter(weights.items()))  # noqa: E731
+        stats = measure(run, warmup=warmup, repeats=repeats)
+        stats.update(count_allocations(run))
+        records.append(_record(
+            'weight_sync', {'model': model, 'fn': fn, 'num_layers': num_layers},
+            stats, gb_per_s=gb / (stats['latency_ms']['p50'] / 1e3),
+        ))
+    return records
+
+
+ALL_BENCHES = ('quantize', 'profiling_int8', 'sampler', 'profile_io', 'weight_sync')
+
+
+def run_suite(
+    models=None,
+    vocab_sizes=VOCAB_SIZES,
+    batch_size=DEFAULT_BATCH_SIZE,
+    num_layers=1,
+    device='cpu',
+    warmup=1,
+    repeats=3,
+    benches=ALL_BENCHES,
+    specs=None,
+    output=None,
+):
+    """
+    Run the micro-benchmarks and return (and optionally write to `output`) a JSON
+    document: run metadata plus one record per benchmark configuration, with
+    latency percentiles, peak memory and throughput.
+    """
+    specs = dict(specs or {})
+    for model in (models if models is not None else list(MODEL_SHAPES) if not specs else []):
+        specs[model] = MODEL_SHAPES[model]
+
+    records = []
+    for model, spec in specs.items():
+        if 'quantize' in benches:
+            records += bench_quantize(model, spec, num_layers, device, warmup, repeats)
+        if 'profiling_int8' in benches:
+            records += bench_profiling_int8(model, spec, num_layers, warmup, repeats)
+        if 'profile_io' in benches:
+            records += bench_profile_io(model, spec, num_layers, warmup, repeats)
+        if 'weight_sync' in benches:
+            records += bench_weight_sync(model, spec, num_layers, warmup=warmup, repeats=repeats)
+    if 'sampler' in benches:
+        for vocab_size in vocab_sizes:
+            records += bench_sampler(vocab_size, batch_size, device, warmup, repeats)
+
+    results = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'torch': torch.__version__,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'device': str(device),
+            'num_threads': torch.get_num_threads(),
+        },
+        'results': records,
+    }
+    if output is not None:
+        with open(output, 'w') as fout:
+            json.dump(results, fout, indent=2)
+        logger.info(f"flash_rl bench results saved to {output}")
+    return results
@@ -0,0 +1,77 @@
+import resource
+import time
+
+import torch
+from torch.utils._python_dispatch import TorchDispatchMode
+from torch.utils._pytree import tree_flatten
+
+
+def _percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def _sync(device):
+    if device is not None and torch.device(device).type == 'cuda':
+        torch.cuda.synchronize(device)
+
+
+def peak_memory_mb(device=None):
+    """Peak CUDA memory allocated on `device`, or the peak RSS of the process on CPU."""
+    if device is not None and torch.device(device).type == 'cuda':
+        return torch.cuda.max_memory_allocated(device) / 2**20
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+def measure(fn, warmup=1, repeats=5, device=None):
+    """Latency statistics (ms) of `fn()` over `repeats` runs, after `warmup` runs."""
+    for _ in range(warmup):
+        fn()
+    _sync(device)
+    if device is not None and torch.device(device).type == 'cuda':
+        torch.cuda.reset_peak_memory_stats(device)
+
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        _sync(device)
+        latencies.append((time.perf_counter() - start) * 1e3)
+
+    latencies.sort()
+    return {
+        'latency_ms': {
+            'mean': sum(latencies) / len(latencies),
+            'min': latencies[0],
+            'p50': _percentile(latencies, 50),
+            'p90': _percentile(latencies, 90),
+            'p99': _percentile(latencies, 99),
+        },
+        'peak_memory_mb': peak_memory_mb(device),
+    }
+
+
+class _AllocationCounter(TorchDispatchMode):
+    """Counts op outputs backed by a storage none of the op inputs own (views and in-place ops excluded)."""
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+        self.nbytes = 0
+
+    def __torch_dispatch__(self, func, types, args=(), kwargs=None):
+        out = func(*args, **(kwargs or {}))
+        inputs = {t.untyped_storage().data_ptr() for t in tree_flatten((args, kwargs))[0] if torch.is_tensor(t)}
+        for t in tree_flatten(out)[0]:
+            if torch.is_tensor(t) and t.untyped_storage().data_ptr() not in inputs:
+                inputs.add(t.untyped_storage().data_ptr())
+                self.count += 1
+                self.nbytes += t.untyped_storage().nbytes()
+        return out
+
+
+def count_allocations(fn):
+    """Number and total size (MB) of the tensor allocations of one `fn()` run, on any device."""
+    with _AllocationCounter() as counter:
+        fn()
+    return {'allocations': counter.count, 'allocated_mb': counter.nbytes / 2**20}
@@ -6,7 +6,15 @@ from dataclasses import asdict
 import yaml
 
 from .configs import get_default_config
-from .flash_quantization import profiling_fp8, profiling_int8
+from .flash_quantization import (
+    load_flashrl_profile,
+    plan_mixed_precision,
+    profiling_fp8,
+    profiling_int8,
+    profiling_int8_calibrate,
+    profiling_w4a16,
+    save_mixed_precision_checkpoint,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -33,7 +41,7 @@ def setup_flashrl(name, parser):
     subparser.add_argument(
         '--fn',
         required=False,
-        choices=['fp8', 'fp8_fast', 'fp8_vllm', 'fp8_vllm_fast', 'fp8_channel', 'fp8_tensor', 'int8', 'int8_fast', 'int8_wo_prune', 'int8_prune', 'bf16'],
+        choices=['fp8', 'fp8_fast', 'fp8_vllm', 'fp8_vllm_fast', 'fp8_channel', 'fp8_tensor', 'fp8_block', 'int8', 'int8_fast', 'int8_wo_prune', 'int8_prune', 'w4a16', 'bf16'],
         default='int8',
         help='quantization function to use',
     )
@@ -49,6 +57,25 @@ def setup_flashrl(name, parser):
         action='store_true',
         help='append the config to the existing file',
     )
+    subparser.add_argument(
+        '--bf16-budget',
+        type=float,
+        default=None,
+        help='keep the int8 layers with the largest quantization error (recorded by `flashrl profile`) in bf16, '
+             'up to this fraction of the int8 weight elements',
+    )
+    subparser.add_argument(
+        '--base-model',
+        type=str,
+        default=None,
+        help='original (bf16) model the profile was built from, required by --bf16-budget',
+    )
+    subparser.add_argument(
+        '--mixed-output',
+        type=str,
+        default=None,
+        help='where --bf16-budget writes the mixed-precision checkpoint the engine starts from',
+    )
     subparser.add_argument(
         'columns',
         nargs=argparse.REMAINDER,
@@ -142,9 +169,23 @@ def setup_flashrl_runner(args):
         key, value = column.split('=')
         config_data[key] = eval(value)
 
-    assert config_data['load_format'] == 'auto' or args.fn in ['fp8', 'fp8_tensor', 'fp8_channel'], \
+    assert config_data['load_format'] == 'auto' or args.fn in ['fp8', 'fp8_tensor', 'fp8_channel', 'fp8_block'], \
         f"load_format should be 'auto' for {args.fn}, but got {config_data['load_format']}"
 
+    if args.bf16_budget is not None:
+        assert args.fn in ['int8', 'int8_fast', 'int8_wo_prune', 'int8_prune'], \
+            f"--bf16-budget needs an int8 profile, got {args.fn}"
+        assert args.profile is not None and args.model is not None, "--bf16-budget needs --model and --profile"
+        profile = load_flashrl_profile(args.profile)
+        config_data['bf16_layers'] = plan_mixed_precision(profile, args.bf16_budget)
+        logger.info(f"flash_rl mixed-precision plan keeps {len(config_data['bf16_layers'])} weights in bf16")
+        if len(config_data['bf16_layers']) > 0:
+            # the engine checkpoint has to hold these layers unquantized as well
+            assert args.base_model is not None and args.mixed_output is not None, \
+                "--bf16-budget needs --base-model and --mixed-output to write the mixed-precision checkpoint"
+            save_mixed_precision_checkpoint(args.base_model, args.model, profile, config_data['bf16_layers'], args.mixed_output)
+            config_data['model'] = args.mixed_output
+
     if args.append and os.path.exists(args.config_output):
         with open(args.config_output, 'r') as fin:
             meta_configs = yaml.safe_load(fin)
@@ -247,7 +288,7 @@ def profile_flashrl(name, parser):
         '-q', '--quantized',
         required=True,
         type=str,
-        help='path to the quantized model',
+        help='path to the quantized model (written by --calibrate)',
     )
     subparser.add_argument(
         '-o', '--output',
@@ -257,19 +298,163 @@ def profile_flashrl(name, parser):
     )
     subparser.add_argument(
         '--fn',
-        choices=['fp8', 'int8'],
+        choices=['fp8', 'int8', 'w4a16'],
         default='int8',
     )
+    subparser.add_argument(
+        '--calibrate',
+        action='store_true',
+        help='derive the int8 profile from the original model and a calibration dataset (SmoothQuant), '
+             'writing the matching w8a8 model to --quantized instead of reading it',
+    )
+    subparser.add_argument(
+        '--dataset',
+        type=str,
+        default=None,
+        help='calibration texts: a .txt / .jsonl file, or a HF dataset name[:split]',
+    )
+    subparser.add_argument('--num-samples', type=int, default=128, help='calibration samples')
+    subparser.add_argument('--seq-len', type=int, default=512, help='max tokens per calibration sample')
+    subparser.add_argument('--batch-size', type=int, default=8, help='calibration batch size')
+    subparser.add_argument('--alpha', type=float, default=0.5, help='SmoothQuant migration strength')
     subparser.set_defaults(func=profile_runner)
     return subparser
 
 def profile_runner(args):
-    if args.fn == 'int8':
+    if args.calibrate:
+        assert args.fn == 'int8', f"--calibrate only supports int8, got {args.fn}"
+        assert args.model is not None and args.dataset is not None, "--calibrate needs --model and --dataset"
+        profiling_int8_calibrate(
+            args.model, args.dataset, args.quantized, args.output,
+            num_samples=args.num_samples, seq_len=args.seq_len, batch_size=args.batch_size, alpha=args.alpha,
+        )
+    elif args.fn == 'int8':
         assert args.model is not None, f"model path is required for quantization {args.fn}"
         profiling_int8(args.model, args.quantized, args.output)
+    elif args.fn == 'w4a16':
+        profiling_w4a16(args.quantized, args.output)
     else:
         profiling_fp8(args.quantized, args.output)
 
+def bench_flashrl(name, parser):
+    subparser = parser.add_parser(
+        name,
+        description="benchmark Flash RL quantization, sampler and weight sync",
+        help='benchmark Flash RL',
+    )
+    subparser.add_argument(
+        '-m', '--model',
+        nargs='+',
+        default=None,
+        help='model presets (qwen2.5-0.5b, qwen2.5-32b), HF model ids, or paths to model configs / directories',
+    )
+    subparser.add_argument(
+        '--shape',
+        nargs='+',
+        default=None,
+        help='synthetic shape spec, format is hidden_size=896 intermediate_size=4864 '
+             'num_attention_heads=14 num_key_value_heads=2 vocab_size=151936',
+    )
+    subparser.add_argument(
+        '--benches',
+        nargs='+',
+        choices=['quantize', 'profiling_int8', 'sampler', 'profile_io', 'weight_sync'],
+        default=None,
+        help='benchmarks to run (default: all)',
+    )
+    subparser.add_argument(
+        '--vocab-size',
+        nargs='+',
+        type=int,
+        default=None,
+        help='sampler vocabulary sizes (default: those of the models)',
+    )
+    subparser.add_argument('--batch-size', type=int, default=64, help='sampler batch size')
+    subparser.add_argument('--num-layers', type=int, default=1, help='decoder layers to quantize / sync')
+    subparser.add_argument('--device', type=str, default='cpu', help='device of the quantization and sampler benchmarks')
+    subparser.add_argument('--warmup', type=int, default=1)
+    subparser.add_argument('--repeats', type=int, default=5)
+    subparser.add_argument(
+        '-o', '--output',
+        required=False,
+        type=str,
+        default=None,
+        help='path to save the results as JSON',
+    )
+    subparser.add_argument(
+        '--baseline',
+        required=False,
+        type=str,
+        default=None,
+        help='results JSON of a previous run to compare with; exits with 1 on a regression',
+    )
+    subparser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.1,
+        help='relative slowdown (or allocation increase) reported as a regression',
+    )
+    subparser.set_defaults(func=bench_runner)
+    return subparser
+
+def _format_throughput(throughput):
+    units = {'gb_per_s': 'GB/s', 'tokens_per_s': 'tokens/s', 'mb_per_s': 'MB/s'}
+    return ' '.join(f"{v:.2f} {units.get(k, k)}" for k, v in throughput.items())
+
+def bench_runner(args):
+    import json
+    import sys
+
+    from .bench import ALL_BENCHES, MODEL_SHAPES, compare_results, run_suite, spec_from_config
+
+    specs = {}
+    for model in args.model or []:
+        specs[model] = MODEL_SHAPES[model] if model in MODEL_SHAPES else spec_from_config(model)
+    if args.shape is not None:
+        specs['synthetic'] = {k: int(v) for k, v in (column.split('=') for column in args.shape)}
+    if len(specs) == 0:
+        specs = dict(MODEL_SHAPES)
+
+    vocab_sizes = args.vocab_size or sorted({spec['vocab_size'] for spec in specs.values()})
+    results = run_suite(
+        vocab_sizes=vocab_sizes,
+        batch_size=args.batch_size,
+        num_layers=args.num_layers,
+        device=args.device,
+        warmup=args.warmup,
+        repeats=args.repeats,
+        benches=args.benches or ALL_BENCHES,
+        specs=specs,
+        output=args.output,
+    )
+
+    print(f"{'bench':<26} {'params':<48} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'peak MB':>10}  throughput")
+    for record in results['results']:
+        params = ','.join(f"{k}={v}" for k, v in record['params'].items() if k != 'device')
+        latency = record['latency_ms']
+        print(
+            f"{record['bench']:<26} {params:<48} {latency['p50']:>10.2f} {latency['p90']:>10.2f} "
+            f"{latency['p99']:>10.2f} {record['peak_memory_mb']:>10.1f}  {_format_throughput(record['throughput'])}"
+        )
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as fin:
+            baseline = json.load(fin)
+        rows = compare_results(results, baseline, args.tolerance)
+        regressions = [row for row in rows if row['regressed']]
+        for row in rows:
+            for metric, value in row['metrics'].items():
+                status = 'REGRESSED' if value['regressed'] else 'ok'
+                print(
+                    f"{row['bench']:<26} {metric:<16} {value['baseline']:>10.2f} -> {value['current']:>10.2f} "
+                    f"({value['ratio']:.2f}x) {status}"
+                )
+        if len(regressions) > 0:
+            logger.error(f"flash_rl bench: {len(regressions)} of {len(rows)} benchmarks regressed vs {args.baseline}")
+            sys.exit(1)
+        logger.info(f"flash_rl bench: no regression vs {args.baseline} ({len(rows)} benchmarks compared)")
+    return results
+
 def run():
     parser = argparse.ArgumentParser()
     subparsers = parser.add_subparsers(title='Commands', metavar='')
@@ -278,6 +463,7 @@ def run():
         "setup": setup_flashrl,
         "cleanup": clean_up_flashrl,
         "profile": profile_flashrl,
+        "bench": bench_flashrl,
     }
 
     for name, subcommand in subcommands.items():
@@ -1,6 +1,11 @@
-from .fp8 import FP8TensorConfig, FP8ChannelConfig, FP8vLLMConfig, FP8vLLMFastConfig
+import logging
+import os
+from dataclasses import asdict
+
+from .fp8 import FP8TensorConfig, FP8ChannelConfig, FP8BlockConfig, FP8vLLMConfig, FP8vLLMFastConfig
 from .int8 import Int8Config, Int8PruneConfig, Int8FastConfig
 from .bf16 import BF16Config
+from .w4a16 import W4A16Config
 
 def get_default_config(fn):
     return {
@@ -10,9 +15,45 @@ def get_default_config(fn):
         'fp8_fast': FP8vLLMFastConfig(),
         'fp8_channel': FP8ChannelConfig(),
         'fp8_tensor': FP8TensorConfig(),
+        'fp8_block': FP8BlockConfig(),
         'int8': Int8Config(),
         'int8_fast': Int8FastConfig(),
         'int8_wo_prune': Int8Config(),
         'int8_prune': Int8PruneConfig(),
+        'w4a16': W4A16Config(),
         'bf16': BF16Config(),
     }[fn]
+
+logger = logging.getLogger(__name__)
+
+# configs that can be selected by name through FLASHRL_CONFIG, without a yaml file
+profile_free_configs = ['bf16', 'fp8', 'fp8_vllm', 'fp8_fast', 'fp8_vllm_fast']
+
+def load_flashrl_config(config):
+    
+    config_path = config.strip()
+    
+    if config_path in profile_free_configs: 
+        logger.info(f"Using profile-free default for: {config_path}")
+        config_data = {'configs': [asdict(get_default_config(config_path))]}
+    else:        
+        logger.info(f"Loading flash_rl config from: {config_path}")
+        
+        if not os.path.exists(config_path):
+            from huggingface_hub import hf_hub_download
+            config_path = config_path.split('/')
+            assert len(config_path) >= 3, f'Invalid flash_rl config path: {config_path}'
+            config_path = hf_hub_download(repo_id='/'.join(config_path[:2]), filename='/'.join(config_path[2:]))
+
+        import yaml
+        with open(config_path, 'r') as f:
+            config_data = yaml.safe_load(f)
+
+    return config_data
+
+def select_flashrl_config(config_data, rank=0, mp_size=1):
+    """Pick the config of this data-parallel rank, as the vLLM patch does."""
+    config_count = len(config_data['configs'])
+    config_index = (rank // mp_size) % config_count
+    logger.info(f"Using config {config_index} of {config_count}")
+    return config_data['configs'][config_index]
@@ -15,6 +15,13 @@ class FP8ChannelConfig:
     distributed_executor_backend: str = 'external_launcher'
     module_attribute_to_preserve: List[str] = field(default_factory=lambda: ['workspace'])
 
+@dataclass
+class FP8BlockConfig:
+    fn: str = 'fp8_block'
+    load_format: str = 'dummy'
+    distributed_executor_backend: str = 'external_launcher'
+    module_attribute_to_preserve: List[str] = field(default_factory=lambda: ['workspace'])
+
 @dataclass
 class FP8vLLMConfig:
     fn: str = 'fp8_vllm'
@@ -0,0 +1,9 @@
+from dataclasses import dataclass, field
+from typing import List
+
+@dataclass
+class W4A16Config:
+    fn: str = 'w4a16'
+    load_format: str = 'auto'
+    distributed_executor_backend: str = 'external_launcher'
+    module_attribute_to_preserve: List[str] = field(default_factory=lambda: ['workspace'])
@@ -1,21 +1,39 @@
 import os
+import re
 import torch 
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
 import logging
+from typing import Any, List, NamedTuple
+
+from .adapters import adapter_for, get_adapter, registered_adapters, split_expert
+from .pinned_staging import stage_to_device
 
 logger = logging.getLogger(__name__)
 
 def move_to_device(tensor, device):
-    """Move tensor to device."""
+    """Move tensor to device, staging pageable host memory through pinned buffers."""
     if isinstance(tensor, torch.Tensor):
-        return tensor.to(device, non_blocking=True)
+        return stage_to_device(tensor, device)
     else:
         return tensor 
     
-def linear_quantize(name, from_p, profile):
-    device = torch.cuda.current_device() 
+def quantize_device():
+    """Device quantized weights are produced on: the current CUDA device, or CPU without one."""
+    return torch.cuda.current_device() if torch.cuda.is_available() else 'cpu'
+
+def _select_experts(scale, experts):
+    # stacked profile entries hold one [1 | N, 1 | K] scale per expert
+    if experts is not None and isinstance(scale, torch.Tensor) and scale.dim() == 3:
+        return scale[experts]
+    return scale
+
+def linear_quantize(name, from_p, profile, experts=None):
+    """Quantize `from_p` by its profile entry; `experts` selects the rows of stacked (MoE) entries."""
+    device = quantize_device()
     if name in profile:
-        from_p = from_p * move_to_device(profile[name]['output_scale'], device) * move_to_device(profile[name]['input_scale'], device)
+        output_scale = move_to_device(_select_experts(profile[name]['output_scale'], experts), device)
+        input_scale = move_to_device(_select_experts(profile[name]['input_scale'], experts), device)
+        from_p = from_p * output_scale * input_scale
         if profile[name]['type'] == torch.int8:
             from_p = torch.round(from_p).clamp(min=-128, max=127).to(torch.int8)
         else:
@@ -23,41 +41,214 @@ def linear_quantize(name, from_p, profile):
     
     return from_p 
 
-input_linear_map = {
-    'input_layernorm.weight': ['self_attn.q_proj.weight', 'self_attn.k_proj.weight', 'self_attn.v_proj.weight'],
-    'post_attention_layernorm.weight': ['mlp.gate_proj.weight', 'mlp.up_proj.weight'],
-}
-
 def flash_quantize_with_prune(weights, profile):
     logger.debug("flash_rl quantization with dead neuron pruning is enabled")
-    weights = dict(weights)
-    for name in profile.keys():
-        weights[name] = linear_quantize(name, weights[name], profile)
+    weights = dict(flash_quantize(weights, profile))
     
-    for name, tensor in weights.items():
-        for layernorm, layers in input_linear_map.items():
-            if layernorm in name:
-                dead_neurons_mask = 1 
-                for layer_i in layers:
-                    layer_name = name.replace(layernorm, layer_i) 
-                    dead_neurons_mask_i = (weights[layer_name].abs().float().sum(dim=0, keepdim=False) == 0) # 1 := needs to be pruned
-                    dead_neurons_mask = dead_neurons_mask * dead_neurons_mask_i # to-be-pruned := needs to be pruned for all layers 
-                weights[name].data = weights[name].data * (1 - dead_neurons_mask) # 1 := needs to be pruned
+    adapter = adapter_for(profile)
+    for name, (prefix, suffix) in adapter.matches(weights).items():
+        if suffix not in adapter.input_linears:
+            continue
+        dead_neurons_mask = 1 
+        for layer_i in adapter.input_linears[suffix]:
+            dead_neurons_mask_i = (weights[prefix + layer_i].abs().float().sum(dim=0, keepdim=False) == 0) # 1 := needs to be pruned
+            dead_neurons_mask = dead_neurons_mask * dead_neurons_mask_i # to-be-pruned := needs to be pruned for all layers 
+        weights[name].data = weights[name].data * (1 - dead_neurons_mask) # 1 := needs to be pruned
                     
     return weights.items()
 
 def flash_quantize(weights, profile):
     logger.debug("flash_rl quantization is called")
+    batcher = ExpertBatcher(quantize_device())
     for name, tensor in weights:
+        if _is_batched_expert(name, profile):
+            for batch in batcher.add(name, tensor, profile[split_expert(name)[0]].get('num_experts')):
+                yield from unstack_experts(batch, [(batch.name, linear_quantize(batch.name, batch.tensor, profile, batch.experts))])
+            continue
         yield (name, linear_quantize(name, tensor, profile))
         if name in profile:
             del tensor
+    for batch in batcher.flush():
+        yield from unstack_experts(batch, [(batch.name, linear_quantize(batch.name, batch.tensor, profile, batch.experts))])
+
+FP8_E4M3_MAX = 448.0
+
+# fp32 temporaries (in bytes) of one chunk of the per-row fp8 fallback
+FP8_FALLBACK_CHUNK_BYTES = 16 * 2**20
+
+def _vllm_op(name):
+    """Return the vllm custom op `name` if the vllm kernels are loaded, else None."""
+    try:
+        return getattr(torch.ops._C, name)
+    except (AttributeError, RuntimeError):
+        return None
+
+def dynamic_per_token_scaled_fp8_quant(output, from_p, scale):
+    """Per-row fp8 quantization, vllm kernel when available (e.g., not under SGLang-only installs)."""
+    op = _vllm_op('dynamic_per_token_scaled_fp8_quant')
+    if op is not None:
+        return op(output, from_p, scale, None)
+    # in row chunks, in place on one fp32 copy each: large (e.g., stacked expert)
+    # inputs would otherwise be bound by their full-size fp32 temporaries
+    rows = max(1, FP8_FALLBACK_CHUNK_BYTES // (4 * from_p.shape[-1]))
+    for i in range(0, from_p.shape[0], rows):
+        x, s = from_p[i:i + rows], scale[i:i + rows]
+        s.copy_((x.abs().amax(dim=-1, keepdim=True).float() / FP8_E4M3_MAX).clamp_min(1e-12))
+        output[i:i + rows].copy_(x.float().div_(s).clamp_(-FP8_E4M3_MAX, FP8_E4M3_MAX))
+
+def dynamic_scaled_fp8_quant(output, from_p, scale):
+    """Per-tensor fp8 quantization, vllm kernel when available; `scale` may repeat the value (e.g., [N, 1])."""
+    op = _vllm_op('dynamic_scaled_fp8_quant')
+    if op is not None:
+        # the kernel max-reduces into a zeroed scalar and writes a contiguous output
+        scalar = torch.zeros(1, device=from_p.device, dtype=torch.float32)
+        target = output if output.is_contiguous() else torch.empty(output.shape, dtype=output.dtype, device=output.device)
+        op(target, from_p.contiguous(), scalar)
+        if target is not output:
+            output.copy_(target)
+        scale.copy_(scalar.reshape([1] * scale.dim()).expand_as(scale))
+        return
+    amax = from_p.abs().amax().float()
+    # filled on device, no host sync
+    scale.copy_((amax / FP8_E4M3_MAX).clamp_min(1e-12).expand_as(scale))
+    output.copy_((from_p.float() / scale).clamp(-FP8_E4M3_MAX, FP8_E4M3_MAX))
+
+# inputs (in bytes) quantized by one group, bounding the fp32 temporaries of the multi-tensor fallback
+FP8_GROUP_MAX_BYTES = 512 * 2**20
+
+_layer_pattern = re.compile(r'\.layers\.(\d+)\.')
+
+def layer_of(name):
+    """Decoder layer index of a parameter name, or None outside the decoder layers."""
+    match = _layer_pattern.search(name)
+    return int(match.group(1)) if match is not None else None
+
+def foreach_scaled_fp8_quant(outputs, inputs, scales):
+    """
+    Per-tensor fp8 quantization of a group of tensors (e.g., the q/k/v/o/gate/up/down
+    weights of a layer) into preallocated fp8 `outputs` and `scales`. With the vllm
+    kernels loaded, each tensor goes through vllm's fused kernel. Otherwise (CPU,
+    SGLang-only installs), multi-tensor ops do one amax reduction, one scale update
+    and one scaled cast for the whole group, matching the per-tensor reference bit
+    for bit.
+    """
+    if len(inputs) == 0:
+        return
+    if _vllm_op('dynamic_scaled_fp8_quant') is not None:
+        # no fp32 temporaries
+        for output, from_p, scale in zip(outputs, inputs, scales):
+            dynamic_scaled_fp8_quant(output, from_p, scale)
+        return
+    amax = torch.stack(torch._foreach_norm(inputs, float('inf'))).float()
+    group_scale = (amax / FP8_E4M3_MAX).clamp_min(1e-12)
+    torch._foreach_copy_([s.view(-1) if s.dim() == 0 else s for s in scales], list(group_scale.view(-1, 1).unbind()))
+    # [1, ..., 1] scales promote the division to fp32, as in the reference
+    scaled = torch._foreach_div(inputs, [group_scale[i].view([1] * x.dim()) for i, x in enumerate(inputs)])
+    torch._foreach_clamp_min_(scaled, -FP8_E4M3_MAX)
+    torch._foreach_clamp_max_(scaled, FP8_E4M3_MAX)
+    torch._foreach_copy_(outputs, scaled)
+
+class Fp8QuantGroup:
+    """
+    Collects per-tensor fp8 quantizations and issues them per decoder layer with
+    `foreach_scaled_fp8_quant`. `add` and `flush` return the `payload`s of the
+    quantizations they issued, e.g., the `(name, tensor)` pairs now ready to load.
+    """
+
+    def __init__(self, max_bytes=FP8_GROUP_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.pending = []
+        self.nbytes = 0
+        self.layer = None
+
+    def add(self, name, output, from_p, scale, payload=()):
+        layer = layer_of(name)
+        ready = []
+        if len(self.pending) > 0 and (layer != self.layer or self.nbytes >= self.max_bytes):
+            ready = self.flush()
+        self.layer = layer
+        self.pending.append((output, from_p, scale, payload))
+        self.nbytes += from_p.numel() * from_p.element_size()
+        return ready
+
+    def flush(self):
+        ready = []
+        if len(self.pending) > 0:
+            outputs, inputs, scales, payloads = (list(t) for t in zip(*self.pending))
+            foreach_scaled_fp8_quant(outputs, inputs, scales)
+            ready = [item for payload in payloads for item in payload]
+        self.pending = []
+        self.nbytes = 0
+        return ready
+
+class ExpertBatch(NamedTuple):
+    """Per-expert weights of one stacked MoE weight, stacked along dim 0 in `experts` order."""
+
+    name: str
+    names: List[str]
+    experts: List[int]
+    tensor: Any
+
+class ExpertBatcher:
+    """
+    Collects the per-expert weights of MoE layers (`...experts.{e}.<suffix>`) and
+    hands them out stacked per weight, so that all experts are quantized by one
+    batched op instead of one op per expert. `add` and `flush` return the ready
+    `ExpertBatch`es: a weight once its `num_experts` experts arrived (when known),
+    and every pending weight once the stream leaves the decoder layer or holds
+    `max_bytes`.
+    """
+
+    def __init__(self, device, max_bytes=FP8_GROUP_MAX_BYTES):
+        self.device = device
+        self.max_bytes = max_bytes
+        self.pending = dict()
+        self.nbytes = 0
+        self.layer = None
+
+    def add(self, name, tensor, num_experts=None):
+        stacked, expert = split_expert(name)
+        layer = layer_of(name)
+        ready = []
+        if len(self.pending) > 0 and (layer != self.layer or self.nbytes >= self.max_bytes):
+            ready = self.flush()
+        self.layer = layer
+        self.pending.setdefault(stacked, []).append((expert, name, tensor))
+        self.nbytes += tensor.numel() * tensor.element_size()
+        if num_experts is not None and len(self.pending[stacked]) == num_experts:
+            ready.append(self._stack(stacked))
+        return ready
+
+    def flush(self):
+        return [self._stack(stacked) for stacked in list(self.pending)]
+
+    def _stack(self, stacked):
+        items = sorted(self.pending.pop(stacked), key=lambda item: item[0])
+        first = items[0][2]
+        tensor = torch.empty((len(items), *first.shape), dtype=first.dtype, device=self.device)
+        for i, (_, _, t) in enumerate(items):
+            tensor[i].copy_(t)
+            self.nbytes -= t.numel() * t.element_size()
+        return ExpertBatch(stacked, [n for _, n, _ in items], [e for e, _, _ in items], tensor)
+
+def unstack_experts(batch, outputs):
+    """Per-expert `(name, tensor)` pairs of the stacked `(name + suffix, tensor)` outputs of a batch."""
+    for stacked_name, tensor in outputs:
+        suffix = stacked_name[len(batch.name):]
+        for i, name in enumerate(batch.names):
+            yield (name + suffix, tensor[i])
+
+def _is_batched_expert(name, profile):
+    expert = split_expert(name)
+    return expert is not None and expert[0] in profile
 
 # using vllm kernels
 def fp8_quantize_channel(name, from_p, profile):
-    device = torch.cuda.current_device() 
+    """Per-row fp8 quantization; stacked expert weights ([E, N, K]) are quantized by one kernel call."""
+    device = quantize_device()
+    from_p = move_to_device(from_p, device).contiguous()
     scale = torch.empty(
-        (from_p.shape[0], 1),
+        (*from_p.shape[:-1], 1),
         device=device,
         dtype=torch.float32,
     )
@@ -66,54 +257,168 @@ def fp8_quantize_channel(name, from_p, profile):
         device=device, 
         dtype=torch.float8_e4m3fn,
     )
-    torch.ops._C.dynamic_per_token_scaled_fp8_quant(
-        output, from_p.to(device), scale, None,
+    dynamic_per_token_scaled_fp8_quant(
+        output.view(-1, from_p.shape[-1]), from_p.view(-1, from_p.shape[-1]), scale.view(-1, 1),
     )
 
-    return (name, output.to(device)), (name+'_scale', scale.to(device))
+    return (name, output), (name+'_scale', scale)
     
 
 def flash_quantize_fp8_channel(weights, profile):
     logger.debug("flash_rl quantization is called")
+    batcher = ExpertBatcher(quantize_device())
     for name, tensor in weights:
-        if name in profile:
+        if _is_batched_expert(name, profile):
+            for batch in batcher.add(name, tensor):
+                yield from unstack_experts(batch, fp8_quantize_channel(batch.name, batch.tensor, profile))
+        elif name in profile:
             weight, scale = fp8_quantize_channel(name, tensor, profile)
             del tensor
             yield weight
             yield scale
         else:
             yield (name, tensor)
+    for batch in batcher.flush():
+        yield from unstack_experts(batch, fp8_quantize_channel(batch.name, batch.tensor, profile))
             
 # using vllm kernels
-def fp8_quantize_tensor(name, from_p, profile):
-    device = torch.cuda.current_device() 
-    scale_scalar = torch.zeros(1, device=device, dtype=torch.float32)
-    output = torch.empty(
-        from_p.shape, 
-        device=device, 
-        dtype=torch.float8_e4m3fn,
-    )
-    torch.ops._C.dynamic_scaled_fp8_quant(
-        output, from_p.to(device), scale_scalar,
-    )
-    scale = torch.empty(
-        (from_p.shape[0], 1),
-        device=device,
-        dtype=torch.float32,
-    )
-    scale.fill_(scale_scalar.item())
-    return (name, output.to(device)), (name+'_scale', scale)
-    
+def fp8_quantize_tensor_experts(name, from_p):
+    """Per-tensor fp8 quantization of each expert of a stacked [E, N, K] weight, in one batched op."""
+    amax = from_p.abs().amax(dim=(1, 2), keepdim=True).float()
+    scale = (amax / FP8_E4M3_MAX).clamp_min(1e-12)
+    output = (from_p.float() / scale).clamp(-FP8_E4M3_MAX, FP8_E4M3_MAX).to(torch.float8_e4m3fn)
+    # per-row layout of the per-tensor scale, as `flash_quantize_fp8_tensor`
+    return (name, output), (name + '_scale', scale.expand(-1, from_p.shape[1], 1).contiguous())
+
 def flash_quantize_fp8_tensor(weights, profile):
     logger.debug("flash_rl quantization is called")
+    device = quantize_device()
+    group = Fp8QuantGroup()
+    batcher = ExpertBatcher(device)
     for name, tensor in weights:
-        if name in profile:
-            weight, scale = fp8_quantize_tensor(name, tensor, profile)
+        if _is_batched_expert(name, profile):
+            for batch in batcher.add(name, tensor):
+                yield from unstack_experts(batch, fp8_quantize_tensor_experts(batch.name, batch.tensor))
+        elif name in profile and tensor.dim() == 3:
+            # already stacked experts
+            yield from fp8_quantize_tensor_experts(name, move_to_device(tensor, device))
+        elif name in profile:
+            output = torch.empty(tensor.shape, device=device, dtype=torch.float8_e4m3fn)
+            scale = torch.empty((tensor.shape[0], 1), device=device, dtype=torch.float32)
+            yield from group.add(
+                name, output, move_to_device(tensor, device), scale,
+                payload=((name, output), (name + '_scale', scale)),
+            )
+            del tensor
+        else:
+            yield (name, tensor)
+    yield from group.flush()
+    for batch in batcher.flush():
+        yield from unstack_experts(batch, fp8_quantize_tensor_experts(batch.name, batch.tensor))
+
+# [block_n, block_k] of block-wise fp8, as in the `weight_block_size` of fp8 checkpoints
+FP8_BLOCK_SIZE = (128, 128)
+
+def fp8_quantize_block(name, from_p, profile, block_size=FP8_BLOCK_SIZE):
+    """
+    Block-wise fp8 quantization: one scale per [block_n, block_k] block, returned as
+    the `weight_scale_inv` ([ceil(N / block_n), ceil(K / block_k)], fp32) the vllm
+    block-fp8 linear method loads, with the dequantized weight being `weight * scale_inv`.
+    Stacked expert weights ([E, N, K]) get [E, ...] scales from the same ops.
+    """
+    device = quantize_device()
+    from_p = move_to_device(from_p, device)
+    (*lead, n, k), (block_n, block_k) = from_p.shape, block_size
+    rows, cols = -(-n // block_n), -(-k // block_k)
+    padded = torch.nn.functional.pad(from_p, (0, cols * block_k - k, 0, rows * block_n - n))
+    blocks = padded.view(*lead, rows, block_n, cols, block_k).float()
+    scale = (blocks.abs().amax(dim=(-3, -1)) / FP8_E4M3_MAX).clamp_min(1e-12)
+    blocks = (blocks / scale[..., :, None, :, None]).clamp(-FP8_E4M3_MAX, FP8_E4M3_MAX)
+    output = blocks.to(torch.float8_e4m3fn).view(*lead, rows * block_n, cols * block_k)[..., :n, :k].contiguous()
+    return (name, output), (name + '_scale_inv', scale)
+
+def flash_quantize_fp8_block(weights, profile):
+    logger.debug("flash_rl quantization is called")
+    batcher = ExpertBatcher(quantize_device())
+    for name, tensor in weights:
+        if _is_batched_expert(name, profile):
+            for batch in batcher.add(name, tensor):
+                yield from unstack_experts(batch, fp8_quantize_block(batch.name, batch.tensor, profile))
+        elif name in profile:
+            weight, scale = fp8_quantize_block(name, tensor, profile)
             del tensor
             yield weight
             yield scale
         else:
             yield (name, tensor)
+    for batch in batcher.flush():
+        yield from unstack_experts(batch, fp8_quantize_block(batch.name, batch.tensor, profile))
+
+INT4_PACK_FACTOR = 8  # int4 values per int32
+
+def pack_int4(values, dim=-1):
+    """Pack unsigned 4-bit `values` ([0, 15]) into int32 along `dim`, the i-th value of a word at bits 4i."""
+    values = values.movedim(dim, -1).to(torch.int64)
+    assert values.shape[-1] % INT4_PACK_FACTOR == 0, \
+        f"packed dim of size {values.shape[-1]} is not a multiple of {INT4_PACK_FACTOR}"
+    shifts = torch.arange(0, 32, 4, device=values.device)
+    packed = (values.view(*values.shape[:-1], -1, INT4_PACK_FACTOR) << shifts).sum(dim=-1)
+    packed = torch.where(packed >= 2**31, packed - 2**32, packed).to(torch.int32)
+    return packed.movedim(-1, dim)
+
+def unpack_int4(packed, dim=-1):
+    """Inverse of `pack_int4`: unsigned 4-bit values, as uint8."""
+    packed = packed.movedim(dim, -1).to(torch.int64) & 0xFFFFFFFF
+    shifts = torch.arange(0, 32, 4, device=packed.device)
+    values = (packed.unsqueeze(-1) >> shifts) & 0xF
+    return values.flatten(-2).to(torch.uint8).movedim(-1, dim)
+
+def w4a16_quantize(name, from_p, profile):
+    """
+    Symmetric group-wise int4 quantization of an [N, K] weight (round to nearest,
+    scale `amax / 7.5` as in compressed-tensors and GPTQ), returned as the params
+    the vllm w4a16 linear methods load:
+      - `pack_quantized` (compressed-tensors): `weight_packed` [N, K / 8] int32,
+        `weight_scale` [N, K / group], `weight_shape`;
+      - `gptq`: `qweight` [K / 8, N] int32, `scales` [K / group, N], `qzeros`
+        (zero point 8, stored minus one) and `g_idx`.
+    """
+    device = quantize_device()
+    config = profile[name]
+    from_p = move_to_device(from_p, device)
+    n, k = from_p.shape
+    group_size = config['group_size'] if config['group_size'] > 0 else k
+    assert k % group_size == 0, f"{name}: input size {k} is not a multiple of the group size {group_size}"
+
+    groups = from_p.float().view(n, k // group_size, group_size)
+    scale = (groups.abs().amax(dim=-1, keepdim=True) / 7.5).to(from_p.dtype)
+    q = torch.round(groups / scale.float().clamp_min(1e-12)).clamp(-8, 7).view(n, k) + 8
+    scale = scale.view(n, k // group_size)
+
+    prefix = name[:-len('weight')]
+    if config.get('format', 'pack_quantized') == 'gptq':
+        zeros = torch.full((k // group_size, n), 7, dtype=torch.int32, device=device)
+        return [
+            (prefix + 'qweight', pack_int4(q.t(), dim=0)),
+            (prefix + 'scales', scale.t().contiguous()),
+            (prefix + 'qzeros', pack_int4(zeros, dim=1)),
+            (prefix + 'g_idx', torch.arange(k, dtype=torch.int32, device=device) // group_size),
+        ]
+    return [
+        (prefix + 'weight_packed', pack_int4(q, dim=1)),
+        (prefix + 'weight_scale', scale),
+        (prefix + 'weight_shape', torch.tensor([n, k], dtype=torch.int64, device=device)),
+    ]
+
+def flash_quantize_w4a16(weights, profile):
+    logger.debug("flash_rl quantization is called")
+    for name, tensor in weights:
+        if name in profile:
+            quantized = w4a16_quantize(name, tensor, profile)
+            del tensor
+            yield from quantized
+        else:
+            yield (name, tensor)
 
 def flash_noquantize(weights, profile):
     logger.debug("flash_rl quantization is called")
@@ -131,8 +436,27 @@ quant_fn_map = {
     'fp8_vllm_fast': flash_noquantize,
     'fp8_tensor': flash_quantize_fp8_tensor,
     'fp8_channel': flash_quantize_fp8_channel,
+    'fp8_block': flash_quantize_fp8_block,
+    'w4a16': flash_quantize_w4a16,
 }
 
+def load_flashrl_profile(quant_profile, bf16_layers=None):
+    """Load a profile, applying the mixed-precision plan `bf16_layers` of the config if any."""
+    logger.debug(f"Loading flash_rl profile from: {quant_profile}")
+    
+    quant_profile_path = quant_profile.strip()
+    if not os.path.exists(quant_profile_path):
+        from huggingface_hub import hf_hub_download
+        quant_profile_path = quant_profile_path.split('/')
+        assert len(quant_profile_path) >= 3, f'Invalid flash_rl profile path: {quant_profile_path}'
+        quant_profile_path = hf_hub_download(repo_id='/'.join(quant_profile_path[:2]), filename='/'.join(quant_profile_path[2:]))
+    
+    profile = torch.load(quant_profile_path)
+    if bf16_layers:
+        logger.info(f"flash_rl keeps {len(bf16_layers)} weights in bf16")
+        profile = apply_mixed_precision_plan(profile, bf16_layers)
+    return profile
+
 def get_quantize_fn(name):
     if name not in quant_fn_map:
         logger.warning(f"Quantization function {name} not found, using identity mapping.")
@@ -145,11 +469,23 @@ def least_square(from_p, to_p, dim=-1):
     
     return beta
 
+def stack_expert_names(names):
+    """`names`, with the per-expert weights of MoE layers replaced by their stacked name (once)."""
+    stacked = dict()
+    for name in names:
+        expert = split_expert(name)
+        stacked[name if expert is None else expert[0]] = None
+    return list(stacked)
+
 def profiling_fp8(quantized_model, profile_save_to):
     m = AutoModelForCausalLM.from_pretrained(quantized_model, device_map="cpu")
     tokenizer = AutoTokenizer.from_pretrained(quantized_model)
     
-    profile = [k.replace('_scale', '') for k, v in m.named_parameters() if '_scale' in k]
+    # block-wise checkpoints name their weight scales `weight_scale_inv`
+    profile = stack_expert_names([
+        k[:-len('_scale_inv')] if k.endswith('_scale_inv') else k.replace('_scale', '')
+        for k, v in m.named_parameters() if '_scale' in k
+    ])
     
     delete_irrelevant_parameters(m)
     
@@ -170,89 +506,101 @@ def delete_irrelevant_parameters(model):
     for name in param_to_delete:
         delattr(model, name)
         
+def build_int8_profile(param, qparam, adapter=None):
+    """int8 profile from the parameters of the original and the (SmoothQuant) w8a8 model."""
+    profile = dict()
+    adapter = adapter or adapter_for(param)
+    matched = adapter.matches(param)
+    
+    input_scale = dict()
+    for k, (prefix, suffix) in matched.items():
+        if suffix in adapter.input_linears:
+            input_scale_k = qparam[k] / param[k].float()
+            profile[k] = {
+                'input_scale': input_scale_k,
+                'output_scale': 1.,
+                'type': qparam[k].data.dtype,
+            }
+            input_scale[k] = input_scale_k 
+    
+    for k, (prefix, suffix) in matched.items():
+        if suffix in adapter.plain_linears:
+            original_output_scale = qparam[k+'_scale'].view(-1, 1)
+            profile[k] = {
+                'input_scale': 1.0,
+                'output_scale': 1. / original_output_scale.float(),
+                'type': qparam[k].data.dtype,
+                'weight_scale': original_output_scale.float(),
+            }
+        elif suffix in adapter.smoothed_by:
+            input_scale_k = input_scale[prefix + adapter.smoothed_by[suffix]].view(1, -1)
+            original_output_scale = qparam[k+'_scale'].view(-1, 1)
+            
+            if suffix in adapter.output_sources:
+                additional_output_scale = least_square(
+                    (param[k].float() / input_scale_k / original_output_scale).view(param[k].shape[0], -1),
+                    qparam[k].view(param[k].shape[0], -1)
+                ).view(-1, 1)
+                input_scale[k] = additional_output_scale
+                original_output_scale = original_output_scale.float() / additional_output_scale
+            profile[k] = {
+                'input_scale': 1. / input_scale_k,
+                'output_scale': 1. / original_output_scale.float(),
+                'type': qparam[k].data.dtype,
+                'weight_scale': qparam[k+'_scale'].view(-1, 1).float(),
+            }
+                
+    for k, (prefix, suffix) in matched.items():
+        if suffix in adapter.output_linears:
+            input_scale_k = input_scale[prefix + adapter.output_linears[suffix]].view(1, -1)
+            original_output_scale = qparam[k+'_scale'].view(-1, 1)
+            profile[k] = {
+                'input_scale': 1. / input_scale_k,
+                'output_scale': 1. / original_output_scale.float(),
+                'type': qparam[k].data.dtype,
+                'weight_scale': original_output_scale.float(),
+            }
+
+    # MoE experts are unsmoothed, and profiled as one stacked entry with [E, N, 1] scales per expert weight
+    experts = {k: names for k, names in expert_groups(param, adapter).items() if names[0] + '_scale' in qparam}
+    for k, names in experts.items():
+        original_output_scale = torch.stack([qparam[n + '_scale'].view(-1, 1).float() for n in names])
+        profile[k] = {
+            'input_scale': 1.0,
+            'output_scale': 1. / original_output_scale,
+            'type': qparam[names[0]].data.dtype,
+            'weight_scale': original_output_scale,
+            'num_experts': len(names),
+        }
+    
+    return annotate_int8_errors(profile, param, experts)
+
+def checkpoint_tensors(model):
+    """All tensors of a safetensors checkpoint (local or on the hub), under their checkpoint names."""
+    import glob
+    from safetensors.torch import load_file
+
+    tensors = dict()
+    for path in sorted(glob.glob(os.path.join(_local_checkpoint(model), '*.safetensors'))):
+        tensors.update(load_file(path))
+    return tensors
+
 def profiling_int8(model, quantized_model, profile_save_to):
+    model_type = AutoConfig.from_pretrained(model).model_type
+    if model_type in registered_adapters() and len(get_adapter(model_type).expert_linears) > 0:
+        # transformers fuses the experts in memory; the engine loads the per-expert checkpoint names
+        param, qparam = checkpoint_tensors(model), checkpoint_tensors(quantized_model)
+        profile = build_int8_profile(param, qparam, get_adapter(model_type))
+        torch.save(profile, profile_save_to)
+        return
+
     m = AutoModelForCausalLM.from_pretrained(model, device_map="cpu")
     qmodel = AutoModelForCausalLM.from_pretrained(quantized_model, device_map="cpu")
     tokenizer = AutoTokenizer.from_pretrained(quantized_model)
     
-    profile = dict()
-    
     param = {k: v for k, v in m.named_parameters()}
     qparam = {k: v for k, v in qmodel.named_parameters()}
-    
-    layernorm_list = ['layernorm']
-    input_linear_map = {
-        'self_attn.q_proj.weight': 'input_layernorm.weight',
-        'self_attn.k_proj.weight': 'input_layernorm.weight',
-        'self_attn.v_proj.weight': 'input_layernorm.weight',
-        'self_attn.o_proj.weight': None,
-        'mlp.gate_proj.weight': 'post_attention_layernorm.weight',
-        'mlp.up_proj.weight': 'post_attention_layernorm.weight',
-    }
-    extra_output_list = ['mlp.up_proj.weight']
-    output_linear_map = {
-        'mlp.down_proj.weight': 'mlp.up_proj.weight',
-    }
-    exclude_list = [
-        'bias', 
-        'lm_head.weight',
-        'model.norm.weight',
-        'embed_tokens',
-    ]
-    
-    input_scale = dict()
-    for k, v in param.items():
-        for key in layernorm_list:
-            if key in k:
-                input_scale_k = qparam[k] / param[k].float()
-                profile[k] = {
-                    'input_scale': input_scale_k,
-                    'output_scale': 1.,
-                    'type': qparam[k].data.dtype,
-                }
-                input_scale[k] = input_scale_k 
-    
-    for k, v in param.items():
-        for balance, smooth in input_linear_map.items():
-            if balance in k:
-                if smooth is None:
-                    original_output_scale = qparam[k+'_scale'].view(-1, 1)
-                    profile[k] = {
-                        'input_scale': 1.0,
-                        'output_scale': 1. / original_output_scale.float(),
-                        'type': qparam[k].data.dtype,
-                    }
-                else:
-                    input_name = k.replace(balance, smooth)
-                    input_scale_k = input_scale[input_name].view(1, -1)
-                    original_output_scale = qparam[k+'_scale'].view(-1, 1)
-                    
-                    if any(ei in k for ei in extra_output_list):
-                        additional_output_scale = least_square(
-                            (param[k].float() / input_scale_k / original_output_scale).view(param[k].shape[0], -1),
-                            qparam[k].view(param[k].shape[0], -1)
-                        ).view(-1, 1)
-                        input_scale[k] = additional_output_scale
-                        original_output_scale = original_output_scale.float() / additional_output_scale
-                    profile[k] = {
-                        'input_scale': 1. / input_scale_k,
-                        'output_scale': 1. / original_output_scale.float(),
-                        'type': qparam[k].data.dtype,
-                    }
-                break
-                
-    for k, v in param.items():
-        for balance, smooth in output_linear_map.items():
-            if balance in k:
-                input_name = k.replace(balance, smooth)
-                input_scale_k = input_scale[input_name].view(1, -1)
-                original_output_scale = qparam[k+'_scale'].view(-1, 1)
-                profile[k] = {
-                    'input_scale': 1. / input_scale_k,
-                    'output_scale': 1. / original_output_scale.float(),
-                    'type': qparam[k].data.dtype,
-                }
-                break
+    profile = build_int8_profile(param, qparam, adapter_for(param, model_type))
     
     # delete_irrelevant_parameters(qmodel)
     
@@ -260,3 +608,409 @@ def profiling_int8(model, quantized_model, profile_save_to):
     # tokenizer.save_pretrained(profile_save_to)
     # torch.save(profile, os.path.join(profile_save_to, 'profile.pt'))
     torch.save(profile, profile_save_to)
+
+
+def _int8_error_terms(weight, entry, expert=None):
+    input_scale, output_scale, weight_scale = (
+        _select_experts(entry[key], expert) for key in ('input_scale', 'output_scale', 'weight_scale')
+    )
+    scaled = weight.float() * input_scale * output_scale
+    reference = scaled * weight_scale
+    error = (torch.round(scaled).clamp(min=-128, max=127) * weight_scale - reference).pow(2).sum()
+    return error, reference.pow(2).sum()
+
+def int8_quantization_error(weight, entry):
+    """Relative MSE of the weight the engine computes with, once `weight` is quantized by the int8 profile `entry`."""
+    error, reference = _int8_error_terms(weight, entry)
+    return (error / reference.clamp_min(1e-30)).item()
+
+@torch.no_grad()
+def annotate_int8_errors(profile, param, experts=None):
+    """
+    Record the quantization `error` and `numel` of every int8 entry, used to plan
+    mixed precision; stacked expert entries are measured over the per-expert
+    weights `experts[name]`.
+    """
+    experts = experts or dict()
+    for k, entry in profile.items():
+        if entry['type'] != torch.int8:
+            continue
+        if k in experts:
+            terms = [_int8_error_terms(param[n], entry, e) for e, n in enumerate(experts[k])]
+            error, reference = (sum(t) for t in zip(*terms))
+            entry['error'] = (error / reference.clamp_min(1e-30)).item()
+            entry['numel'] = sum(param[n].numel() for n in experts[k])
+        else:
+            entry['error'] = int8_quantization_error(param[k], entry)
+            entry['numel'] = param[k].numel()
+    return profile
+
+def expert_groups(names, adapter):
+    """`{stacked_name: per-expert names, in expert order}` of the MoE expert weights among `names`."""
+    groups = dict()
+    for name in names:
+        m = adapter.expert_match(name)
+        if m is not None and m[1] is not None:
+            groups.setdefault(m[0], []).append((m[1], name))
+    return {stacked: [n for _, n in sorted(group)] for stacked, group in groups.items()}
+
+def plan_mixed_precision(profile, bf16_budget, adapter=None):
+    """
+    Int8 weights to keep in bf16: fused linears (which share one precision in the
+    engine) by decreasing quantization error, as long as they hold at most
+    `bf16_budget` (a fraction) of the int8 weight elements, i.e., of the int8
+    weight memory and GEMM work given up.
+    """
+    adapter = adapter or adapter_for(profile)
+    groups = dict()
+    for k, entry in profile.items():
+        if entry['type'] != torch.int8 or 'num_experts' in entry:
+            # experts stay int8: they dominate the weights of MoE models
+            continue
+        if 'error' not in entry:
+            raise ValueError(f"profile entry {k} has no quantization error, re-run `flashrl profile` to record it")
+        groups.setdefault(adapter.fused_linear_of(k), []).append(k)
+
+    def numel(names):
+        return sum(profile[k]['numel'] for k in names)
+
+    def error(names):
+        return sum(profile[k]['error'] * profile[k]['numel'] for k in names) / max(numel(names), 1)
+
+    remaining = bf16_budget * sum(numel(names) for names in groups.values())
+    plan = []
+    for group in sorted(groups, key=lambda g: error(groups[g]), reverse=True):
+        if numel(groups[group]) <= remaining:
+            remaining -= numel(groups[group])
+            plan += groups[group]
+    return sorted(plan)
+
+def apply_mixed_precision_plan(profile, bf16_layers):
+    """
+    Copy of an int8 profile with the `bf16_layers` weights re-scaled but not
+    quantized: they keep the smoothing of their inputs and the row scales the
+    int8 weight scale absorbed, so they match bf16 linears fed by the same
+    (smoothed) layernorms.
+    """
+    dtype = next((e['type'] for e in profile.values() if e['type'] != torch.int8), torch.bfloat16)
+    profile = dict(profile)
+    for k in bf16_layers:
+        entry = profile.get(k)
+        if entry is None or entry['type'] != torch.int8:
+            raise ValueError(f"{k} is not an int8 weight of the profile")
+        if 'weight_scale' not in entry:
+            raise ValueError(f"profile entry {k} has no weight scale, re-run `flashrl profile` to record it")
+        profile[k] = {
+            'input_scale': entry['input_scale'],
+            'output_scale': entry['output_scale'] * entry['weight_scale'],
+            'type': dtype,
+        }
+    return profile
+
+def _local_checkpoint(model):
+    if os.path.isdir(model):
+        return model
+    from huggingface_hub import snapshot_download
+    return snapshot_download(model)
+
+def save_mixed_precision_checkpoint(model, quantized_model, profile, bf16_layers, save_to):
+    """
+    Copy of the w8a8 `quantized_model` the engine starts from, with the
+    `bf16_layers` of a mixed-precision plan stored unquantized (the original
+    `model` weights, re-scaled as `apply_mixed_precision_plan`) and added to
+    the `ignore` list of its quantization config.
+    """
+    import glob
+    import json
+    import shutil
+    from safetensors import safe_open
+    from safetensors.torch import load_file, save_file
+
+    model, quantized_model = _local_checkpoint(model), _local_checkpoint(quantized_model)
+    mixed = apply_mixed_precision_plan(profile, bf16_layers)
+    bf16_layers = set(bf16_layers)
+    original = dict()
+    for path in glob.glob(os.path.join(model, '*.safetensors')):
+        with safe_open(path, 'pt') as f:
+            for k in bf16_layers.intersection(f.keys()):
+                original[k] = f.get_tensor(k)
+    missing = bf16_layers.difference(original)
+    assert len(missing) == 0, f"weights {sorted(missing)[:4]} not found in {model}"
+
+    os.makedirs(save_to, exist_ok=True)
+    dropped = {k + '_scale' for k in bf16_layers} | {k[:-len('weight')] + 'input_scale' for k in bf16_layers}
+    for path in glob.glob(os.path.join(quantized_model, '*')):
+        target = os.path.join(save_to, os.path.basename(path))
+        if path.endswith('.safetensors'):
+            tensors = load_file(path)
+            for k in bf16_layers.intersection(tensors):
+                tensors[k] = linear_quantize(k, original[k], mixed).cpu()
+            save_file({k: v for k, v in tensors.items() if k not in dropped}, target, metadata={'format': 'pt'})
+        elif os.path.basename(path) in ('config.json', 'model.safetensors.index.json'):
+            with open(path) as fin:
+                config = json.load(fin)
+            if 'weight_map' in config:
+                config['weight_map'] = {k: v for k, v in config['weight_map'].items() if k not in dropped}
+            else:
+                ignore = config['quantization_config'].setdefault('ignore', [])
+                ignore += sorted(k[:-len('.weight')] for k in bf16_layers)
+            with open(target, 'w') as fout:
+                json.dump(config, fout, indent=2)
+        elif os.path.isfile(path):
+            shutil.copy(path, target)
+    logger.info(f"flash_rl mixed-precision checkpoint with {len(bf16_layers)} bf16 weights saved to {save_to}")
+
+
+# SmoothQuant alpha: how much of the activation outliers moves into the weights
+DEFAULT_SMOOTHQUANT_ALPHA = 0.5
+
+def collect_activation_scales(model, batches, adapter=None):
+    """
+    Per-channel max |input| of the linears the adapter calibrates (e.g., q_proj /
+    gate_proj / down_proj), gathered with forward hooks over streamed `batches`
+    (dicts with `input_ids` and an optional `attention_mask`; padded positions
+    are ignored).
+    """
+    scales, hooks, current = {}, [], {}
+    if adapter is None:
+        model_type = getattr(getattr(model, 'config', None), 'model_type', None)
+        adapter = adapter_for([k for k, _ in model.named_parameters()], model_type)
+    targets = tuple(k[:-len('.weight')] for k in adapter.calibration_inputs)
+
+    def make_hook(name):
+        def hook(module, inputs, output):
+            x = inputs[0]
+            mask = current.get('attention_mask')
+            x = x[mask.bool()] if mask is not None and mask.shape == x.shape[:-1] else x.reshape(-1, x.shape[-1])
+            if x.shape[0] == 0:
+                return
+            amax = x.detach().abs().amax(dim=0).float().cpu()
+            scales[name] = torch.maximum(scales[name], amax) if name in scales else amax
+        return hook
+
+    for name, module in model.named_modules():
+        if name.endswith(targets):
+            hooks.append(module.register_forward_hook(make_hook(name + '.weight')))
+    device = next(model.parameters()).device
+    try:
+        with torch.no_grad():
+            for batch in batches:
+                batch = {k: v.to(device) for k, v in batch.items()}
+                current['attention_mask'] = batch.get('attention_mask')
+                model(**batch, use_cache=False)
+    finally:
+        for hook in hooks:
+            hook.remove()
+    return scales
+
+def smooth_factor(act_scale, weight_scale, alpha=DEFAULT_SMOOTHQUANT_ALPHA):
+    """SmoothQuant per-channel factor `max|X|^alpha / max|W|^(1 - alpha)`."""
+    return (act_scale.float().clamp_min(1e-5) ** alpha / weight_scale.float().clamp_min(1e-5) ** (1 - alpha)).clamp_min(1e-5)
+
+def _int8_channel_scale(weight):
+    return (weight.abs().amax(dim=1, keepdim=True) / 127.).clamp_min(1e-8)
+
+def build_smoothquant_int8(param, act_scales, alpha=DEFAULT_SMOOTHQUANT_ALPHA, adapter=None):
+    """
+    int8 profile (same structure as `build_int8_profile`) and the matching w8a8
+    checkpoint tensors, from the original parameters and calibrated activation
+    scales: layernorm outputs are smoothed into the linears they feed (e.g.,
+    q/k/v and gate/up), the down_proj input into up_proj; every linear gets a
+    per-channel int8 weight scale.
+    """
+    adapter = adapter or adapter_for(param)
+    matched = adapter.matches(param)
+    profile, row_scale = dict(), dict()
+    for k, (prefix, suffix) in matched.items():
+        smooth = adapter.calibration_inputs.get(suffix)
+        if smooth is None or k not in act_scales:
+            continue
+        balanced = [prefix + b for b in adapter.input_linears.get(smooth, [suffix])]
+        weight_scale = torch.stack([param[b].float().abs().amax(dim=0) for b in balanced]).amax(dim=0)
+        s = smooth_factor(act_scales[k], weight_scale, alpha)
+        for b in balanced:
+            profile[b] = {'input_scale': s.view(1, -1), 'type': torch.int8}
+        if smooth in adapter.input_linears:
+            profile[prefix + smooth] = {'input_scale': 1. / s, 'output_scale': 1., 'type': param[prefix + smooth].dtype}
+        else:
+            # smoothed into the output channels of the previous linear
+            row_scale[prefix + smooth] = s.view(-1, 1)
+
+    for k, (prefix, suffix) in matched.items():
+        if suffix in adapter.plain_linears:
+            profile[k] = {'input_scale': 1.0, 'type': torch.int8}
+
+    qparam = dict()
+    for k, entry in profile.items():
+        if entry['type'] != torch.int8:
+            qparam[k] = linear_quantize(k, param[k], profile).cpu()
+            continue
+        smoothed = param[k].float() * entry['input_scale']
+        divisor = row_scale.get(k)
+        if divisor is not None:
+            smoothed = smoothed / divisor
+        scale = _int8_channel_scale(smoothed)
+        entry['output_scale'] = 1. / (scale * divisor if divisor is not None else scale)
+        entry['weight_scale'] = scale
+        qparam[k] = torch.round(smoothed / scale).clamp(min=-128, max=127).to(torch.int8)
+        qparam[k + '_scale'] = scale
+    return annotate_int8_errors(profile, param), qparam
+
+def load_calibration_texts(dataset, num_samples):
+    """Texts of a `.txt` (one per line) / `.jsonl` file, or of a HF dataset `name[:split]` (needs `datasets`)."""
+    import json
+
+    def first_text(record):
+        if 'text' in record:
+            return record['text']
+        return next(v for v in record.values() if isinstance(v, str))
+
+    texts = []
+    if os.path.exists(dataset):
+        with open(dataset, 'r', encoding='utf-8') as fin:
+            for line in fin:
+                if line.strip():
+                    texts.append(first_text(json.loads(line)) if dataset.endswith('.jsonl') else line.rstrip('\n'))
+                if len(texts) >= num_samples:
+                    break
+        return texts
+
+    try:
+        from datasets import load_dataset
+    except ImportError as e:
+        raise ImportError(f"calibration dataset {dataset} is not a local file, and `datasets` is not installed") from e
+    name, _, split = dataset.partition(':')
+    for record in load_dataset(name, split=split or 'train', streaming=True):
+        texts.append(first_text(record))
+        if len(texts) >= num_samples:
+            break
+    return texts
+
+def iter_calibration_batches(tokenizer, texts, seq_len, batch_size):
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    for i in range(0, len(texts), batch_size):
+        yield dict(tokenizer(
+            texts[i:i + batch_size], return_tensors='pt', padding=True, truncation=True, max_length=seq_len,
+        ))
+
+# compressed-tensors config of a w8a8 checkpoint: int8 per-channel weights, dynamic per-token activations
+W8A8_QUANTIZATION_CONFIG = {
+    'config_groups': {
+        'group_0': {
+            'input_activations': {'dynamic': True, 'num_bits': 8, 'strategy': 'token', 'symmetric': True, 'type': 'int'},
+            'targets': ['Linear'],
+            'weights': {'dynamic': False, 'num_bits': 8, 'strategy': 'channel', 'symmetric': True, 'type': 'int'},
+        },
+    },
+    'format': 'int-quantized',
+    'ignore': ['lm_head'],
+    'quant_method': 'compressed-tensors',
+    'quantization_status': 'compressed',
+}
+
+def save_w8a8_checkpoint(model, tokenizer, qparam, save_to):
+    """Write the model with the calibrated w8a8 tensors as a compressed-tensors checkpoint vllm can load."""
+    from safetensors.torch import save_file
+
+    os.makedirs(save_to, exist_ok=True)
+    state, seen = dict(), set()
+    for k, v in model.state_dict().items():
+        if v.data_ptr() in seen:
+            # tied weights (e.g., lm_head): stored once
+            continue
+        seen.add(v.data_ptr())
+        state[k] = v
+    state.update(qparam)
+    save_file({k: v.contiguous().cpu() for k, v in state.items()}, os.path.join(save_to, 'model.safetensors'), metadata={'format': 'pt'})
+
+    model.config.quantization_config = W8A8_QUANTIZATION_CONFIG
+    model.config.save_pretrained(save_to)
+    tokenizer.save_pretrained(save_to)
+
+def profiling_int8_calibrate(
+    model,
+    dataset,
+    quantized_save_to,
+    profile_save_to,
+    num_samples=128,
+    seq_len=512,
+    batch_size=8,
+    alpha=DEFAULT_SMOOTHQUANT_ALPHA,
+):
+    """
+    SmoothQuant int8 profile from the bf16 `model` and a calibration `dataset`,
+    without a pre-quantized checkpoint: the matching w8a8 checkpoint (for the
+    rollout engine to start from) is written to `quantized_save_to`.
+    """
+    m = AutoModelForCausalLM.from_pretrained(model, torch_dtype='auto').to(quantize_device()).eval()
+    tokenizer = AutoTokenizer.from_pretrained(model)
+
+    param = {k: v.detach().cpu() for k, v in m.named_parameters()}
+    adapter = adapter_for(param, m.config.model_type)
+    if len(adapter.expert_linears) > 0:
+        raise ValueError(f"calibration does not support MoE models ({adapter.name}), profile a w8a8 checkpoint instead")
+
+    texts = load_calibration_texts(dataset, num_samples)
+    logger.info(f"flash_rl calibrating {model} ({adapter.name}) on {len(texts)} samples")
+    act_scales = collect_activation_scales(m, iter_calibration_batches(tokenizer, texts, seq_len, batch_size), adapter)
+
+    profile, qparam = build_smoothquant_int8(param, act_scales, alpha, adapter)
+    save_w8a8_checkpoint(m, tokenizer, qparam, quantized_save_to)
+    torch.save(profile, profile_save_to)
+    logger.info(f"flash_rl int8 profile saved to {profile_save_to}, w8a8 checkpoint to {quantized_save_to}")
+
+
+def build_w4a16_profile(param_names, quantization_config):
+    """
+    w4a16 profile from the parameter names and `quantization_config` of a 4-bit
+    compressed-tensors (`pack-quantized`) or GPTQ checkpoint: the quantized
+    weights, with the group size and packing format to re-quantize them with.
+    """
+    method = quantization_config.get('quant_method')
+    if method == 'compressed-tensors':
+        groups = list(quantization_config.get('config_groups', {}).values())
+        assert len(groups) == 1, f"expected a single config group, got {len(groups)}"
+        weights = groups[0]['weights']
+        bits, symmetric, group_size = weights['num_bits'], weights.get('symmetric', True), weights.get('group_size')
+        actorder = weights.get('actorder')
+        fmt, suffix = 'pack_quantized', '.weight_packed'
+    elif method == 'gptq':
+        bits, symmetric = quantization_config['bits'], quantization_config.get('sym', True)
+        group_size, actorder = quantization_config.get('group_size', -1), quantization_config.get('desc_act', False)
+        fmt, suffix = 'gptq', '.qweight'
+    else:
+        # e.g., AWQ: asymmetric zero points and activation-aware scales are not reproduced online
+        raise ValueError(f"w4a16 profiling supports compressed-tensors and GPTQ checkpoints, got {method}")
+
+    assert bits == 4, f"w4a16 needs a 4-bit checkpoint, got {bits} bits"
+    assert symmetric, "w4a16 re-quantization is symmetric, the checkpoint is not"
+    assert not actorder, "w4a16 re-quantization does not support activation reordering"
+
+    return {
+        name[:-len(suffix)] + '.weight': {'group_size': group_size or -1, 'format': fmt, 'num_bits': bits}
+        for name in param_names if name.endswith(suffix)
+    }
+
+def profiling_w4a16(quantized_model, profile_save_to):
+    """Profile a 4-bit checkpoint from its config and safetensors headers, without loading the weights."""
+    import json
+    import glob
+    from safetensors import safe_open
+
+    if os.path.isdir(quantized_model):
+        with open(os.path.join(quantized_model, 'config.json')) as fin:
+            config = json.load(fin)
+        param_names = []
+        for path in glob.glob(os.path.join(quantized_model, '*.safetensors')):
+            with safe_open(path, 'pt') as f:
+                param_names += list(f.keys())
+    else:
+        from huggingface_hub import get_safetensors_metadata, hf_hub_download
+        with open(hf_hub_download(quantized_model, 'config.json')) as fin:
+            config = json.load(fin)
+        param_names = list(get_safetensors_metadata(quantized_model).weight_map)
+
+    profile = build_w4a16_profile(param_names, config['quantization_config'])
+    logger.info(f"flash_rl w4a16 profile covers {len(profile)} weights")
+    torch.save(profile, profile_save_to)
@@ -0,0 +1,155 @@
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, List, NamedTuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# collector the patched sampler records into, set while `PackedLogprobCollector.active()`
+_active_collector = None
+
+
+class PackedLogprobs(NamedTuple):
+    """
+    Sampled-token logprobs of a batch of requests, packed as `values[offsets[i]:offsets[i + 1]]`,
+    with per-token `diagnostics` (e.g., `post_filter_entropy`) packed the same way.
+    """
+
+    values: Any
+    offsets: Any
+    request_ids: List[str]
+    diagnostics: Dict[str, Any]
+
+
+def get_active_collector():
+    return _active_collector
+
+
+class PackedLogprobCollector:
+    """Keeps per-step sampled-token logprobs on device and packs them per request.
+
+    `req_ids_fn` returns the request ids of the rows of the current step (e.g., the
+    vLLM model runner's `input_batch.req_ids`); each step costs one small index
+    tensor when the batch composition changes, and no per-token Python objects.
+    """
+
+    def __init__(self, req_ids_fn):
+        self.req_ids_fn = req_ids_fn
+        self.steps = []
+        self.request_index = {}
+        self._last_req_ids = None
+        self._last_rows = None
+
+    def record(self, logprobs, **diagnostics):
+        """Record the `[B]` sampled-token logprobs of one sampler step, and `[B]` per-token diagnostics."""
+        req_ids = list(self.req_ids_fn())[:logprobs.shape[0]]
+        if req_ids != self._last_req_ids:
+            rows = [self.request_index.setdefault(r, len(self.request_index)) for r in req_ids]
+            self._last_rows = torch.tensor(rows, dtype=torch.long, device=logprobs.device)
+            self._last_req_ids = req_ids
+        diagnostics = {k: v.detach().reshape(-1) for k, v in diagnostics.items()}
+        self.steps.append((self._last_rows, logprobs.detach().reshape(-1).float(), diagnostics))
+
+    def pack(self, request_lengths=None):
+        """
+        Pack the recorded logprobs per request, in step order.
+
+        `request_lengths` is a list of `(request_id, num_output_tokens)` selecting and
+        ordering the requests; only the last `num_output_tokens` samples of each are
+        kept, dropping samples the engine discarded (e.g., partial prefill chunks).
+        By default, every request is packed in first-seen order.
+        """
+        if len(self.steps) == 0:
+            ids = [] if request_lengths is None else [r for r, _ in request_lengths]
+            return PackedLogprobs(torch.empty(0), torch.zeros(len(ids) + 1, dtype=torch.long), ids, {})
+
+        rows = torch.cat([r for r, _, _ in self.steps])
+        values = torch.cat([v for _, v, _ in self.steps])
+        device = values.device
+        num_requests = len(self.request_index)
+        counts = torch.bincount(rows, minlength=num_requests)
+
+        if request_lengths is None:
+            request_ids = sorted(self.request_index, key=self.request_index.get)
+            selected = torch.arange(num_requests, device=device)
+            wanted = counts
+        else:
+            request_ids = [r for r, _ in request_lengths]
+            selected = torch.tensor([self.request_index.get(r, -1) for r in request_ids], dtype=torch.long)
+            if bool((selected < 0).any()):
+                missing = [r for r in request_ids if r not in self.request_index]
+                raise KeyError(f"flash_rl packed outputs: no logprobs recorded for requests {missing[:4]}")
+            selected = selected.to(device)
+            wanted = torch.zeros_like(counts)
+            wanted[selected] = torch.tensor([n for _, n in request_lengths], dtype=torch.long, device=device)
+            wanted = torch.minimum(wanted, counts)
+
+        rank = torch.full((num_requests,), -1, dtype=torch.long, device=device)
+        rank[selected] = torch.arange(selected.numel(), device=device)
+
+        # position of every sample within its request, in step order
+        by_request = torch.sort(rows, stable=True).indices
+        starts = torch.cumsum(counts, 0) - counts
+        position = torch.arange(rows.numel(), device=device) - starts[rows[by_request]]
+        keep = (position >= (counts - wanted)[rows[by_request]]) & (rank[rows[by_request]] >= 0)
+        kept = by_request[keep]
+        kept = kept[torch.sort(rank[rows[kept]], stable=True).indices]
+
+        lengths = wanted[selected]
+        offsets = torch.zeros(lengths.numel() + 1, dtype=torch.long, device=device)
+        offsets[1:] = torch.cumsum(lengths, 0)
+        diagnostics = {k: torch.cat([d[k] for _, _, d in self.steps])[kept] for k in self.steps[0][2]}
+        return PackedLogprobs(values[kept], offsets, request_ids, diagnostics)
+
+    @contextmanager
+    def active(self):
+        global _active_collector
+        previous, _active_collector = _active_collector, self
+        try:
+            yield self
+        finally:
+            _active_collector = previous
+
+
+def find_model_runner(llm):
+    """
+    Model runner of a vLLM `LLM` whose engine runs in this process (V0, or V1 with an
+    in-process engine core, e.g., with the `external_launcher` executor).
+    """
+    engine = llm.llm_engine
+    executor = getattr(engine, 'model_executor', None)
+    if executor is None:
+        # V1: the engine core client, or the engine core it wraps in process
+        engine_core = getattr(engine, 'engine_core', None)
+        executor = getattr(engine_core, 'model_executor', None) or \
+            getattr(getattr(engine_core, 'engine_core', None), 'model_executor', None)
+    worker = getattr(getattr(executor, 'driver_worker', None), 'worker', None)
+    if worker is None or getattr(worker, 'model_runner', None) is None:
+        raise RuntimeError(
+            "flash_rl needs the vLLM model runner in this process, but the engine runs it in "
+            "another one; use `distributed_executor_backend='external_launcher'` or set "
+            "VLLM_ENABLE_V1_MULTIPROCESSING=0"
+        )
+    return worker.model_runner
+
+
+def generate_packed(llm, *args, **kwargs):
+    """
+    `llm.generate(*args, **kwargs)`, also returning the `PackedLogprobs` of the sampled
+    tokens (and per-token diagnostics) recorded by the patched sampler, one sequence
+    per completion, in output order.
+
+    With `n > 1`, vLLM V1 runs every completion as a child request `"{index}_{parent}"`;
+    those are the `request_ids` of the packed completions.
+    """
+    model_runner = find_model_runner(llm)
+    collector = PackedLogprobCollector(lambda: model_runner.input_batch.req_ids)
+    with collector.active():
+        outputs = llm.generate(*args, **kwargs)
+    packed = collector.pack([
+        (o.request_id if len(o.outputs) == 1 else f"{c.index}_{o.request_id}", len(c.token_ids))
+        for o in outputs
+        for c in o.outputs
+    ])
+    return outputs, packed
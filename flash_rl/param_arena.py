@@ -0,0 +1,101 @@
+import logging
+from collections import OrderedDict
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# offsets inside a flat buffer are aligned to this many bytes so that every view
+# satisfies the alignment requirements of vectorized / marlin-style kernels
+ARENA_ALIGNMENT_BYTES = 256
+
+
+def storage_span(shape, stride):
+    """Number of elements a (shape, stride) view touches in its storage."""
+    if any(s == 0 for s in shape):
+        return 0
+    return 1 + sum((s - 1) * st for s, st in zip(shape, stride))
+
+
+def _align(numel, element_size, alignment):
+    step = max(alignment // element_size, 1)
+    return (numel + step - 1) // step * step
+
+
+class ParamArena:
+    """Lay out a set of named tensors in one flat buffer per (device, dtype).
+
+    Every tensor is replaced by a view with its original shape and stride, so the
+    kernels consuming the parameters are unaware of the change, while bulk
+    transfers (syncs, snapshots, IPC) only touch a handful of large buffers.
+    """
+
+    def __init__(self, named_tensors, alignment=ARENA_ALIGNMENT_BYTES):
+        self.alignment = alignment
+        self.layout = OrderedDict()  # name -> (key, offset, shape, stride)
+        self.buffers = OrderedDict()  # (device, dtype) -> flat 1-d tensor
+
+        sizes = OrderedDict()
+        for name, tensor in named_tensors:
+            key = (tensor.device, tensor.dtype)
+            offset = sizes.get(key, 0)
+            span = storage_span(tensor.shape, tensor.stride())
+            self.layout[name] = (key, offset, tuple(tensor.shape), tuple(tensor.stride()))
+            sizes[key] = offset + _align(span, tensor.element_size(), alignment)
+
+        for (device, dtype), numel in sizes.items():
+            self.buffers[(device, dtype)] = torch.empty(numel, dtype=dtype, device=device)
+
+        self.views = OrderedDict()
+        for name, (key, offset, shape, stride) in self.layout.items():
+            self.views[name] = torch.as_strided(self.buffers[key], shape, stride, offset)
+
+    @classmethod
+    def from_module(cls, module, alignment=ARENA_ALIGNMENT_BYTES):
+        """Build an arena for all parameters of `module` and rebind them to it."""
+        named_params = []
+        seen_storages = set()
+        for name, p in module.named_parameters():
+            storage_ptr = p.untyped_storage().data_ptr()
+            if storage_ptr in seen_storages:
+                # params aliasing another param's storage (e.g., fused views) keep their storage
+                logger.debug(f"flash_rl param arena skips aliased param {name}")
+                continue
+            seen_storages.add(storage_ptr)
+            named_params.append((name, p))
+
+        arena = cls(((n, p.data) for n, p in named_params), alignment=alignment)
+        with torch.no_grad():
+            for name, p in named_params:
+                view = arena.views[name]
+                view.copy_(p.data)
+                tmp_data = p.data
+                p.data = view
+                del tmp_data
+
+        logger.debug(
+            f"flash_rl param arena: {len(arena.views)} params in {len(arena.buffers)} buffers, "
+            f"{arena.nbytes() / 2**20:.1f} MiB"
+        )
+        return arena
+
+    def nbytes(self):
+        return sum(b.numel() * b.element_size() for b in self.buffers.values())
+
+    def flat_buffers(self):
+        """Return the flat buffers as a list of (key, tensor), in a stable order."""
+        return list(self.buffers.items())
+
+    def same_layout(self, other):
+        return self.layout == other.layout
+
+    def copy_from(self, other, non_blocking=False):
+        """Copy all tensors from an arena with an identical layout, one memcpy per buffer."""
+        assert self.same_layout(other), "flash_rl param arena layouts do not match"
+        for key, buffer in self.buffers.items():
+            buffer.copy_(other.buffers[key], non_blocking=non_blocking)
+
+    def owns(self, tensor):
+        """Check whether `tensor` is a view into one of the arena buffers."""
+        ptr = tensor.untyped_storage().data_ptr()
+        return any(b.untyped_storage().data_ptr() == ptr for b in self.buffers.values())
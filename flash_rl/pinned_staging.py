@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOT_MB = 64
+DEFAULT_NUM_SLOTS = 4
+
+
+class PinnedStagingRing:
+    """Ring of pinned host buffers used to stage pageable host-to-device copies.
+
+    `tensor.to(device, non_blocking=True)` is synchronous when `tensor` lives in
+    pageable memory. Here the source is copied chunk by chunk into a pinned slot
+    (a host memcpy) and the slot is uploaded asynchronously; a slot is only reused
+    once the event recorded after its upload has completed, so the host copy of the
+    next chunk overlaps with the DMA of the previous ones.
+    """
+
+    def __init__(self, slot_bytes=DEFAULT_SLOT_MB * 2**20, num_slots=DEFAULT_NUM_SLOTS):
+        self.slot_bytes = slot_bytes
+        self.num_slots = num_slots
+        self.slots = None
+        self.events = [None] * num_slots
+        self.next_slot = 0
+        self.lock = threading.Lock()
+
+    def _allocate(self):
+        self.slots = [
+            torch.empty(self.slot_bytes, dtype=torch.uint8, pin_memory=True)
+            for _ in range(self.num_slots)
+        ]
+        logger.debug(
+            f"flash_rl pinned staging ring allocated: {self.num_slots} x {self.slot_bytes / 2**20:.0f} MiB"
+        )
+
+    def _record_event(self, device):
+        event = torch.cuda.Event()
+        event.record(torch.cuda.current_stream(device))
+        return event
+
+    def _stage(self, src, dst, device):
+        """Copy the bytes of `src` into `dst` on `device`, one slot-sized chunk at a time."""
+        with self.lock:
+            if self.slots is None:
+                self._allocate()
+            for start in range(0, src.numel(), self.slot_bytes):
+                end = min(start + self.slot_bytes, src.numel())
+                i = self.next_slot
+                self.next_slot = (i + 1) % self.num_slots
+                if self.events[i] is not None:
+                    # wait for the previous upload from this slot before overwriting it
+                    self.events[i].synchronize()
+                slot = self.slots[i][:end - start]
+                slot.copy_(src[start:end])
+                dst[start:end].copy_(slot, non_blocking=True)
+                self.events[i] = self._record_event(device)
+
+    def to_device(self, tensor, device):
+        device = torch.device(device)
+        if (
+            device.type != 'cuda'
+            or tensor.device.type != 'cpu'
+            or tensor.is_pinned()
+            or tensor.numel() == 0
+        ):
+            return tensor.to(device, non_blocking=True)
+
+        src = tensor.detach().contiguous().reshape(-1).view(torch.uint8)
+        out = torch.empty(tensor.shape, dtype=tensor.dtype, device=device)
+        self._stage(src, out.reshape(-1).view(torch.uint8), device)
+        return out
+
+
+_staging_ring = None
+
+
+def get_staging_ring():
+    """Process-wide staging ring configured by `FLASHRL_PINNED_STAGING_*`, or None if disabled."""
+    global _staging_ring
+    if os.environ.get('FLASHRL_PINNED_STAGING', '1') == '0' or not torch.cuda.is_available():
+        return None
+    if _staging_ring is None:
+        _staging_ring = PinnedStagingRing(
+            slot_bytes=int(os.environ.get('FLASHRL_PINNED_STAGING_MB', DEFAULT_SLOT_MB)) * 2**20,
+            num_slots=int(os.environ.get('FLASHRL_PINNED_STAGING_SLOTS', DEFAULT_NUM_SLOTS)),
+        )
+    return _staging_ring
+
+
+def stage_to_device(tensor, device):
+    """Move `tensor` to `device`, staging pageable host memory through the pinned ring."""
+    ring = get_staging_ring()
+    if ring is None:
+        return tensor.to(device, non_blocking=True)
+    return ring.to_device(tensor, device)
@@ -0,0 +1,26 @@
+import os
+
+# diagnostics are small per-token summaries, shipped back as fp16
+DIAGNOSTICS_DTYPE_NAME = 'float16'
+
+
+def diagnostics_enabled():
+    """Per-token rollout diagnostics are computed when `FLASHRL_ROLLOUT_DIAGNOSTICS=1`."""
+    return os.environ.get('FLASHRL_ROLLOUT_DIAGNOSTICS', '0') == '1'
+
+
+def entropy_from_logprobs(logprobs):
+    """Entropy of each row of a log-distribution whose filtered tokens are `-inf`, as fp16."""
+    import torch
+
+    probs = logprobs.exp()
+    entropy = -(probs * logprobs.masked_fill(probs == 0, 0.0)).sum(dim=-1)
+    return entropy.to(getattr(torch, DIAGNOSTICS_DTYPE_NAME))
+
+
+def filtered_mass_from_log_normalizer(log_normalizer):
+    """Probability mass removed by top-k/top-p/min-p, from the log of the kept mass, as fp16."""
+    import torch
+
+    filtered_mass = (1.0 - log_normalizer.float().exp()).clamp_min(0.0)
+    return filtered_mass.to(getattr(torch, DIAGNOSTICS_DTYPE_NAME))
@@ -51,7 +51,7 @@ def auto_patch() -> Dict[str, Any]:
 
     Returns a small dict with status booleans for observability.
     """
-    status = {"enabled": False, "engine": False, "sampler": False}
+    status = {"enabled": False, "engine": False, "sampler": False, "weights": False}
 
     cfg = _read_flashrl_config()
     if not cfg:
@@ -80,9 +80,24 @@ def auto_patch() -> Dict[str, Any]:
     except Exception as e:
         logger.warning("Sampler patch failed: %s", e)
 
-    status["enabled"] = status["engine"] or status["sampler"]
+    # Patch model runner so updated weights are re-quantized with the Flash-RL profile
+    try:
+        from .weight_update import (
+            patch_sglang_model_runner,
+            patch_sglang_weight_update_entry_points,
+        )
+
+        status["weights"] = bool(patch_sglang_model_runner())
+        status["weights"] = bool(patch_sglang_weight_update_entry_points()) and status["weights"]
+    except Exception as e:
+        logger.warning("Weight update patch failed: %s", e)
+
+    status["enabled"] = status["engine"] or status["sampler"] or status["weights"]
     if status["enabled"]:
-        logger.info("Flash-RL SGLang adapter active (engine=%s, sampler=%s)", status["engine"], status["sampler"])
+        logger.info(
+            "Flash-RL SGLang adapter active (engine=%s, sampler=%s, weights=%s)",
+            status["engine"], status["sampler"], status["weights"],
+        )
     else:
         logger.debug("Flash-RL SGLang adapter not activated.")
 
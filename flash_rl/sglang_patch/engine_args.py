@@ -1,17 +1,78 @@
 import logging
 import os
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 logger = logging.getLogger(__name__)
 
+# engine kwargs that the Flash-RL config decides even if the caller passed them;
+# e.g., int8 rollouts must serve the w8a8 checkpoint named in the yaml profile.
+_FORCED_ARGS = ("model_path",)
 
-def _map_flashrl_to_sglang_args() -> Dict[str, Any]:
+
+# fns for which SGLang quantizes the bf16 checkpoint to fp8 itself; the re-quantizing
+# fp8 fns (fp8_channel / fp8_tensor / fp8_block) serve a pre-quantized checkpoint instead,
+# whose own quantization config selects the matching SGLang scheme
+_ONLINE_FP8_FNS = ("fp8", "fp8_vllm", "fp8_fast", "fp8_vllm_fast")
+
+
+def _quantization_for_fn(fn: str) -> Optional[str]:
+    if fn.startswith("int8"):
+        return "w8a8_int8"
+    if fn in _ONLINE_FP8_FNS:
+        return "fp8"
+    return None
+
+
+def _kv_cache_args() -> Dict[str, Any]:
+    kv_dtype = os.environ.get("FLASHRL_KV_CACHE_DTYPE")
+    disable_kv = os.environ.get("FLASHRL_DISABLE_FP8_KV", "0") == "1"
+    if kv_dtype and not disable_kv:
+        return {"kv_cache_dtype": kv_dtype}
+    return {}
+
+
+def get_active_flashrl_config(tp_size: int = 1) -> Optional[Dict[str, Any]]:
+    """
+    Load FLASHRL_CONFIG (a profile-free name, local yaml or uploaded yaml) and
+    select the entry of this rank. Returns None when Flash-RL is disabled.
+    """
+    cfg = os.environ.get("FLASHRL_CONFIG", "").strip()
+    if not cfg:
+        return None
+
+    from ..configs import load_flashrl_config, select_flashrl_config
+
+    rank = int(os.environ.get("RANK", "0"))
+    return select_flashrl_config(load_flashrl_config(cfg), rank, tp_size)
+
+
+def _map_config_to_sglang_args(config: Dict[str, Any]) -> Dict[str, Any]:
+    fn = config.get("fn", "int8")
+    if fn == "bf16":
+        return {}
+
+    args: Dict[str, Any] = {}
+    quantization = config.get("quantization") or _quantization_for_fn(fn)
+    if quantization is not None:
+        args["quantization"] = quantization
+    if config.get("model") is not None:
+        args["model_path"] = config["model"]
+    if config.get("load_format", "auto") != "auto":
+        args["load_format"] = config["load_format"]
+    if fn.startswith("fp8"):
+        args.update(_kv_cache_args())
+    return args
+
+
+def _map_flashrl_to_sglang_args(tp_size: int = 1) -> Dict[str, Any]:
     """
     Map FLASHRL_CONFIG to SGLang Engine keyword arguments.
 
-    - fp8 -> {quantization: 'fp8', kv_cache_dtype: 'fp8_e5m2'} (unless disabled)
+    - fp8 -> {quantization: 'fp8'} (+ kv_cache_dtype if explicitly requested)
     - bf16 -> {} (logprob patch only)
-    - YAML path -> (parse later; currently degrade to bf16 with a warning)
+    - YAML path -> per-fn mapping: int8* -> 'w8a8_int8', native fp8 -> 'fp8', re-quantizing
+      fp8 fns -> the scheme of the pre-quantized checkpoint, with the profile's
+      model / load_format; updated weights are re-quantized online.
     """
     cfg = os.environ.get("FLASHRL_CONFIG", "").strip()
     if not cfg:
@@ -23,21 +84,18 @@ def _map_flashrl_to_sglang_args() -> Dict[str, Any]:
     if cfg.lower() == "fp8":
         # Defer FP8 specifics to SGLang defaults. Only set kv_cache_dtype if explicitly requested.
         args: Dict[str, Any] = {"quantization": "fp8"}
-        kv_dtype = os.environ.get("FLASHRL_KV_CACHE_DTYPE")
-        disable_kv = os.environ.get("FLASHRL_DISABLE_FP8_KV", "0") == "1"
-        if kv_dtype and not disable_kv:
-            args["kv_cache_dtype"] = kv_dtype
+        args.update(_kv_cache_args())
         return args
 
-    # YAML profile support can be extended here.
-    if cfg.endswith(".yaml") or cfg.endswith(".yml"):
-        logger.warning(
-            "YAML profiles for SGLang are not yet mapped; running as bf16 (logprob patch only)."
-        )
+    try:
+        config = get_active_flashrl_config(tp_size)
+    except Exception as e:
+        logger.warning("Failed to load Flash-RL config %s for SGLang (%s); running as bf16.", cfg, e)
         return {}
 
-    # Fallback
-    return {}
+    if config is None:
+        return {}
+    return _map_config_to_sglang_args(config)
 
 
 def patch_sglang_engine_init() -> bool:
@@ -74,9 +132,17 @@ def patch_sglang_engine_init() -> bool:
         flashrl_defaults = _map_flashrl_to_sglang_args()
 
         def wrapped_init(self, *args, **kwargs):  # type: ignore[no-redef]
+            defaults = flashrl_defaults
+            if kwargs.get("tp_size", 1) != 1:
+                defaults = _map_flashrl_to_sglang_args(tp_size=kwargs["tp_size"])
             # Only inject missing keys so user-specified kwargs win.
-            for k, v in flashrl_defaults.items():
-                kwargs.setdefault(k, v)
+            for k, v in defaults.items():
+                if k in _FORCED_ARGS:
+                    if kwargs.get(k) not in (None, v):
+                        logger.info("Flash-RL config overrides SGLang %s: %s -> %s", k, kwargs[k], v)
+                    kwargs[k] = v
+                else:
+                    kwargs.setdefault(k, v)
             return orig_init(self, *args, **kwargs)
 
         Engine.__init__ = wrapped_init  # type: ignore[assignment]
@@ -1,5 +1,11 @@
 import logging
-from typing import Optional
+import math
+import os
+import sys
+import threading
+from typing import Any, NamedTuple
+
+from ..rollout_diagnostics import diagnostics_enabled, entropy_from_logprobs, filtered_mass_from_log_normalizer
 
 logger = logging.getLogger(__name__)
 
@@ -13,47 +19,102 @@ def _softmax(logits):
     return exp / denom.clamp_min(1e-20)
 
 
+def _per_row(value, rows, device, dtype):
+    """Broadcast a scalar or per-row sampling parameter to a [rows, 1] tensor (None stays None)."""
+    import torch
+
+    if value is None:
+        return None
+    if torch.is_tensor(value):
+        return value.to(device=device, dtype=dtype).reshape(-1, 1).expand(rows, 1)
+    return torch.full((rows, 1), float(value), device=device, dtype=dtype)
+
+
+def _filter_params(logits, temperature, top_k, top_p, min_p):
+    """
+    Normalize sampling parameters of [rows, V] logits to [rows, 1] tensors.
+    Rows that disable a filter get a neutral value (top_k = V, top_p > 1,
+    min_p = 0). A scalar that disables its filter is returned as None; per-row
+    tensors are never inspected on the host, which would sync every step (the
+    caller passes None for filters the batch does not need).
+    """
+    import torch
+
+    rows, vocab = logits.shape
+    device, dtype = logits.device, logits.dtype
+
+    if top_k is not None and not torch.is_tensor(top_k) and not 0 < top_k < vocab:
+        top_k = None
+    if top_p is not None and not torch.is_tensor(top_p) and not 0 < top_p < 1:
+        top_p = None
+    if min_p is not None and not torch.is_tensor(min_p) and not 0 < min_p < 1:
+        min_p = None
+
+    temperature = _per_row(temperature, rows, device, dtype)
+    if temperature is not None:
+        temperature = torch.where(temperature > 0, temperature, torch.ones_like(temperature))
+
+    top_k = _per_row(top_k, rows, device, torch.long)
+    if top_k is not None:
+        top_k = torch.where(top_k > 0, top_k.clamp_max(vocab), torch.full_like(top_k, vocab))
+
+    top_p = _per_row(top_p, rows, device, dtype)
+    if top_p is not None:
+        top_p = torch.where((top_p > 0) & (top_p < 1), top_p, torch.full_like(top_p, 2.0))
+
+    min_p = _per_row(min_p, rows, device, dtype)
+    if min_p is not None:
+        min_p = torch.where((min_p > 0) & (min_p < 1), min_p, torch.zeros_like(min_p))
+
+    return temperature, top_k, top_p, min_p
+
+
 def compute_post_filter_distribution(
     logits,
-    temperature: float = 1.0,
-    top_k: Optional[int] = None,
-    top_p: Optional[float] = None,
-    min_p: Optional[float] = None,
+    temperature=1.0,
+    top_k=None,
+    top_p=None,
+    min_p=None,
 ):
     """
     Given logits for a step (shape [..., V]), compute the post-filter sampling
     distribution with temperature, top-k, top-p, min-p and renormalization.
+    Each parameter is either a scalar or a per-row tensor (one value per
+    request, e.g., SGLang's `sampling_info.temperatures`); rows whose value
+    disables a filter (top_k <= 0, top_p or min_p outside (0, 1)) skip it.
     Returns probs of same shape as logits.
     """
     import torch
 
-    if temperature is None or temperature <= 0:
-        temperature = 1.0
-    logits = logits / float(temperature)
+    shape = logits.shape
+    logits = logits.reshape(-1, shape[-1])
+    vocab = logits.shape[-1]
+    temperature, top_k, top_p, min_p = _filter_params(logits, temperature, top_k, top_p, min_p)
+
+    if temperature is not None:
+        logits = logits / temperature
     probs = _softmax(logits)
 
     # Create a mask initialized to all True
     mask = torch.ones_like(probs, dtype=torch.bool)
 
-    if top_k is not None and top_k > 0:
-        # keep only top_k tokens
-        topk_vals, topk_idx = torch.topk(probs, k=min(top_k, probs.shape[-1]), dim=-1)
-        keep = torch.zeros_like(probs, dtype=torch.bool)
-        keep.scatter_(-1, topk_idx, True)
-        mask = mask & keep
-
-    if top_p is not None and 0.0 < top_p < 1.0:
-        # nucleus sampling: sort by prob desc, keep minimal prefix reaching top_p
+    if top_k is not None or top_p is not None:
+        # one sort serves both filters: keep the first top_k ranks and the
+        # minimal prefix reaching top_p, then scatter back to vocab order
         sorted_probs, sorted_idx = torch.sort(probs, dim=-1, descending=True)
-        cumsum = torch.cumsum(sorted_probs, dim=-1)
-        cutoff = cumsum <= top_p
+        cutoff = torch.ones_like(sorted_probs, dtype=torch.bool)
+        if top_k is not None:
+            ranks = torch.arange(vocab, device=probs.device).view(1, -1)
+            cutoff &= ranks < top_k
+        if top_p is not None:
+            cutoff &= torch.cumsum(sorted_probs, dim=-1) <= top_p
         # ensure at least one token kept
         cutoff[..., 0] = True
         keep = torch.zeros_like(probs, dtype=torch.bool)
         keep.scatter_(-1, sorted_idx, cutoff)
         mask = mask & keep
 
-    if min_p is not None and 0.0 < min_p < 1.0:
+    if min_p is not None:
         # keep tokens with prob >= min_p * max_prob
         max_prob, _ = probs.max(dim=-1, keepdim=True)
         thresh = min_p * max_prob
@@ -64,7 +125,7 @@ def compute_post_filter_distribution(
     masked = probs * mask
     denom = masked.sum(dim=-1, keepdim=True).clamp_min(1e-20)
     renorm = masked / denom
-    return renorm
+    return renorm.reshape(shape)
 
 
 def compute_logprob_of_token(probs, token_id):
@@ -75,6 +136,331 @@ def compute_logprob_of_token(probs, token_id):
     return torch.log(p.clamp_min(1e-20))
 
 
+class PostFilterLogprobs(NamedTuple):
+    """
+    Chosen-token logprob under the post-filter distribution, and the log of the
+    kept mass; optionally the N most likely alternatives under the same
+    distribution, as packed [B, N] token ids and logprobs, and the fp16
+    diagnostics (entropy of the post-filter distribution, filtered mass).
+    """
+
+    logprobs: Any
+    log_normalizer: Any
+    topn_ids: Any = None
+    topn_logprobs: Any = None
+    entropy: Any = None
+    filtered_mass: Any = None
+
+
+_LOG_EPS = math.log(1e-20)
+
+DEFAULT_MEMORY_BUDGET_MB = 1024
+# top-p / min-p cutoffs are first searched among this many most likely tokens
+TOP_P_CANDIDATE_WINDOW = 1024
+
+
+def _post_filter_topn() -> int:
+    return int(os.environ.get("FLASHRL_POST_FILTER_TOPN", "0"))
+
+
+def _memory_budget_bytes(memory_budget_mb=None) -> int:
+    if memory_budget_mb is None:
+        memory_budget_mb = float(os.environ.get("FLASHRL_SAMPLER_MEMORY_BUDGET_MB", DEFAULT_MEMORY_BUDGET_MB))
+    return int(memory_budget_mb * 2**20)
+
+
+def _rows(value, start, end):
+    return None if value is None else value[start:end]
+
+
+def _kept_prefix(sorted_logp, top_k, top_p, min_logp, complete):
+    """
+    Length of the kept prefix of (possibly truncated) descending logprobs, and
+    whether it is exact: a truncated window resolves a row once one of its
+    filters cuts inside the window.
+    """
+    import torch
+
+    window = sorted_logp.shape[-1]
+    cumsum = torch.cumsum(sorted_logp.exp(), dim=-1)
+    length = torch.full((sorted_logp.shape[0], 1), window, dtype=torch.long, device=sorted_logp.device)
+    resolved = torch.full_like(length, complete, dtype=torch.bool)
+    if top_k is not None:
+        length = torch.minimum(length, top_k)
+        resolved |= top_k <= window
+    if top_p is not None:
+        n = (cumsum <= top_p).sum(dim=-1, keepdim=True)
+        length = torch.minimum(length, n)
+        resolved |= n < window
+    if min_logp is not None:
+        n = (sorted_logp >= min_logp).sum(dim=-1, keepdim=True)
+        length = torch.minimum(length, n)
+        resolved |= n < window
+    # ensure at least one token kept
+    last = length.clamp_min(1) - 1
+    return sorted_logp.gather(-1, last), cumsum.gather(-1, last), resolved
+
+
+def _post_filter_logprob_tile(logits, token_ids, temperature, top_k, top_p, min_p, top_n=0, diagnostics=False):
+    import torch
+
+    if temperature is not None:
+        logits = logits / temperature
+    logp = torch.log_softmax(logits, dim=-1)
+    chosen = logp.gather(-1, token_ids)
+    vocab = logp.shape[-1]
+    top_n = min(top_n, vocab)
+    alternatives = None
+
+    min_logp = None
+    if min_p is not None:
+        # prob >= min_p * max_prob
+        min_logp = torch.log(min_p) + logp.max(dim=-1, keepdim=True).values
+
+    if top_k is not None or top_p is not None:
+        # fixed width: sizing it from top_k, or compacting the rows it does not
+        # resolve, would sync with the host and give data-dependent shapes
+        window = min(max(TOP_P_CANDIDATE_WINDOW, top_n), vocab)
+        if window * 4 < vocab:
+            # candidate window first; rows it does not resolve take the full sort
+            sorted_logp, sorted_idx = torch.topk(logp, window, dim=-1)
+            boundary, mass, resolved = _kept_prefix(sorted_logp, top_k, top_p, min_logp, False)
+            full_logp = torch.sort(logp, dim=-1, descending=True).values
+            full_boundary, full_mass, _ = _kept_prefix(full_logp, top_k, top_p, min_logp, True)
+            del full_logp
+            boundary = torch.where(resolved, boundary, full_boundary)
+            mass = torch.where(resolved, mass, full_mass)
+        else:
+            sorted_logp, sorted_idx = torch.sort(logp, dim=-1, descending=True)
+            boundary, mass, _ = _kept_prefix(sorted_logp, top_k, top_p, min_logp, True)
+        if top_n > 0:
+            # the N most likely tokens are the head of the sort (or window) above
+            alternatives = (sorted_logp[:, :top_n], sorted_idx[:, :top_n])
+        del sorted_logp, sorted_idx
+        log_normalizer = torch.log(mass.clamp_min(1e-20))
+    elif min_logp is not None:
+        boundary = min_logp
+        log_normalizer = torch.logsumexp(logp.masked_fill(logp < min_logp, float("-inf")), dim=-1, keepdim=True)
+    else:
+        boundary = torch.full_like(chosen, float("-inf"))
+        log_normalizer = torch.zeros_like(chosen)
+
+    def post_filter(values):
+        kept = values >= boundary
+        return torch.where(kept, (values - log_normalizer).clamp_min(_LOG_EPS), torch.full_like(values, _LOG_EPS))
+
+    if top_n > 0 and alternatives is None:
+        alternatives = torch.topk(logp, top_n, dim=-1)
+    topn = (None, None) if top_n == 0 else (alternatives[1], post_filter(alternatives[0]))
+
+    stats = (None, None)
+    if diagnostics:
+        post_filter_logp = (logp - log_normalizer).masked_fill_(logp < boundary, float("-inf"))
+        stats = (entropy_from_logprobs(post_filter_logp), filtered_mass_from_log_normalizer(log_normalizer))
+    return (post_filter(chosen), log_normalizer) + topn + stats
+
+
+def compute_post_filter_logprob(
+    logits,
+    token_ids,
+    temperature=1.0,
+    top_k=None,
+    top_p=None,
+    min_p=None,
+    memory_budget_mb=None,
+    top_n=0,
+    diagnostics=False,
+):
+    """
+    Log-space equivalent of `compute_logprob_of_token(compute_post_filter_distribution(...))`
+    that never materializes the renormalized [..., V] distribution.
+
+    Each filter keeps a prefix of the tokens sorted by probability, so the kept
+    set is described per row by its length L: the normalizer is the cumulative
+    mass of the first L sorted tokens, and the chosen token is kept iff its
+    logprob is at least the L-th largest one. Tokens tied with that boundary are
+    all treated as kept, whereas the mask-based function keeps an arbitrary
+    subset of them; results only differ on such exact ties.
+
+    Rows are processed in tiles so that the [tile, V] temporaries stay within
+    `memory_budget_mb` (default: FLASHRL_SAMPLER_MEMORY_BUDGET_MB, or 1024), and
+    the cutoff is searched among the `TOP_P_CANDIDATE_WINDOW` most likely tokens,
+    rows it does not resolve taking a full sort (selected on device, no host sync).
+
+    With `top_n > 0`, the `top_n` most likely tokens and their post-filter
+    logprobs are also returned, taken from the head of the same sort. With
+    `diagnostics`, the entropy of the post-filter distribution and the filtered
+    mass are returned as fp16 (the entropy costs one more pass over the tile).
+    """
+    import torch
+
+    shape = token_ids.shape
+    logits = logits.reshape(-1, logits.shape[-1])
+    token_ids = token_ids.reshape(-1, 1).to(logits.device)
+    temperature, top_k, top_p, min_p = _filter_params(logits, temperature, top_k, top_p, min_p)
+
+    rows, vocab = logits.shape
+    # logits / T, logp, sorted values and indices, cumsum
+    row_bytes = vocab * (4 * logits.element_size() + 8)
+    tile = max(1, _memory_budget_bytes(memory_budget_mb) // row_bytes)
+
+    top_n = min(top_n, vocab)
+    logprobs = torch.empty((rows, 1), dtype=logits.dtype, device=logits.device)
+    log_normalizer = torch.empty_like(logprobs)
+    topn_ids = torch.empty((rows, top_n), dtype=torch.long, device=logits.device) if top_n > 0 else None
+    topn_logprobs = torch.empty((rows, top_n), dtype=logits.dtype, device=logits.device) if top_n > 0 else None
+    entropy = torch.empty((rows, 1), dtype=torch.float16, device=logits.device) if diagnostics else None
+    filtered_mass = torch.empty_like(entropy) if diagnostics else None
+    for start in range(0, rows, tile):
+        end = min(start + tile, rows)
+        chosen, normalizer, ids, alternatives, tile_entropy, tile_mass = _post_filter_logprob_tile(
+            logits[start:end],
+            token_ids[start:end],
+            _rows(temperature, start, end),
+            _rows(top_k, start, end),
+            _rows(top_p, start, end),
+            _rows(min_p, start, end),
+            top_n,
+            diagnostics,
+        )
+        logprobs[start:end], log_normalizer[start:end] = chosen, normalizer
+        if top_n > 0:
+            topn_ids[start:end], topn_logprobs[start:end] = ids, alternatives
+        if diagnostics:
+            entropy[start:end], filtered_mass[start:end] = tile_entropy.view(-1, 1), tile_mass
+    if top_n > 0:
+        topn_ids = topn_ids.reshape(tuple(shape) + (top_n,))
+        topn_logprobs = topn_logprobs.reshape(tuple(shape) + (top_n,))
+    if diagnostics:
+        entropy, filtered_mass = entropy.reshape(shape), filtered_mass.reshape(shape)
+    return PostFilterLogprobs(
+        logprobs.reshape(shape), log_normalizer.reshape(shape), topn_ids, topn_logprobs, entropy, filtered_mass
+    )
+
+
+def _sampling_params(sampler, args, kwargs):
+    """
+    Per-request sampling parameters of the current batch: SGLang passes them as
+    `sampling_info` (per-row tensors); fall back to scalar `self.sampling_params`.
+    """
+    sampling_info = kwargs.get("sampling_info", args[1] if len(args) > 1 else None)
+    if sampling_info is not None and getattr(sampling_info, "temperatures", None) is not None:
+        # SGLang already knows, once per batch, which filters any request uses
+        def needed(values, flag):
+            return values if getattr(sampling_info, flag, True) else None
+
+        return {
+            "temperature": sampling_info.temperatures,
+            "top_k": needed(getattr(sampling_info, "top_ks", None), "need_top_k_sampling"),
+            "top_p": needed(getattr(sampling_info, "top_ps", None), "need_top_p_sampling"),
+            "min_p": needed(getattr(sampling_info, "min_ps", None), "need_min_p_sampling"),
+        }
+
+    sampling_params = getattr(sampler, "sampling_params", None)
+    return {
+        "temperature": getattr(sampling_params, "temperature", 1.0) if sampling_params else 1.0,
+        "top_k": getattr(sampling_params, "top_k", None) if sampling_params else None,
+        "top_p": getattr(sampling_params, "top_p", None) if sampling_params else None,
+        "min_p": getattr(sampling_params, "min_p", None) if sampling_params else None,
+    }
+
+
+# which path produced `post_filter_logprobs`, to confirm the capture is active in production
+post_filter_path_counts = {"captured": 0, "recomputed": 0}
+
+_capture = threading.local()
+
+
+def _attach(out, result):
+    out.post_filter_logprobs = result.logprobs
+    if result.topn_ids is not None:
+        out.post_filter_topn_ids = result.topn_ids
+        out.post_filter_topn_logprobs = result.topn_logprobs
+    if result.entropy is not None:
+        out.post_filter_entropy = result.entropy
+        out.filtered_mass = result.filtered_mass
+
+
+def _record_path(out, path):
+    post_filter_path_counts[path] += 1
+    try:
+        out.post_filter_logprobs_source = path
+    except Exception:
+        pass
+
+
+def post_filter_logprobs_from_probs(
+    probs, token_ids, top_ks, top_ps, min_ps, need_min_p_sampling, top_n=0, diagnostics=False
+):
+    """
+    Post-filter logprobs of the tokens SGLang's `top_k_top_p_min_p_sampling_from_probs_torch`
+    sampled from `probs`, under the filtered sorted probabilities it samples from
+    (same sort and masks, no second softmax); sampling itself stays SGLang's.
+
+    Note SGLang's top-p keeps a token while the mass *before* it is <= top_p,
+    one token more than `compute_post_filter_distribution`; the captured
+    logprobs follow the distribution that was actually sampled.
+    """
+    import torch
+
+    probs_sort, probs_idx = probs.sort(dim=-1, descending=True)
+    probs_sum = torch.cumsum(probs_sort, dim=-1)
+    probs_sort[torch.arange(0, probs.shape[-1], device=probs.device).view(1, -1) >= top_ks.view(-1, 1)] = 0.0
+    probs_sort[(probs_sum - probs_sort) > top_ps.view(-1, 1)] = 0.0
+    if need_min_p_sampling:
+        min_p_thresholds = probs_sort[:, 0] * min_ps
+        probs_sort[probs_sort < min_p_thresholds.view(-1, 1)] = 0.0
+
+    mass = probs_sort.sum(dim=-1, keepdim=True).clamp_min(1e-20)
+    # a sampled token always has non-zero filtered probability, i.e., was kept
+    chosen = probs.gather(-1, token_ids.view(-1, 1).to(torch.int64))
+    logprobs = torch.log((chosen / mass).clamp_min(1e-20)).view(-1)
+    topn_ids, topn_logprobs = None, None
+    if top_n > 0:
+        top_n = min(top_n, probs.shape[-1])
+        topn_ids = probs_idx[:, :top_n].to(torch.int64)
+        topn_logprobs = torch.log((probs_sort[:, :top_n] / mass).clamp_min(1e-20))
+    log_normalizer = torch.log(mass).view(-1)
+    entropy, filtered_mass = None, None
+    if diagnostics:
+        entropy = entropy_from_logprobs(torch.log(probs_sort / mass))
+        filtered_mass = filtered_mass_from_log_normalizer(log_normalizer)
+    return PostFilterLogprobs(logprobs, log_normalizer, topn_ids, topn_logprobs, entropy, filtered_mass)
+
+
+def _sampling_backend(sampler_module):
+    """SGLang's `--sampling-backend` (e.g., "flashinfer", "pytorch"), or None when unknown."""
+    server_args = getattr(sampler_module, "global_server_args_dict", None)
+    if isinstance(server_args, dict):
+        return server_args.get("sampling_backend")
+    get_server_args = getattr(sampler_module, "get_global_server_args", None)
+    if get_server_args is not None:
+        try:
+            return getattr(get_server_args(), "sampling_backend", None)
+        except Exception:
+            return None
+    return None
+
+
+def _patch_sampling_from_probs(sampler_module) -> bool:
+    """Capture post-filter logprobs around SGLang's torch sampling function."""
+    name = "top_k_top_p_min_p_sampling_from_probs_torch"
+    orig_sampling = getattr(sampler_module, name, None)
+    if orig_sampling is None:
+        return False
+
+    def capturing_sampling(probs, top_ks, top_ps, min_ps, need_min_p_sampling, *args, **kwargs):
+        batch_next_token_ids = orig_sampling(probs, top_ks, top_ps, min_ps, need_min_p_sampling, *args, **kwargs)
+        _capture.result = post_filter_logprobs_from_probs(
+            probs, batch_next_token_ids, top_ks, top_ps, min_ps, need_min_p_sampling,
+            _post_filter_topn(), diagnostics_enabled(),
+        )
+        return batch_next_token_ids
+
+    setattr(sampler_module, name, capturing_sampling)
+    return True
+
+
 def patch_sglang_sampler() -> bool:
     """
     Patch SGLang sampler to ensure per-token logprobs used in RL are computed
@@ -83,9 +469,15 @@ def patch_sglang_sampler() -> bool:
     Strategy:
       1) If SGLang exposes a `return_logprob` that already reflects post-filter
          numerics, keep behavior and do nothing.
-      2) Otherwise, wrap Sampler.forward to compute post-filter distribution
+      2) Otherwise, capture the logprob of the chosen tokens from the filtered
+         probabilities SGLang samples from (`--sampling-backend pytorch`; other
+         backends, e.g., flashinfer, never call the torch sampler and take 3).
+      3) Otherwise, wrap Sampler.forward to compute post-filter distribution
          and store logprob for the chosen token on the output object when possible.
 
+    The path taken is counted in `post_filter_path_counts` and recorded as
+    `post_filter_logprobs_source` on the output.
+
     Returns True if a patch was applied or confirmed unnecessary.
     """
     try:
@@ -111,10 +503,15 @@ def patch_sglang_sampler() -> bool:
             return True
 
         orig_forward = Sampler.forward
+        sampler_module = sys.modules[Sampler.__module__]
+        capturing = _patch_sampling_from_probs(sampler_module)
+        backend_checked = []
 
         def wrapped_forward(self, *args, **kwargs):  # type: ignore[no-redef]
             # Call original forward to get chosen tokens and (possibly) logprobs
+            _capture.result = None
             out = orig_forward(self, *args, **kwargs)
+            captured, _capture.result = _capture.result, None
 
             # If upstream provides post-filter logprobs, leave as-is.
             # Heuristic: presence of attribute 'post_filter_logprobs' or metadata
@@ -124,6 +521,23 @@ def patch_sglang_sampler() -> bool:
             except Exception:
                 pass
 
+            if captured is not None:
+                try:
+                    _attach(out, captured)
+                    _record_path(out, "captured")
+                    return out
+                except Exception:
+                    pass
+            elif capturing and len(backend_checked) == 0:
+                backend_checked.append(True)
+                backend = _sampling_backend(sampler_module)
+                if backend not in (None, "pytorch"):
+                    logger.warning(
+                        "SGLang sampling backend %s does not use the torch sampler Flash-RL captures "
+                        "from; post-filter logprobs are recomputed after sampling (use "
+                        "--sampling-backend pytorch to capture them).", backend,
+                    )
+
             # Try to recompute using inputs available in self/kwargs
             try:
 
@@ -139,20 +553,18 @@ def patch_sglang_sampler() -> bool:
                 if logits is None or token_ids is None:
                     return out  # not enough info, return unchanged
 
-                sampling_params = getattr(self, "sampling_params", None)
-                temperature = getattr(sampling_params, "temperature", 1.0) if sampling_params else 1.0
-                top_k = getattr(sampling_params, "top_k", None) if sampling_params else None
-                top_p = getattr(sampling_params, "top_p", None) if sampling_params else None
-                min_p = getattr(sampling_params, "min_p", None) if sampling_params else None
-
-                probs = compute_post_filter_distribution(
-                    logits, temperature=temperature, top_k=top_k, top_p=top_p, min_p=min_p
+                result = compute_post_filter_logprob(
+                    logits,
+                    token_ids,
+                    top_n=_post_filter_topn(),
+                    diagnostics=diagnostics_enabled(),
+                    **_sampling_params(self, args, kwargs),
                 )
-                logprobs = compute_logprob_of_token(probs, token_ids)
 
                 # Attach for downstream consumers
                 try:
-                    out.post_filter_logprobs = logprobs
+                    _attach(out, result)
+                    _record_path(out, "recomputed")
                 except Exception:
                     pass
             except Exception as e:  # be conservative, never break user inference
@@ -163,7 +575,10 @@ def patch_sglang_sampler() -> bool:
 
         Sampler.forward = wrapped_forward  # type: ignore[assignment]
         Sampler.__flashrl_patched__ = True
-        logger.info("SGLang Sampler patched for post-filter logprobs.")
+        logger.info(
+            "SGLang Sampler patched for post-filter logprobs (%s).",
+            "captured from sampling" if capturing else "recomputed",
+        )
         return True
     except Exception as e:
         logger.warning("Failed to patch SGLang sampler: %s", e)
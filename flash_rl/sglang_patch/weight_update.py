@@ -0,0 +1,294 @@
+import logging
+import os
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def get_flashrl_quantize_fn(config: Optional[Dict[str, Any]]) -> Optional[Tuple[Callable, Any]]:
+    """
+    Resolve the (quantize_fn, profile) pair used to re-quantize updated weights,
+    from the same `quant_fn_map` as the vLLM patch. Returns None when updated
+    weights can be loaded as-is (bf16, or fp8 quantized natively by SGLang).
+    """
+    if config is None:
+        return None
+    fn = config.get("fn", "int8")
+    if fn == "bf16":
+        return None
+    if fn == "w4a16":
+        # SGLang repacks 4-bit weights for marlin after loading; updates cannot be loaded into that layout
+        raise ValueError(
+            "Flash-RL fn w4a16 is not supported with SGLang, whose 4-bit weights are repacked "
+            "for marlin after loading; use it with vLLM, or an int8 / fp8 fn with SGLang"
+        )
+
+    from ..flash_quantization import flash_noquantize, get_quantize_fn, load_flashrl_profile
+
+    quantize_fn = get_quantize_fn(fn)
+    if quantize_fn is flash_noquantize:
+        return None
+
+    model = config.get("model", "")
+    profile = load_flashrl_profile(config.get("profile", os.path.join(model, "profile.pt")), config.get("bf16_layers"))
+    return quantize_fn, profile
+
+
+# scale parameter each re-quantizing fp8 fn writes next to an [N, K] weight, and its shape,
+# which the served checkpoint must already have in its loading layout
+FP8_SCALE_LAYOUTS = {
+    "fp8_channel": ("weight_scale", lambda n, k: (n, 1)),
+    "fp8_tensor": ("weight_scale", lambda n, k: (n, 1)),
+    "fp8_block": ("weight_scale_inv", lambda n, k: (-(-n // 128), -(-k // 128))),
+}
+
+
+def check_fp8_scale_layout(model, fn: str) -> None:
+    """
+    Raise if the loaded checkpoint cannot take the scales `fn` re-quantizes into,
+    e.g., a bf16 checkpoint quantized online by SGLang (no scale params at load),
+    or a per-tensor / block checkpoint for per-row scales.
+    """
+    if fn not in FP8_SCALE_LAYOUTS:
+        return
+    import torch
+
+    if not hasattr(model, "flashrl_loading_state"):
+        record_loading_state(model)
+    records = model.flashrl_loading_state
+    params = dict(model.named_parameters())
+    scale_name, layout = FP8_SCALE_LAYOUTS[fn]
+
+    weights = [
+        name for name in records
+        if name.endswith(".weight") and name in params and params[name].dtype == torch.float8_e4m3fn
+    ]
+    if len(weights) == 0:
+        raise ValueError(
+            f"Flash-RL fn {fn} re-quantizes updates into a pre-quantized fp8 checkpoint, but the "
+            f"served model has no fp8 weights; set `model` in the config to an fp8 checkpoint "
+            f"with `{scale_name}` scales"
+        )
+    mismatched = []
+    for name in weights:
+        scale = name[:-len("weight")] + scale_name
+        expected = layout(*records[name][0][-2:])
+        found = records[scale][0] if scale in records else None
+        if found != expected:
+            mismatched.append((scale, found, expected))
+    if len(mismatched) > 0:
+        scale, found, expected = mismatched[0]
+        raise ValueError(
+            f"Flash-RL fn {fn} writes {scale_name} scales of shape {expected} for {scale}, but the "
+            f"served checkpoint has {'none' if found is None else found} ({len(mismatched)} params); "
+            f"serve a checkpoint whose scale layout matches {fn}"
+        )
+
+
+def install_requantization(model, quantize_fn: Callable, profile: Any) -> bool:
+    """Wrap `model.load_weights` so every later weight load is re-quantized online."""
+    if hasattr(model, "beforeflashrl_load_weights"):
+        return True
+
+    original_load_weights = model.load_weights
+    model.beforeflashrl_load_weights = original_load_weights
+
+    def load_weights(weights, *args, **kwargs):
+        return original_load_weights(quantize_fn(weights, profile), *args, **kwargs)
+
+    model.load_weights = load_weights
+    logger.debug("Flash-RL re-quantization installed on SGLang model load_weights")
+    return True
+
+
+# parameter attributes used by SGLang weight loaders, which process_weights_after_loading
+# drops when it replaces a parameter (e.g., by its transpose)
+recorded_loader_keys = [
+    "weight_loader",
+    "output_dim",
+    "input_dim",
+    "packed_dim",
+    "packed_factor",
+]
+
+
+def _locate(paths):
+    for path in paths:
+        try:
+            module_path, cls_name = path.rsplit(".", 1)
+            mod = __import__(module_path, fromlist=[cls_name])
+            return getattr(mod, cls_name)
+        except Exception:
+            continue
+    return None
+
+
+def _locate_model_runner():
+    return _locate((
+        "sglang.srt.model_executor.model_runner.ModelRunner",
+        "sglang.srt.model_runner.ModelRunner",
+    ))
+
+
+def record_loading_state(model) -> None:
+    """Record, before post-processing, the shape and loader attributes of every parameter."""
+    records = {}
+    for name, p in model.named_parameters():
+        attrs = {k: getattr(p, k) for k in recorded_loader_keys if hasattr(p, k)}
+        records[name] = (tuple(p.shape), attrs)
+    model.flashrl_loading_state = records
+
+
+@contextmanager
+def loading_layout(model):
+    """
+    Temporarily expose every parameter in its loading layout, without copies.
+
+    Post-processing typically replaces a [N, K] weight by its transpose; loading
+    into `p.data.t()` writes the same storage, so the update happens in place
+    instead of through a second full-model copy.
+    """
+    records = getattr(model, "flashrl_loading_state", {})
+    transposed, unsupported = [], []
+    for name, p in model.named_parameters():
+        if name not in records:
+            continue
+        shape, attrs = records[name]
+        if tuple(p.shape) != shape:
+            if p.dim() == 2 and tuple(p.shape[::-1]) == shape:
+                p.data = p.data.t()
+                transposed.append(p)
+            else:
+                unsupported.append(name)
+        for k, v in attrs.items():
+            if not hasattr(p, k):
+                setattr(p, k, v)
+    if len(unsupported) > 0:
+        logger.warning(
+            "Flash-RL cannot restore the loading layout of %d params (e.g., %s); "
+            "updates to them may fail.", len(unsupported), unsupported[0],
+        )
+    try:
+        yield
+    finally:
+        for p in transposed:
+            p.data = p.data.t()
+
+
+@contextmanager
+def preserve_module_attributes(model, module_attribute_to_preserve):
+    """Keep tensor module attributes (e.g., marlin `workspace`) across a weight update."""
+    preserved = []
+    for _, module in model.named_modules():
+        for attr in module_attribute_to_preserve:
+            value = getattr(module, attr, None)
+            if value is not None and hasattr(value, "data_ptr"):
+                preserved.append((module, attr, value))
+    try:
+        yield
+    finally:
+        for module, attr, value in preserved:
+            setattr(module, attr, value)
+
+
+@contextmanager
+def flashrl_weight_update(runner):
+    if not hasattr(runner.model, "flashrl_loading_state"):
+        # loader hook unavailable: processed params keep their current layout
+        record_loading_state(runner.model)
+    with preserve_module_attributes(runner.model, getattr(runner, "flashrl_module_attribute_to_preserve", [])):
+        with loading_layout(runner.model):
+            yield
+
+
+def patch_sglang_weight_update_entry_points() -> bool:
+    """
+    Patch ModelRunner.update_weights_from_tensor / update_weights_from_distributed
+    so updates go through the (re-quantizing) `load_weights` in place, while
+    preserving module attributes. The original methods receive the tensors and
+    report failures as usual.
+    """
+    try:
+        ModelRunner = _locate_model_runner()
+        if ModelRunner is None:
+            logger.debug("Could not locate SGLang ModelRunner class; skip weight update entry points.")
+            return False
+
+        if getattr(ModelRunner, "__flashrl_update_patched__", False):
+            return True
+
+        DefaultModelLoader = _locate(("sglang.srt.model_loader.loader.DefaultModelLoader",))
+        if DefaultModelLoader is not None and hasattr(DefaultModelLoader, "load_weights_and_postprocess"):
+            orig_postprocess = DefaultModelLoader.load_weights_and_postprocess
+
+            def wrapped_postprocess(model, *args, **kwargs):
+                record_loading_state(model)
+                return orig_postprocess(model, *args, **kwargs)
+
+            DefaultModelLoader.load_weights_and_postprocess = staticmethod(wrapped_postprocess)
+
+        if hasattr(ModelRunner, "update_weights_from_tensor"):
+            orig_from_tensor = ModelRunner.update_weights_from_tensor
+
+            def wrapped_from_tensor(self, named_tensors, *args, **kwargs):  # type: ignore[no-redef]
+                with flashrl_weight_update(self):
+                    return orig_from_tensor(self, named_tensors, *args, **kwargs)
+
+            ModelRunner.update_weights_from_tensor = wrapped_from_tensor  # type: ignore[assignment]
+
+        if hasattr(ModelRunner, "update_weights_from_distributed"):
+            orig_from_distributed = ModelRunner.update_weights_from_distributed
+
+            def wrapped_from_distributed(self, *args, **kwargs):  # type: ignore[no-redef]
+                with flashrl_weight_update(self):
+                    return orig_from_distributed(self, *args, **kwargs)
+
+            ModelRunner.update_weights_from_distributed = wrapped_from_distributed  # type: ignore[assignment]
+
+        ModelRunner.__flashrl_update_patched__ = True
+        logger.info("SGLang ModelRunner weight update entry points patched for Flash-RL.")
+        return True
+    except Exception as e:
+        logger.warning("Failed to patch SGLang weight update entry points: %s", e)
+        return False
+
+
+def patch_sglang_model_runner() -> bool:
+    """
+    Patch SGLang ModelRunner.load_model: once the (already quantized) checkpoint
+    is loaded, weights arriving through any update path are re-quantized with the
+    Flash-RL function and profile selected by FLASHRL_CONFIG.
+    """
+    try:
+        ModelRunner = _locate_model_runner()
+
+        if ModelRunner is None:
+            logger.debug("Could not locate SGLang ModelRunner class; skip weight update patch.")
+            return False
+
+        if getattr(ModelRunner, "__flashrl_patched__", False):
+            return True
+
+        from .engine_args import get_active_flashrl_config
+
+        orig_load_model = ModelRunner.load_model
+
+        def wrapped_load_model(self, *args, **kwargs):  # type: ignore[no-redef]
+            ret = orig_load_model(self, *args, **kwargs)
+            config = get_active_flashrl_config(getattr(self, "tp_size", 1))
+            resolved = get_flashrl_quantize_fn(config)
+            if resolved is not None:
+                self.flashrl_quant_fn = config.get("fn", "int8")
+                check_fp8_scale_layout(self.model, self.flashrl_quant_fn)
+                self.flashrl_module_attribute_to_preserve = config.get("module_attribute_to_preserve", [])
+                install_requantization(self.model, *resolved)
+            return ret
+
+        ModelRunner.load_model = wrapped_load_model  # type: ignore[assignment]
+        ModelRunner.__flashrl_patched__ = True
+        logger.info("SGLang ModelRunner patched for Flash-RL online re-quantization.")
+        return True
+    except Exception as e:
+        logger.warning("Failed to patch SGLang ModelRunner: %s", e)
+        return False
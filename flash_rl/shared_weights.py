@@ -0,0 +1,175 @@
+import gc
+import logging
+import os
+import uuid
+from multiprocessing import shared_memory
+
+import torch
+
+from .param_arena import ARENA_ALIGNMENT_BYTES, _align
+
+logger = logging.getLogger(__name__)
+
+# buffers published by this process, so that a receiver living in the same process
+# (e.g., a hybrid trainer/rollout worker) maps them directly instead of via IPC
+_LOCAL_BUFFERS = {}
+
+
+def _dtype_to_str(dtype):
+    return str(dtype).replace('torch.', '')
+
+
+def _str_to_dtype(name):
+    return getattr(torch, name)
+
+
+def _attach_shm(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # python < 3.13: attaching registers the segment to the resource tracker,
+        # which would unlink it when this (non-owning) process exits
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return shm
+
+
+def _views(buffer, entries):
+    for name, offset, shape, dtype in entries:
+        dtype = _str_to_dtype(dtype)
+        numel = 1
+        for s in shape:
+            numel *= s
+        nbytes = numel * torch.empty((), dtype=dtype).element_size()
+        yield name, buffer[offset:offset + nbytes].view(dtype).view(shape)
+
+
+class SharedWeightPublisher:
+    """Trainer side of the colocated weight handoff.
+
+    Tensors are packed into a single shared buffer (POSIX shared memory for CPU
+    tensors, a CUDA allocation exported through an IPC handle for GPU tensors), and
+    a small picklable manifest describing the layout is returned. The buffer is
+    reused across publishes as long as the layout does not change.
+    """
+
+    def __init__(self, device='cpu', alignment=ARENA_ALIGNMENT_BYTES):
+        self.device = torch.device(device)
+        self.alignment = alignment
+        self.buffer = None
+        self.entries = None
+        self.version = 0
+        self._shm = None
+        self._handle = None
+        self._local_key = None
+
+    def _layout(self, named_tensors):
+        entries, offset = [], 0
+        for name, tensor in named_tensors:
+            entries.append((name, offset, tuple(tensor.shape), _dtype_to_str(tensor.dtype)))
+            offset += _align(tensor.numel() * tensor.element_size(), 1, self.alignment)
+        return entries, offset
+
+    def _allocate(self, nbytes):
+        self._release()
+        self._local_key = uuid.uuid4().hex
+        if self.device.type == 'cuda':
+            self.buffer = torch.empty(max(nbytes, 1), dtype=torch.uint8, device=self.device)
+            from torch.multiprocessing.reductions import reduce_tensor
+            self._handle = ('cuda_ipc', reduce_tensor(self.buffer))
+        else:
+            self._shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+            self.buffer = torch.frombuffer(self._shm.buf, dtype=torch.uint8, count=max(nbytes, 1))
+            self._handle = ('shm', self._shm.name)
+        _LOCAL_BUFFERS[self._local_key] = self.buffer
+
+    def publish(self, named_tensors):
+        """Copy `(name, tensor)` pairs into the shared buffer and return the manifest."""
+        named_tensors = list(named_tensors)
+        entries, nbytes = self._layout(named_tensors)
+        if self.entries != entries:
+            self._allocate(nbytes)
+            self.entries = entries
+
+        with torch.no_grad():
+            for (_, tensor), (_, view) in zip(named_tensors, _views(self.buffer, self.entries)):
+                view.copy_(tensor, non_blocking=self.device.type == 'cuda')
+        if self.device.type == 'cuda':
+            torch.cuda.current_stream(self.device).synchronize()
+
+        self.version += 1
+        return {
+            'pid': os.getpid(),
+            'local_key': self._local_key,
+            'handle': self._handle,
+            'nbytes': self.buffer.numel(),
+            'entries': self.entries,
+            'version': self.version,
+        }
+
+    def _release(self):
+        _LOCAL_BUFFERS.pop(self._local_key, None)
+        self.buffer = None
+        if self._shm is not None:
+            gc.collect()
+            try:
+                self._shm.close()
+            except BufferError as e:
+                # views into the segment are still alive, it is unmapped once they are gone
+                logger.debug(f"flash_rl shared weights release: {e}")
+            finally:
+                # unlink regardless, or the segment would outlive the process in /dev/shm
+                try:
+                    self._shm.unlink()
+                except FileNotFoundError as e:
+                    logger.debug(f"flash_rl shared weights release: {e}")
+                self._shm = None
+
+    def close(self):
+        self._release()
+        self.entries = None
+
+
+class SharedWeights:
+    """Rollout side of the colocated weight handoff: zero-copy views over a published buffer."""
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self._shm = None
+        kind, handle = manifest['handle']
+        if manifest['pid'] == os.getpid() and manifest['local_key'] in _LOCAL_BUFFERS:
+            self.buffer = _LOCAL_BUFFERS[manifest['local_key']]
+        elif kind == 'cuda_ipc':
+            rebuild_fn, rebuild_args = handle
+            self.buffer = rebuild_fn(*rebuild_args)
+        else:
+            self._shm = _attach_shm(handle)
+            self.buffer = torch.frombuffer(self._shm.buf, dtype=torch.uint8, count=manifest['nbytes'])
+
+    def iter_weights(self):
+        """Yield `(name, tensor)` views into the shared buffer, without copies."""
+        yield from _views(self.buffer, self.manifest['entries'])
+
+    def close(self):
+        self.buffer = None
+        if self._shm is not None:
+            gc.collect()
+            try:
+                self._shm.close()
+            except BufferError as e:
+                logger.debug(f"flash_rl shared weights still referenced at close: {e}")
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_shared_weights(manifest):
+    return SharedWeights(manifest)
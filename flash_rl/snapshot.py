@@ -0,0 +1,128 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATTERN = re.compile(r'flashrl-(?P<hash>[0-9a-f]+)-rank(?P<rank>\d+)-step(?P<step>\d+)\.pt$')
+
+
+def flashrl_config_hash(config_data, model=None):
+    """Stable short hash of a flash_rl config (and the served model)."""
+    payload = json.dumps({'config': config_data, 'model': model}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def snapshot_path(snapshot_dir, config_hash, rank, step):
+    return os.path.join(snapshot_dir, f'flashrl-{config_hash}-rank{rank}-step{int(step):08d}.pt')
+
+
+def list_snapshots(snapshot_dir, config_hash, rank):
+    """Return [(step, path)] of the snapshots matching the config hash and rank, oldest first."""
+    found = []
+    for path in glob.glob(os.path.join(snapshot_dir, f'flashrl-{config_hash}-rank{rank}-step*.pt')):
+        match = SNAPSHOT_PATTERN.search(os.path.basename(path))
+        if match is not None:
+            found.append((int(match.group('step')), path))
+    return sorted(found)
+
+
+def find_snapshot(snapshot_dir, config_hash, rank, step=None):
+    """Return the path of the requested snapshot (latest if `step` is None), or None."""
+    snapshots = list_snapshots(snapshot_dir, config_hash, rank)
+    if step is not None:
+        snapshots = [(s, p) for s, p in snapshots if s == int(step)]
+    if len(snapshots) == 0:
+        return None
+    return snapshots[-1][1]
+
+
+def _preserved_attributes(model, module_attribute_to_preserve):
+    attrs = {}
+    for module_name, module in model.named_modules():
+        for attr in module_attribute_to_preserve:
+            value = getattr(module, attr, None)
+            if torch.is_tensor(value):
+                attrs[f'{module_name}.{attr}' if module_name else attr] = value
+    return attrs
+
+
+def save_snapshot(model, path, step, config_hash, module_attribute_to_preserve=()):
+    """Save the post-processing (quantized) state of `model` to `path`.
+
+    Tensors are written with their processed layout, so that `load_snapshot` can
+    copy them straight into the parameters of a dummy-loaded model.
+    """
+    start_time = time.time()
+    state = {
+        'step': int(step),
+        'config_hash': config_hash,
+        'params': {name: p.data for name, p in model.named_parameters()},
+        'attrs': _preserved_attributes(model, module_attribute_to_preserve),
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, path)
+    logger.info(
+        f"flash_rl snapshot of step {step} saved to {path} "
+        f"in {time.time() - start_time:.2f} seconds"
+    )
+    return path
+
+
+def load_snapshot(model, path, module_attribute_to_preserve=()):
+    """Memory-map a snapshot and copy it into the parameters of `model`."""
+    start_time = time.time()
+    state = torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+
+    missing = []
+    with torch.no_grad():
+        for name, p in model.named_parameters():
+            if name not in state['params']:
+                missing.append(name)
+                continue
+            saved = state['params'][name]
+            assert saved.shape == p.data.shape and saved.dtype == p.data.dtype, \
+                f"flash_rl snapshot mismatch for {name}: {saved.shape}/{saved.dtype} vs {p.data.shape}/{p.data.dtype}"
+            p.data.copy_(saved, non_blocking=True)
+
+        # copied in place: the engine may already have captured graphs reading these tensors
+        existing_attrs = _preserved_attributes(model, module_attribute_to_preserve)
+        for name, saved in state['attrs'].items():
+            if name not in existing_attrs:
+                missing.append(name)
+                continue
+            existing = existing_attrs[name]
+            if existing.shape != saved.shape or existing.dtype != saved.dtype:
+                raise ValueError(
+                    f"flash_rl snapshot mismatch for attribute {name}: {tuple(saved.shape)}/{saved.dtype} "
+                    f"vs {tuple(existing.shape)}/{existing.dtype}, it cannot be copied in place"
+                )
+            existing.copy_(saved, non_blocking=True)
+
+    if len(missing) > 0:
+        logger.warning(f"flash_rl snapshot {path} does not match params or attributes of the model: {missing}")
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    logger.info(
+        f"flash_rl snapshot of step {state['step']} loaded from {path} "
+        f"in {time.time() - start_time:.2f} seconds"
+    )
+    return state['step']
+
+
+def prune_snapshots(snapshot_dir, config_hash, rank, keep_last=1):
+    """Delete all but the `keep_last` most recent snapshots of this config and rank."""
+    snapshots = list_snapshots(snapshot_dir, config_hash, rank)
+    for _, path in snapshots[:max(len(snapshots) - keep_last, 0)]:
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"flash_rl could not remove snapshot {path}: {e}")
@@ -0,0 +1,129 @@
+from typing import Any, NamedTuple
+
+import torch
+
+DEFAULT_TIS_CAP = 2.0
+
+
+class TISWeights(NamedTuple):
+    """Truncated importance-sampling weights of a batch of rollouts.
+
+    `token_weights` and `log_ratio` follow the layout of the inputs (packed or
+    padded, zero outside the mask); `sequence_weights` has one entry per
+    sequence; `stats` holds 0-dim mismatch statistics (no host sync).
+    """
+
+    token_weights: Any
+    sequence_weights: Any
+    log_ratio: Any
+    stats: dict
+
+
+def _is_numpy(x):
+    return type(x).__module__ == 'numpy'
+
+
+def _as_tensor(x, device=None):
+    if x is None or torch.is_tensor(x):
+        return x if x is None or device is None else x.to(device)
+    if _is_numpy(x):
+        return torch.from_numpy(x).to(device) if device is not None else torch.from_numpy(x)
+    return torch.as_tensor(x, device=device)
+
+
+def _pack(sequences):
+    """Concatenate ragged per-sequence logprobs into values and (host) lengths."""
+    if len(sequences) == 0:
+        raise ValueError("flash_rl tis: ragged logprobs need at least one sequence")
+    tensors = [_as_tensor(s).reshape(-1) for s in sequences]
+    return torch.cat(tensors), [t.numel() for t in tensors]
+
+
+def truncated_importance_weights(
+    trainer_logprobs,
+    rollout_logprobs,
+    offsets=None,
+    lengths=None,
+    mask=None,
+    cap=DEFAULT_TIS_CAP,
+    sequence_cap=None,
+):
+    """
+    Truncated importance-sampling weights `min(pi_trainer / pi_rollout, cap)`.
+
+    Logprobs are given in one of three layouts:
+      - packed: 1-D `[total_tokens]` values with `offsets` (`[S + 1]`, starting
+        at 0) or `lengths` (`[S]`); without either, a single sequence;
+      - padded: 2-D `[S, T]` values with a `mask` or `lengths`;
+      - ragged: lists of per-sequence 1-D logprobs (packed internally).
+    An optional token `mask` (same layout as the values) excludes tokens, e.g.,
+    prompt or tool-output tokens, from every weight and statistic.
+
+    Per-sequence weights are `min(exp(sum of token log-ratios), sequence_cap)`
+    (`sequence_cap` defaults to `cap`). Everything is computed in one vectorized
+    pass; torch or NumPy inputs are accepted and outputs match the input type.
+    Outputs are detached from the autograd graph of the trainer logprobs.
+    """
+    to_numpy = _is_numpy(trainer_logprobs)
+    if isinstance(trainer_logprobs, (list, tuple)):
+        to_numpy = len(trainer_logprobs) > 0 and _is_numpy(trainer_logprobs[0])
+        trainer_logprobs, lengths = _pack(trainer_logprobs)
+        rollout_logprobs, rollout_lengths = _pack(rollout_logprobs)
+        if lengths != rollout_lengths:
+            raise ValueError(
+                f"flash_rl tis: trainer and rollout logprobs have different sequence lengths "
+                f"({lengths} vs {rollout_lengths})"
+            )
+    # weights are coefficients of the policy loss, not part of its graph
+    trainer = _as_tensor(trainer_logprobs).detach()
+    device = trainer.device
+    rollout = _as_tensor(rollout_logprobs, device)
+    offsets, lengths, mask = _as_tensor(offsets, device), _as_tensor(lengths, device), _as_tensor(mask, device)
+
+    log_ratio = trainer.float() - rollout.float()
+    if log_ratio.dim() == 2:
+        # padded [S, T]
+        valid = torch.ones_like(log_ratio, dtype=torch.bool)
+        if lengths is not None:
+            valid = torch.arange(log_ratio.shape[1], device=device).view(1, -1) < lengths.view(-1, 1)
+        if mask is not None:
+            valid = valid & mask.bool()
+        log_ratio = log_ratio.masked_fill(~valid, 0.0)
+        sequence_log_ratio = log_ratio.sum(dim=-1)
+    else:
+        # packed [total_tokens]
+        if offsets is not None:
+            lengths = offsets[1:] - offsets[:-1]
+        if lengths is None:
+            lengths = torch.tensor([log_ratio.numel()], device=device)
+        valid = torch.ones_like(log_ratio, dtype=torch.bool) if mask is None else mask.bool()
+        log_ratio = log_ratio.masked_fill(~valid, 0.0)
+        segment = torch.repeat_interleave(
+            torch.arange(lengths.numel(), device=device), lengths.long(), output_size=log_ratio.numel()
+        )
+        sequence_log_ratio = torch.zeros(lengths.numel(), device=device).index_add_(0, segment, log_ratio)
+
+    ratio = log_ratio.exp()
+    token_weights = ratio.clamp(max=cap) * valid
+    sequence_cap = cap if sequence_cap is None else sequence_cap
+    sequence_weights = sequence_log_ratio.exp().clamp(max=sequence_cap)
+
+    num_tokens = valid.sum().clamp_min(1)
+    abs_log_ratio = log_ratio.abs()
+    stats = {
+        'mean_abs_log_ratio': abs_log_ratio.sum() / num_tokens,
+        'max_abs_log_ratio': abs_log_ratio.max() if abs_log_ratio.numel() > 0 else abs_log_ratio.sum(),
+        # k3 estimator of KL(rollout || trainer)
+        'kl': ((ratio - 1.0 - log_ratio) * valid).sum() / num_tokens,
+        'token_truncated_fraction': ((ratio > cap) & valid).sum() / num_tokens,
+        'sequence_truncated_fraction': (sequence_log_ratio.exp() > sequence_cap).float().mean(),
+    }
+
+    if to_numpy:
+        return TISWeights(
+            token_weights.cpu().numpy(),
+            sequence_weights.cpu().numpy(),
+            log_ratio.cpu().numpy(),
+            {k: v.cpu().numpy() for k, v in stats.items()},
+        )
+    return TISWeights(token_weights, sequence_weights, log_ratio, stats)
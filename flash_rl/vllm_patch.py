@@ -1,177 +1,32 @@
 import os
-import gc
-import time
 import vllm
 import torch 
-import types
 import logging
 from packaging.version import parse
 
 from torch import nn
-from .flash_quantization import get_quantize_fn
+from .configs import load_flashrl_config, select_flashrl_config
+from .flash_quantization import get_quantize_fn, load_flashrl_profile
+from .pinned_staging import stage_to_device
+from .sampling_ops import apply_top_k_top_p
+from .packed_outputs import find_model_runner, generate_packed, get_active_collector
+from .rollout_diagnostics import diagnostics_enabled, entropy_from_logprobs, filtered_mass_from_log_normalizer
+from . import weight_reload
+from .weight_reload import bond_method_to_cls, hacked_process_weights_after_loading, make_hacked_load_weights
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
 def vllm_model_finder(vllm_llm):
-    if not hasattr(vllm_llm.llm_engine, 'model_executor'):
-        vllm_llm.llm_engine.model_executor = vllm_llm.llm_engine.engine_core.model_executor
-    
-    vllm_model = vllm_llm.llm_engine.model_executor.driver_worker.worker.model_runner.model
-    return vllm_model
-
-def bond_method_to_cls(func, obj):
-    if hasattr(func, '__self__') or not callable(func):
-        # If the function is already bound to an instance, return it as is
-        return func
-    else:
-        return types.MethodType(func, obj)
-
-recorded_loader_keys = [
-    'weight_loader',
-    'load_qkv_weight',
-    'load_row_parallel_weight',
-    'load_merged_column_weight',
-    'output_dim',
-    'input_dim',
-    '_assert_and_load',
-]
-
-def hacked_process_weights_after_loading(
-    original_process_weights_after_loading,
-    model, 
-    model_config, 
-    target_device, 
-    hacked_data_dict = None,
-    updated_params = None,
-) -> None:
-    if model_config is None and target_device is None:
-        model_config = getattr(model, 'hacked_model_config', None)
-        target_device = getattr(model, 'hacked_target_device', None)
-    else:
-        setattr(model, 'hacked_model_config', model_config)
-        setattr(model, 'hacked_target_device', target_device)
-
-    if getattr(model, 'hacked_not_need_process_weights_after_loading', False):
-        logger.debug("vllm process_weights_after_loading already processed")
-        return
-
-    original_weights = dict(model.named_parameters())
-    
-    # this can be optimized for better memory usage, leave for future work...
-    if not hasattr(model, 'hacked_original_weights_rebuild_keys'):
-        model.hacked_original_weights_rebuild_keys = {}
-        for name, p in original_weights.items():
-            model.hacked_original_weights_rebuild_keys[name] = (p.shape, p.stride(), p.dtype, p.untyped_storage().nbytes())
-    
-    # record weight_loader 
-    recorded_loader = {k: dict() for k in recorded_loader_keys}
-    for name, p in original_weights.items():
-        for k in recorded_loader.keys():
-            if hasattr(p, k):
-                attr = getattr(p, k)
-                if not callable(attr):
-                    recorded_loader[k][name] = attr
-                elif p is attr.__self__:
-                    recorded_loader[k][name] = attr.__func__
-                else:
-                    recorded_loader[k][name] = attr
-
-    if hasattr(model, 'flashrl_quant_fn') and 'fast' in model.flashrl_quant_fn and hacked_data_dict is not None:
-        logger.debug('flash_rl-fast process_weight_after_loading called')
-        from vllm.model_executor.layers.linear import QKVCrossParallelLinear
-        from vllm.model_executor.layers.quantization.fp8 import Fp8LinearMethod
-        from vllm.model_executor.layers.quantization.base_config import QuantizeMethodBase
-        from vllm.model_executor.layers.quantization.compressed_tensors.schemes import CompressedTensorsW8A8Int8
-
-        try:
-            from vllm.model_executor.model_loader.loader import device_loading_context
-        except:
-            from vllm.model_executor.model_loader.utils import device_loading_context
+    return find_model_runner(vllm_llm).model
 
-        for name, module in model.named_modules():
-            if isinstance(module, QKVCrossParallelLinear):
-                module.process_weights_after_loading()
-                continue
-
-            quant_method = getattr(module, "quant_method", None)
-            if isinstance(quant_method, QuantizeMethodBase):
-                
-                if isinstance(quant_method, Fp8LinearMethod) or isinstance(quant_method, CompressedTensorsW8A8Int8):
-                    # for fast processing, we will do manual processing later
-                    continue
-                
-                with device_loading_context(module, target_device):
-                    quant_method.process_weights_after_loading(module)
-
-        skipped_params = list()
-        all_updated_params = dict(model.named_parameters())
-        if 'fp8' in model.flashrl_quant_fn:
-            for name, p in all_updated_params.items():
-                if 'weight_scale' not in name:
-                    if name in updated_params:
-                        if p.dtype != hacked_data_dict[name].dtype:
-                            weight_output = hacked_data_dict[name].t()
-                            scale_output = hacked_data_dict[name + '_scale']
-                            torch.ops._C.dynamic_scaled_fp8_quant(
-                                weight_output, p.to(target_device), scale_output,
-                            )
-                            pscale = all_updated_params[name + '_scale']
-                            tmp_data = pscale.data
-                            pscale.data = hacked_data_dict[name + '_scale']
-                            del tmp_data
-                        else:
-                            strided_data = torch.as_strided(
-                                    p.data, hacked_data_dict[name].shape, hacked_data_dict[name].stride())
-                            hacked_data_dict[name].copy_(strided_data)
-                        tmp_data = p.data
-                        p.data = hacked_data_dict[name]
-                        del tmp_data
-                        
-                    else:
-                        skipped_params.append(name)
-                        tmp_data = p.data
-                        p.data = hacked_data_dict[name]
-                        del tmp_data
-        else:
-            assert 'int8' in model.flashrl_quant_fn, 'fast loading only supports int8 and fp8'
-        
-            for name, p in all_updated_params.items():
-                if name in updated_params:
-                    strided_data = torch.as_strided(
-                            p.data, hacked_data_dict[name].shape, hacked_data_dict[name].stride())
-                    hacked_data_dict[name].copy_(strided_data)
-                else:
-                    skipped_params.append(name)
-                    
-                tmp_data = p.data
-                p.data = hacked_data_dict[name]
-                del tmp_data
-        
-        logger.debug(f"flash_rl load_weights skipped params: {skipped_params}")
-        del skipped_params
-        
-    else:
-        logger.debug("flash_rl process_weight_after_loading called")
-        original_process_weights_after_loading(model, model_config, target_device)
-
-        if hacked_data_dict is not None:
-            skipped_params = list()
-            for name, p in model.named_parameters():
-                if name in updated_params:
-                    strided_data = torch.as_strided(p.data, hacked_data_dict[name].shape, hacked_data_dict[name].stride())
-                    hacked_data_dict[name].copy_(strided_data)
-                else:
-                    skipped_params.append(name)
-                    
-                tmp_data = p.data
-                p.data = hacked_data_dict[name]
-                del tmp_data
-            
-            logger.debug(f"flash_rl load_weights skipped params (not accurate for `fp8-vllm`): {skipped_params}")
-            del skipped_params
-                            
-    model.hacked_recorded_loader = recorded_loader
+def vllm_process_weights_after_loading(model, hacked_data_dict, updated_params):
+    try: 
+        from vllm.model_executor.model_loader import loader
+        loader._process_weights_after_loading(model, None, None, hacked_data_dict=hacked_data_dict, updated_params=updated_params)
+    except ImportError:
+        from vllm.model_executor.model_loader import utils
+        utils.process_weights_after_loading(model, None, None, hacked_data_dict=hacked_data_dict, updated_params=updated_params)
 
 def patch_vllm_process_weights_after_loading():
     try:        
@@ -399,34 +254,6 @@ def patch_vllm_lmhead_to_fp32():
     
     return status 
 
-def apply_top_k_top_p(logits, k, p) -> torch.Tensor:
-    """copied from vllm
-    """
-    if k is None and p is None:
-        return logits
-    logits_sort, logits_idx = logits.sort(dim=-1, descending=False)
-
-    if k is not None:
-        # Apply top-k.
-        top_k_mask = logits_sort.size(1) - k.to(torch.long)  # shape: B
-        # Get all the top_k values.
-        top_k_mask = logits_sort.gather(1, top_k_mask.unsqueeze(dim=1))
-        top_k_mask = logits_sort < top_k_mask
-        logits_sort.masked_fill_(top_k_mask, -float("inf"))
-
-    if p is not None:
-        # Apply top-p.
-        probs_sort = logits_sort.softmax(dim=-1)
-        probs_sum = probs_sort.cumsum(dim=-1)
-        top_p_mask = probs_sum <= 1 - p.unsqueeze(dim=1)
-        # at least one
-        top_p_mask[:, -1] = False
-        logits_sort.masked_fill_(top_p_mask, -float("inf"))
-
-    # Re-sort the probabilities.
-    logits = logits_sort.scatter(dim=-1, index=logits_idx, src=logits_sort)
-    return logits
-
 def patch_vllm_logprob_compute():
     try:
         from vllm.v1.sample.sampler import Sampler
@@ -454,6 +281,7 @@ def patch_vllm_logprob_compute():
                     logits = self.apply_temperature(logits, sampling_metadata.temperature)
                     
                 # Apply topk and/or topp.
+                unfiltered_logits = logits
                 logits = apply_top_k_top_p(logits, sampling_metadata.top_k, sampling_metadata.top_p)
                 
                 if sampling_metadata.all_random:
@@ -480,6 +308,7 @@ def patch_vllm_logprob_compute():
                             out=greedy_sampled,  # Reuse tensor
                         )
 
+                processed_logprobs = None
                 if sampling_metadata.max_num_logprobs is not None:
                     processed_logprobs = self.compute_logprobs(logits)
                     logprobs_tensors = self.gather_logprobs(processed_logprobs, 0, token_ids=sampled.long())
@@ -490,6 +319,19 @@ def patch_vllm_logprob_compute():
                     sampled_token_ids=sampled.to(torch.int32).unsqueeze(-1),
                     logprobs_tensors=logprobs_tensors,
                 )
+
+                # vLLM only forwards the fields it knows from the sampler output, so packed
+                # logprobs and diagnostics go through the collector of `flashrl_generate_packed`
+                collector = get_active_collector()
+                if collector is not None:
+                    if processed_logprobs is None:
+                        processed_logprobs = self.compute_logprobs(logits)
+                    diagnostics = {}
+                    if diagnostics_enabled():
+                        log_normalizer = torch.logsumexp(logits, dim=-1) - torch.logsumexp(unfiltered_logits, dim=-1)
+                        diagnostics['post_filter_entropy'] = entropy_from_logprobs(processed_logprobs)
+                        diagnostics['filtered_mass'] = filtered_mass_from_log_normalizer(log_normalizer)
+                    collector.record(processed_logprobs.gather(-1, sampled.long().view(-1, 1)).view(-1), **diagnostics)
                 return sampler_output
             
             # Patch the LLM init function
@@ -513,31 +355,6 @@ keys_to_overload = [
     'distributed_executor_backend',
 ]
 
-def load_flashrl_config(config):
-    
-    config_path = config.strip()
-    
-    if config_path in ['bf16', 'fp8', 'fp8_vllm', 'fp8_fast', 'fp8_vllm_fast']: 
-        logger.info(f"Using profile-free default for: {config_path}")
-        
-        from .configs import get_default_config
-        from dataclasses import asdict
-        config_data = {'configs': [asdict(get_default_config(config_path))]}
-    else:        
-        logger.info(f"Loading flash_rl config from: {config_path}")
-        
-        if not os.path.exists(config_path):
-            from huggingface_hub import hf_hub_download
-            config_path = config_path.split('/')
-            assert len(config_path) >= 3, f'Invalid flash_rl config path: {config_path}'
-            config_path = hf_hub_download(repo_id='/'.join(config_path[:2]), filename='/'.join(config_path[2:]))
-
-        import yaml
-        with open(config_path, 'r') as f:
-            config_data = yaml.safe_load(f)
-
-    return config_data
-
 def patch_vllm_llm():
     try:
         if not hasattr(vllm.LLM, 'beforeflashrl__init__'):
@@ -568,7 +385,6 @@ def patch_vllm_llm():
                     
                 rank = int(os.environ.get("RANK", None))
                 mp_size = kwargs.get('tensor_parallel_size', 1) * kwargs.get('pipeline_parallel_size', 1)
-                dp_rank = rank // mp_size
                 
                 if config is not None:
                     # Load the config file and set the model
@@ -576,10 +392,7 @@ def patch_vllm_llm():
                     logger.info(f"flash_rl config detected.")
                     config_data = load_flashrl_config(config)
                         
-                    config_count = len(config_data['configs'])
-                    config_index = dp_rank % config_count
-                    logger.info(f"Using config {config_index} of {config_count}")
-                    config_data = config_data['configs'][config_index]
+                    config_data = select_flashrl_config(config_data, rank, mp_size)
                     
                     for k, v in config_data.items():
                         logger.info(f"rank {rank} flash_rl config: {k}: {v}")
@@ -608,22 +421,33 @@ def patch_vllm_llm():
                             self.flash_rl_profile = None
                         else:
                             quant_profile = config_data.get('profile', os.path.join(model, 'profile.pt'))
-                            logger.debug(f"Loading flash_rl profile from: {quant_profile}")
-                            
-                            quant_profile_path = quant_profile.strip()
-                            if not os.path.exists(quant_profile_path):
-                                from huggingface_hub import hf_hub_download
-                                quant_profile_path = quant_profile_path.split('/')
-                                assert len(quant_profile_path) >= 3, f'Invalid flash_rl profile path: {quant_profile_path}'
-                                quant_profile_path = hf_hub_download(repo_id='/'.join(quant_profile_path[:2]), filename='/'.join(quant_profile_path[2:]))
-                            
-                            self.flash_rl_profile = torch.load(quant_profile_path)
+                            self.flash_rl_profile = load_flashrl_profile(quant_profile, config_data.get('bf16_layers'))
                         
                     if 'module_attribute_to_preserve' in config_data:
                         logger.debug(f"flash_rl module_attribute_to_preserve: {config_data['module_attribute_to_preserve']}")
                         self.flash_rl_module_attribute_to_preserve = config_data.get('module_attribute_to_preserve')
                     else:
                         self.flash_rl_module_attribute_to_preserve = []
+
+                    self.flash_rl_snapshot_dir = config_data.get('snapshot_dir', os.environ.get('FLASHRL_SNAPSHOT_DIR', None))
+                    self.flash_rl_snapshot_to_load = None
+                    if self.flash_rl_snapshot_dir is not None and config_data.get('fn', 'int8') != 'bf16':
+                        from .snapshot import flashrl_config_hash, find_snapshot
+                        self.flash_rl_config_hash = flashrl_config_hash(config_data, model)
+                        self.flash_rl_snapshot_to_load = find_snapshot(
+                            self.flash_rl_snapshot_dir,
+                            self.flash_rl_config_hash,
+                            rank,
+                            os.environ.get('FLASHRL_SNAPSHOT_STEP', None),
+                        )
+                        if self.flash_rl_snapshot_to_load is not None:
+                            # the snapshot already holds the processed weights, skip the checkpoint load
+                            logger.info(f"flash_rl snapshot found: {self.flash_rl_snapshot_to_load}, using dummy load_format")
+                            kwargs['load_format'] = 'dummy'
+
+                    # the arena is built when the engine post-processes the loaded weights,
+                    # before the kv cache and the cuda graphs are set up
+                    weight_reload.flat_param_arena_on_load = config_data.get('flat_param_arena', False)
                         
                 else:
                     logger.info(f"flash_rl config not detected.")
@@ -648,99 +472,52 @@ def patch_vllm_llm():
                     # Store the original load_weights function
                     original_load_weights = model.load_weights
                     model.beforeflashrl_load_weights = original_load_weights
-                    def hacked_load_weights(
-                        weights,
-                    ):
-                        start_time = time.time()
-                        setattr(model, 'hacked_not_need_process_weights_after_loading', False)
-                        
-                        if not hasattr(model, "hacked_original_weights_rebuild_keys"):
-                            return original_load_weights(flash_quantize_fn(weights, self.flash_rl_profile))
-                        
-                        # print("flash_rl quant load_weights is called")
-                        
-                        if len(self.flash_rl_module_attribute_to_preserve) > 0:
-                            for _, module in model.named_modules():
-                                for attr in self.flash_rl_module_attribute_to_preserve:
-                                    if torch.is_tensor(getattr(module, attr, None)):
-                                        # print(f"flash_rl reserving {attr} in module {module}")
-                                        setattr(module, f'hacked_{attr}', getattr(module, attr))
-                        
-                        existing_params = dict(model.named_parameters())
-                        
-                        hacked_data_dict = {}
-                        for name, p in existing_params.items():
-                            hacked_data_dict[name] = p.data
-                        
-                        for name, (shape, stride, dtype, nbytes) in model.hacked_original_weights_rebuild_keys.items():
-                            if name in existing_params:
-                                existing_params[name].data = torch.empty(shape, dtype=dtype) 
-                        
-                        for k, loader_k in model.hacked_recorded_loader.items():
-                            for n, loader in loader_k.items():
-                                if not hasattr(existing_params[n], k):
-                                    setattr(existing_params[n], k, bond_method_to_cls(loader, existing_params[n]))
-
-                        del existing_params
-                        
-                        end_time = time.time()
-                        logger.debug(f"flash_rl load_weights preparation took {end_time - start_time:.2f} seconds")
-                        start_time = end_time
-                        
-                        updated_params = original_load_weights(
-                            flash_quantize_fn(weights, self.flash_rl_profile)
-                        )
-                        
-                        end_time = time.time()
-                        logger.debug(f"flash_rl original_load_weights took {end_time - start_time:.2f} seconds")
-                        start_time = end_time
-                        
-                        del weights
-                        if hasattr(model, 'hacked_model_config') and hasattr(model, 'hacked_target_device'):
-                            try: 
-                                from vllm.model_executor.model_loader import loader
-                                loader._process_weights_after_loading(model, None, None, hacked_data_dict=hacked_data_dict, updated_params=updated_params)
-                            except ImportError:
-                                from vllm.model_executor.model_loader import utils
-                                utils.process_weights_after_loading(model, None, None, hacked_data_dict=hacked_data_dict, updated_params=updated_params)
-                            setattr(model, 'hacked_not_need_process_weights_after_loading', True)
-                        else:
-                            setattr(model, 'hacked_not_need_process_weights_after_loading', False)
-                            skipped_params = list()
-                            for name, p in model.named_parameters():
-                                if name in updated_params:
-                                    strided_data = torch.as_strided(p.data, hacked_data_dict[name].shape, hacked_data_dict[name].stride())
-                                    hacked_data_dict[name].copy_(strided_data)
-                                else:
-                                    skipped_params.append(name)
-                                    
-                                tmp_data = p.data
-                                p.data = hacked_data_dict[name]
-                                del tmp_data
-                            
-                            logger.debug(f"flash_rl load_weights skipped params (not accurate for `fp8-vllm`): {skipped_params}")
-                            del skipped_params
-                            
-                        del hacked_data_dict
-                        gc.collect()
-                        torch.cuda.empty_cache()
-                        
-                        if len(self.flash_rl_module_attribute_to_preserve) > 0:
-                            for _, module in model.named_modules():
-                                for attr in self.flash_rl_module_attribute_to_preserve:
-                                    if torch.is_tensor(getattr(module, attr, None)):
-                                        assert hasattr(module, f'hacked_{attr}'), f"module {module} does not have attribute hacked_{attr}"
-                                        setattr(module, attr, getattr(module, f'hacked_{attr}'))
-                                        delattr(module, f'hacked_{attr}')
-                        
-                        end_time = time.time()
-                        logger.debug(f"flash_rl load_weights process_weights_after_loading took {end_time - start_time:.2f} seconds")             
-                        return updated_params
-                    
-                    model.load_weights = hacked_load_weights
+                    model.load_weights = make_hacked_load_weights(
+                        model,
+                        original_load_weights,
+                        flash_quantize_fn,
+                        lambda: self.flash_rl_profile,
+                        self.flash_rl_module_attribute_to_preserve,
+                        vllm_process_weights_after_loading,
+                    )
                     logger.debug("Successfully patched the load_weights function of vllm")
+
+                    if self.flash_rl_snapshot_dir is not None:
+                        from .snapshot import load_snapshot, prune_snapshots, save_snapshot, snapshot_path
+
+                        if self.flash_rl_snapshot_to_load is not None:
+                            load_snapshot(model, self.flash_rl_snapshot_to_load, self.flash_rl_module_attribute_to_preserve)
+
+                        def flashrl_save_snapshot(step, keep_last=1):
+                            path = snapshot_path(self.flash_rl_snapshot_dir, self.flash_rl_config_hash, rank, step)
+                            save_snapshot(model, path, step, self.flash_rl_config_hash, self.flash_rl_module_attribute_to_preserve)
+                            prune_snapshots(self.flash_rl_snapshot_dir, self.flash_rl_config_hash, rank, keep_last=keep_last)
+                            return path
+
+                        self.flashrl_save_snapshot = flashrl_save_snapshot
                 else:
                     logger.debug("vllm load_weights patching skipped")
+
+                def flashrl_load_shared_weights(manifest):
+                    # colocated handoff: weights are views into the trainer's shared buffer
+                    from .shared_weights import open_shared_weights
+                    with open_shared_weights(manifest) as shared_weights:
+                        return vllm_model_finder(self).load_weights(shared_weights.iter_weights())
+
+                self.flashrl_load_shared_weights = flashrl_load_shared_weights
+
+                def flashrl_receive_weights(receiver):
+                    # disaggregated rollout: load while the remaining tensors are still on the wire
+                    return vllm_model_finder(self).load_weights(receiver.receive())
+
+                self.flashrl_receive_weights = flashrl_receive_weights
+
+                def flashrl_generate_packed(*args, **kwargs):
+                    # sampled-token logprobs stay a packed device tensor; leave `logprobs` unset in
+                    # the sampling params so vLLM builds no per-token Python objects
+                    return generate_packed(self, *args, **kwargs)
+
+                self.flashrl_generate_packed = flashrl_generate_packed
                 
                 return init_return
             
@@ -782,7 +559,7 @@ def patch_vllm_llm_test_reload():
                         print(f"FLASH_RL re-loading model {config_i} to device {device}")
                         model = vllm_model_finder(self)
                         model.load_weights(
-                            ((name, param.to(device)) for name, param in model_to_be_reloaded.named_parameters())
+                            ((name, stage_to_device(param, device)) for name, param in model_to_be_reloaded.named_parameters())
                         )
                 else:
                     print(f"FLASH_RL re-loading model not detected.")
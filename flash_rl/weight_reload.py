@@ -0,0 +1,280 @@
+import gc
+import time
+import types
+import logging
+
+import torch
+
+from .flash_quantization import Fp8QuantGroup
+from .pinned_staging import stage_to_device
+
+# Set up logger
+logger = logging.getLogger(__name__)
+
+def bond_method_to_cls(func, obj):
+    if hasattr(func, '__self__') or not callable(func):
+        # If the function is already bound to an instance, return it as is
+        return func
+    else:
+        return types.MethodType(func, obj)
+
+recorded_loader_keys = [
+    'weight_loader',
+    'load_qkv_weight',
+    'load_row_parallel_weight',
+    'load_merged_column_weight',
+    'output_dim',
+    'input_dim',
+    '_assert_and_load',
+]
+
+# set by the vllm patch from the flash_rl config before the engine loads the model
+flat_param_arena_on_load = False
+
+def hacked_process_weights_after_loading(
+    original_process_weights_after_loading,
+    model, 
+    model_config, 
+    target_device, 
+    hacked_data_dict = None,
+    updated_params = None,
+) -> None:
+    if model_config is None and target_device is None:
+        model_config = getattr(model, 'hacked_model_config', None)
+        target_device = getattr(model, 'hacked_target_device', None)
+    else:
+        setattr(model, 'hacked_model_config', model_config)
+        setattr(model, 'hacked_target_device', target_device)
+
+    if getattr(model, 'hacked_not_need_process_weights_after_loading', False):
+        logger.debug("vllm process_weights_after_loading already processed")
+        return
+
+    original_weights = dict(model.named_parameters())
+    
+    # this can be optimized for better memory usage, leave for future work...
+    if not hasattr(model, 'hacked_original_weights_rebuild_keys'):
+        model.hacked_original_weights_rebuild_keys = {}
+        for name, p in original_weights.items():
+            model.hacked_original_weights_rebuild_keys[name] = (p.shape, p.stride(), p.dtype, p.untyped_storage().nbytes())
+    
+    # record weight_loader 
+    recorded_loader = {k: dict() for k in recorded_loader_keys}
+    for name, p in original_weights.items():
+        for k in recorded_loader.keys():
+            if hasattr(p, k):
+                attr = getattr(p, k)
+                if not callable(attr):
+                    recorded_loader[k][name] = attr
+                elif p is attr.__self__:
+                    recorded_loader[k][name] = attr.__func__
+                else:
+                    recorded_loader[k][name] = attr
+
+    if hasattr(model, 'flashrl_quant_fn') and 'fast' in model.flashrl_quant_fn and hacked_data_dict is not None:
+        logger.debug('flash_rl-fast process_weight_after_loading called')
+        from vllm.model_executor.layers.linear import QKVCrossParallelLinear
+        from vllm.model_executor.layers.quantization.fp8 import Fp8LinearMethod
+        from vllm.model_executor.layers.quantization.base_config import QuantizeMethodBase
+        from vllm.model_executor.layers.quantization.compressed_tensors.schemes import CompressedTensorsW8A8Int8
+
+        try:
+            from vllm.model_executor.model_loader.loader import device_loading_context
+        except:
+            from vllm.model_executor.model_loader.utils import device_loading_context
+
+        for name, module in model.named_modules():
+            if isinstance(module, QKVCrossParallelLinear):
+                module.process_weights_after_loading()
+                continue
+
+            quant_method = getattr(module, "quant_method", None)
+            if isinstance(quant_method, QuantizeMethodBase):
+                
+                if isinstance(quant_method, Fp8LinearMethod) or isinstance(quant_method, CompressedTensorsW8A8Int8):
+                    # for fast processing, we will do manual processing later
+                    continue
+                
+                with device_loading_context(module, target_device):
+                    quant_method.process_weights_after_loading(module)
+
+        skipped_params = list()
+        all_updated_params = dict(model.named_parameters())
+        if 'fp8' in model.flashrl_quant_fn:
+            # quantized per decoder layer (vllm kernel, or multi-tensor ops); the group keeps the loaded data alive
+            fp8_group = Fp8QuantGroup()
+            for name, p in all_updated_params.items():
+                if 'weight_scale' not in name:
+                    if name in updated_params:
+                        if p.dtype != hacked_data_dict[name].dtype:
+                            fp8_group.add(
+                                name,
+                                hacked_data_dict[name].t(),
+                                stage_to_device(p.data, target_device),
+                                hacked_data_dict[name + '_scale'],
+                            )
+                            pscale = all_updated_params[name + '_scale']
+                            tmp_data = pscale.data
+                            pscale.data = hacked_data_dict[name + '_scale']
+                            del tmp_data
+                        else:
+                            strided_data = torch.as_strided(
+                                    p.data, hacked_data_dict[name].shape, hacked_data_dict[name].stride())
+                            hacked_data_dict[name].copy_(strided_data)
+                        tmp_data = p.data
+                        p.data = hacked_data_dict[name]
+                        del tmp_data
+                        
+                    else:
+                        skipped_params.append(name)
+                        tmp_data = p.data
+                        p.data = hacked_data_dict[name]
+                        del tmp_data
+            fp8_group.flush()
+        else:
+            assert 'int8' in model.flashrl_quant_fn, 'fast loading only supports int8 and fp8'
+        
+            for name, p in all_updated_params.items():
+                if name in updated_params:
+                    strided_data = torch.as_strided(
+                            p.data, hacked_data_dict[name].shape, hacked_data_dict[name].stride())
+                    hacked_data_dict[name].copy_(strided_data)
+                else:
+                    skipped_params.append(name)
+                    
+                tmp_data = p.data
+                p.data = hacked_data_dict[name]
+                del tmp_data
+        
+        logger.debug(f"flash_rl load_weights skipped params: {skipped_params}")
+        del skipped_params
+        
+    else:
+        logger.debug("flash_rl process_weight_after_loading called")
+        original_process_weights_after_loading(model, model_config, target_device)
+
+        if hacked_data_dict is not None:
+            copy_back_updated_params(model, hacked_data_dict, updated_params)
+        elif flat_param_arena_on_load and not hasattr(model, 'flashrl_param_arena'):
+            build_flat_param_arena(model)
+                            
+    model.hacked_recorded_loader = recorded_loader
+
+def build_flat_param_arena(model):
+    """
+    Move the processed params of a freshly loaded model into a flat arena. This runs
+    inside model loading, before the engine profiles memory, allocates the KV cache
+    and captures graphs, so the transient second copy of the weights is released
+    before then and every later reload copies back into the arena views.
+    """
+    from .param_arena import ParamArena
+
+    model.flashrl_param_arena = ParamArena.from_module(model)
+    gc.collect()
+    torch.cuda.empty_cache()
+    logger.debug("flash_rl parameters moved into a flat arena")
+
+def copy_back_updated_params(model, hacked_data_dict, updated_params):
+    """Copy the updated params into the storages they had before the update, and re-point them."""
+    skipped_params = list()
+    for name, p in model.named_parameters():
+        if name in updated_params:
+            strided_data = torch.as_strided(p.data, hacked_data_dict[name].shape, hacked_data_dict[name].stride())
+            hacked_data_dict[name].copy_(strided_data)
+        else:
+            skipped_params.append(name)
+            
+        tmp_data = p.data
+        p.data = hacked_data_dict[name]
+        del tmp_data
+    
+    logger.debug(f"flash_rl load_weights skipped params (not accurate for `fp8-vllm`): {skipped_params}")
+    del skipped_params
+
+def make_hacked_load_weights(
+    model,
+    original_load_weights,
+    flash_quantize_fn,
+    get_profile,
+    module_attribute_to_preserve,
+    process_weights_after_loading,
+):
+    """
+    Build the `load_weights` replacement of a loaded model: params are rebuilt in
+    their loading layout (with their recorded loaders), updated weights are
+    quantized and loaded by `original_load_weights`, then
+    `process_weights_after_loading(model, hacked_data_dict, updated_params)`
+    writes them back into the original storages.
+
+    Nothing here imports vllm, so the same function runs against the real model
+    and against `flash_rl.bench.mock_vllm`.
+    """
+    def hacked_load_weights(
+        weights,
+    ):
+        start_time = time.time()
+        setattr(model, 'hacked_not_need_process_weights_after_loading', False)
+        
+        if not hasattr(model, "hacked_original_weights_rebuild_keys"):
+            return original_load_weights(flash_quantize_fn(weights, get_profile()))
+        
+        if len(module_attribute_to_preserve) > 0:
+            for _, module in model.named_modules():
+                for attr in module_attribute_to_preserve:
+                    if torch.is_tensor(getattr(module, attr, None)):
+                        setattr(module, f'hacked_{attr}', getattr(module, attr))
+        
+        existing_params = dict(model.named_parameters())
+        
+        hacked_data_dict = {}
+        for name, p in existing_params.items():
+            hacked_data_dict[name] = p.data
+        
+        for name, (shape, stride, dtype, nbytes) in model.hacked_original_weights_rebuild_keys.items():
+            if name in existing_params:
+                existing_params[name].data = torch.empty(shape, dtype=dtype) 
+        
+        for k, loader_k in model.hacked_recorded_loader.items():
+            for n, loader in loader_k.items():
+                if not hasattr(existing_params[n], k):
+                    setattr(existing_params[n], k, bond_method_to_cls(loader, existing_params[n]))
+
+        del existing_params
+        
+        end_time = time.time()
+        logger.debug(f"flash_rl load_weights preparation took {end_time - start_time:.2f} seconds")
+        start_time = end_time
+        
+        updated_params = original_load_weights(
+            flash_quantize_fn(weights, get_profile())
+        )
+        
+        end_time = time.time()
+        logger.debug(f"flash_rl original_load_weights took {end_time - start_time:.2f} seconds")
+        start_time = end_time
+        
+        del weights
+        if hasattr(model, 'hacked_model_config') and hasattr(model, 'hacked_target_device'):
+            process_weights_after_loading(model, hacked_data_dict, updated_params)
+            setattr(model, 'hacked_not_need_process_weights_after_loading', True)
+        else:
+            setattr(model, 'hacked_not_need_process_weights_after_loading', False)
+            copy_back_updated_params(model, hacked_data_dict, updated_params)
+            
+        del hacked_data_dict
+        gc.collect()
+        torch.cuda.empty_cache()
+        
+        if len(module_attribute_to_preserve) > 0:
+            for _, module in model.named_modules():
+                for attr in module_attribute_to_preserve:
+                    if torch.is_tensor(getattr(module, attr, None)):
+                        assert hasattr(module, f'hacked_{attr}'), f"module {module} does not have attribute hacked_{attr}"
+                        setattr(module, attr, getattr(module, f'hacked_{attr}'))
+                        delattr(module, f'hacked_{attr}')
+        
+        end_time = time.time()
+        logger.debug(f"flash_rl load_weights process_weights_after_loading took {end_time - start_time:.2f} seconds")             
+        return updated_params
+
+    return hacked_load_weights
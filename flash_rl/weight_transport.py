@@ -0,0 +1,293 @@
+import ctypes
+import json
+import logging
+import queue
+import socket
+import struct
+import threading
+import time
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_BYTES = 4 * 2**20
+DEFAULT_MAX_INFLIGHT = 4
+
+_HEADER = struct.Struct('!Q')
+_ACK = b'\x01'
+_END = object()
+_WIRE_QUANTIZABLE = (torch.float16, torch.bfloat16, torch.float32)
+
+
+def _tensor_memoryview(tensor):
+    """Writable byte view over the memory of a contiguous CPU tensor (no numpy needed)."""
+    nbytes = tensor.numel() * tensor.element_size()
+    if nbytes == 0:
+        return memoryview(b'')
+    return memoryview((ctypes.c_ubyte * nbytes).from_address(tensor.data_ptr())).cast('B')
+
+
+def _as_bytes(tensor):
+    return tensor.reshape(-1).view(torch.uint8)
+
+
+def quantize_for_wire(tensor):
+    """Symmetric per-row int8 quantization of a floating tensor, used on the wire only."""
+    rows = tensor.reshape(tensor.shape[0], -1) if tensor.dim() > 1 else tensor.reshape(1, -1)
+    rows = rows.float()
+    scale = rows.abs().amax(dim=1, keepdim=True).clamp_min(1e-12) / 127.0
+    q = torch.round(rows / scale).clamp_(-127, 127).to(torch.int8)
+    return q, scale.view(-1)
+
+
+def dequantize_from_wire(q, scale, shape, dtype):
+    return (q.float() * scale.view(-1, 1)).to(dtype).view(shape)
+
+
+def _recv_exact_into(sock, view):
+    received = 0
+    while received < len(view):
+        n = sock.recv_into(view[received:], len(view) - received)
+        if n == 0:
+            raise ConnectionError("flash_rl weight transport: connection closed by peer")
+        received += n
+
+
+def _send_frame(sock, payload):
+    data = json.dumps(payload).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_frame(sock):
+    header = bytearray(_HEADER.size)
+    _recv_exact_into(sock, memoryview(header))
+    (length,) = _HEADER.unpack(header)
+    data = bytearray(length)
+    _recv_exact_into(sock, memoryview(data))
+    return json.loads(data.decode('utf-8'))
+
+
+class WeightSender:
+    """Trainer side of the network weight transport.
+
+    Tensors are serialized by a background thread into fixed-size chunks; up to
+    `max_inflight` chunks are queued ahead of the socket, so that device-to-host
+    copies and (optional) int8 wire quantization overlap with the network.
+    """
+
+    def __init__(
+        self,
+        host,
+        port,
+        chunk_bytes=DEFAULT_CHUNK_BYTES,
+        max_inflight=DEFAULT_MAX_INFLIGHT,
+        wire_quantization=None,
+        connect_timeout=60.0,
+    ):
+        assert wire_quantization in (None, 'int8'), f"unsupported wire quantization {wire_quantization}"
+        self.chunk_bytes = chunk_bytes
+        self.max_inflight = max_inflight
+        self.wire_quantization = wire_quantization
+        self.sock = socket.create_connection((host, port), timeout=connect_timeout)
+        self.sock.settimeout(None)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, chunk_bytes * max_inflight)
+
+    def _records(self, named_tensors):
+        for name, tensor in named_tensors:
+            tensor = tensor.detach()
+            header = {'name': name, 'shape': list(tensor.shape), 'dtype': str(tensor.dtype).replace('torch.', '')}
+            if self.wire_quantization == 'int8' and tensor.dtype in _WIRE_QUANTIZABLE and tensor.numel() > 0:
+                q, scale = quantize_for_wire(tensor)
+                payloads = [_as_bytes(q.contiguous().cpu()), _as_bytes(scale.contiguous().cpu())]
+                header['wire'] = 'int8'
+            else:
+                payloads = [_as_bytes(tensor.contiguous().cpu())]
+                header['wire'] = 'raw'
+            header['nbytes'] = [p.numel() for p in payloads]
+            yield header, payloads
+
+    def _produce(self, named_tensors, chunks, errors, stop):
+        try:
+            for header, payloads in self._records(named_tensors):
+                if stop.is_set():
+                    break
+                # a record is fully serialized before its frame is queued, so a failure
+                # always leaves the stream at a tensor boundary
+                chunks.put(('frame', header))
+                for payload in payloads:
+                    view = _tensor_memoryview(payload)
+                    for start in range(0, len(view), self.chunk_bytes):
+                        # keep `payload` alive until its chunks are sent
+                        chunks.put(('chunk', (payload, view[start:start + self.chunk_bytes])))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            chunks.put((_END, None))
+
+    def send(self, named_tensors):
+        """
+        Stream all `(name, tensor)` pairs and block until the receiver has loaded them.
+
+        If producing a tensor fails, the receiver is sent an abort frame (so that its
+        `receive()` raises instead of waiting) and the error is re-raised here.
+        """
+        start_time = time.time()
+        chunks = queue.Queue(maxsize=self.max_inflight)
+        errors = []
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(named_tensors, chunks, errors, stop), daemon=True)
+        producer.start()
+
+        total_bytes, num_tensors = 0, 0
+        finished = False
+        try:
+            while True:
+                kind, item = chunks.get()
+                if kind is _END:
+                    finished = True
+                    break
+                if kind == 'frame':
+                    _send_frame(self.sock, item)
+                    num_tensors += 1
+                else:
+                    _, view = item
+                    self.sock.sendall(view)
+                    total_bytes += len(view)
+        finally:
+            if not finished:
+                # the socket failed: stop the producer, which may be blocked on the full queue
+                stop.set()
+                while chunks.get()[0] is not _END:
+                    pass
+            producer.join()
+        if len(errors) > 0:
+            _send_frame(self.sock, {'abort': f"{type(errors[0]).__name__}: {errors[0]}"})
+            raise errors[0]
+
+        _send_frame(self.sock, {'end': True})
+        ack = bytearray(1)
+        _recv_exact_into(self.sock, memoryview(ack))
+        assert bytes(ack) == _ACK, "flash_rl weight transport: unexpected acknowledgement"
+
+        elapsed = time.time() - start_time
+        logger.debug(
+            f"flash_rl sent {num_tensors} tensors ({total_bytes / 2**20:.1f} MiB) "
+            f"in {elapsed:.2f} seconds ({total_bytes / 2**30 / max(elapsed, 1e-9):.2f} GiB/s)"
+        )
+        return {'tensors': num_tensors, 'bytes': total_bytes, 'seconds': elapsed}
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class WeightReceiver:
+    """Rollout side of the network weight transport.
+
+    `receive()` returns a generator of `(name, tensor)` meant to be passed to the
+    patched `load_weights`; a reader thread keeps pulling up to `max_inflight`
+    tensors from the socket while the consumer quantizes and loads earlier ones.
+    """
+
+    def __init__(self, host='0.0.0.0', port=0, max_inflight=DEFAULT_MAX_INFLIGHT, chunk_bytes=DEFAULT_CHUNK_BYTES):
+        self.max_inflight = max_inflight
+        self.chunk_bytes = chunk_bytes
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.sock = None
+
+    def accept(self, timeout=None):
+        self.server.settimeout(timeout)
+        self.sock, addr = self.server.accept()
+        self.sock.settimeout(None)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.chunk_bytes * self.max_inflight)
+        logger.debug(f"flash_rl weight receiver connected from {addr}")
+        return self
+
+    def _read_tensor(self, header):
+        payloads = []
+        for nbytes in header['nbytes']:
+            payload = torch.empty(nbytes, dtype=torch.uint8)
+            view = _tensor_memoryview(payload)
+            for start in range(0, nbytes, self.chunk_bytes):
+                _recv_exact_into(self.sock, view[start:start + self.chunk_bytes])
+            payloads.append(payload)
+
+        shape, dtype = header['shape'], getattr(torch, header['dtype'])
+        if header['wire'] == 'int8':
+            scale = payloads[1].view(torch.float32)
+            q = payloads[0].view(torch.int8).view(scale.numel(), -1)
+            return dequantize_from_wire(q, scale, shape, dtype)
+        return payloads[0].view(dtype).view(shape)
+
+    def _read(self, tensors, errors):
+        try:
+            while True:
+                header = _recv_frame(self.sock)
+                if header.get('end', False):
+                    break
+                if 'abort' in header:
+                    raise RuntimeError(f"flash_rl weight transport: sender aborted the sync: {header['abort']}")
+                tensors.put((header['name'], self._read_tensor(header)))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            tensors.put(_END)
+
+    def receive(self):
+        """
+        Yield the tensors of one weight sync; acknowledges the sender when exhausted.
+
+        Raises if the sender aborts the sync. If the generator is abandoned before it
+        is exhausted (e.g., the consumer failed), the connection is dropped, since the
+        stream cannot be resumed mid-sync; the next `receive()` accepts a new one.
+        """
+        if self.sock is None:
+            self.accept()
+        tensors = queue.Queue(maxsize=self.max_inflight)
+        errors = []
+        reader = threading.Thread(
+            target=self._read, args=(tensors, errors), name='flashrl-weight-receiver', daemon=True,
+        )
+        reader.start()
+        finished = False
+        try:
+            while True:
+                item = tensors.get()
+                if item is _END:
+                    finished = True
+                    break
+                yield item
+        finally:
+            if not finished:
+                # unblock the reader, stuck either on the socket or on the full queue
+                self._disconnect()
+                while tensors.get() is not _END:
+                    pass
+            reader.join()
+        if len(errors) > 0:
+            raise errors[0]
+        self.sock.sendall(_ACK)
+
+    def _disconnect(self):
+        sock, self.sock = self.sock, None
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+    def close(self):
+        for s in (self.sock, self.server):
+            if s is not None:
+                try:
+                    s.close()
+                except OSError:
+                    pass
@@ -87,3 +87,71 @@ def test_engine_kwargs_precedence(monkeypatch):
     assert captured.get("quantization") == "bf16"
     # If user specified kv_cache_dtype, it should remain as provided
     assert captured.get("kv_cache_dtype") == "bf16"
+
+
+def _write_yaml(tmp_path, config):
+    import yaml
+
+    path = tmp_path / "flashrl_config.yaml"
+    path.write_text(yaml.dump({"configs": [config]}))
+    return str(path)
+
+
+def test_engine_args_yaml_int8(monkeypatch, tmp_path):
+    cfg = _write_yaml(tmp_path, {
+        "fn": "int8",
+        "load_format": "auto",
+        "model": "RedHatAI/Qwen2.5-0.5B-Instruct-quantized.w8a8",
+        "profile": "/tmp/profile.pt",
+        "distributed_executor_backend": "external_launcher",
+    })
+    monkeypatch.setenv("FLASHRL_CONFIG", cfg)
+    mod = importlib.import_module("flash_rl.sglang_patch.engine_args")
+    importlib.reload(mod)
+    args = mod._map_flashrl_to_sglang_args()
+    assert args == {
+        "quantization": "w8a8_int8",
+        "model_path": "RedHatAI/Qwen2.5-0.5B-Instruct-quantized.w8a8",
+    }
+
+
+def test_engine_args_yaml_fp8_channel(monkeypatch, tmp_path):
+    cfg = _write_yaml(tmp_path, {
+        "fn": "fp8_channel",
+        "load_format": "dummy",
+        "model": "some/fp8-checkpoint",
+        "module_attribute_to_preserve": ["workspace"],
+    })
+    monkeypatch.setenv("FLASHRL_CONFIG", cfg)
+    monkeypatch.setenv("FLASHRL_KV_CACHE_DTYPE", "fp8_e4m3")
+    monkeypatch.delenv("FLASHRL_DISABLE_FP8_KV", raising=False)
+    mod = importlib.import_module("flash_rl.sglang_patch.engine_args")
+    importlib.reload(mod)
+    args = mod._map_flashrl_to_sglang_args()
+    # the pre-quantized checkpoint selects its own (per-channel) scheme
+    assert "quantization" not in args
+    assert args["load_format"] == "dummy"
+    assert args["model_path"] == "some/fp8-checkpoint"
+    assert args["kv_cache_dtype"] == "fp8_e4m3"
+
+
+def test_engine_args_yaml_bf16(monkeypatch, tmp_path):
+    cfg = _write_yaml(tmp_path, {"fn": "bf16", "load_format": "dummy"})
+    monkeypatch.setenv("FLASHRL_CONFIG", cfg)
+    mod = importlib.import_module("flash_rl.sglang_patch.engine_args")
+    importlib.reload(mod)
+    assert mod._map_flashrl_to_sglang_args() == {}
+
+
+def test_engine_args_yaml_selects_config_by_rank(monkeypatch, tmp_path):
+    import yaml
+
+    path = tmp_path / "flashrl_config.yaml"
+    path.write_text(yaml.dump({"configs": [{"fn": "bf16"}, {"fn": "int8", "model": "m"}]}))
+    monkeypatch.setenv("FLASHRL_CONFIG", str(path))
+    monkeypatch.setenv("RANK", "2")
+    mod = importlib.import_module("flash_rl.sglang_patch.engine_args")
+    importlib.reload(mod)
+    # rank 2 with tp_size 2 is data-parallel rank 1
+    assert mod._map_flashrl_to_sglang_args(tp_size=2)["quantization"] == "w8a8_int8"
+    assert mod._map_flashrl_to_sglang_args(tp_size=1) == {}
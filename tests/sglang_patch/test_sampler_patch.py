@@ -45,3 +45,254 @@ def test_post_filter_distribution_minp():
     kept_mask = base >= (0.5 * maxp)
     assert torch.equal((probs > 0), kept_mask)
     assert math.isclose(float(probs.sum()), 1.0, rel_tol=1e-5)
+
+
+def test_post_filter_distribution_per_row_params():
+    mod = importlib.import_module("flash_rl.sglang_patch.sampler_patch")
+    torch.manual_seed(0)
+    logits = torch.randn(4, 11)
+    params = {
+        "temperature": torch.tensor([1.0, 0.5, 0.0, 2.0]),
+        "top_k": torch.tensor([3, 0, 5, 11]),
+        "top_p": torch.tensor([1.0, 0.8, 0.5, 0.9]),
+        "min_p": torch.tensor([0.0, 0.1, 0.0, 0.2]),
+    }
+    probs = mod.compute_post_filter_distribution(logits, **params)
+    for i in range(logits.shape[0]):
+        row = mod.compute_post_filter_distribution(
+            logits[i : i + 1],
+            temperature=float(params["temperature"][i]),
+            top_k=int(params["top_k"][i]),
+            top_p=float(params["top_p"][i]),
+            min_p=float(params["min_p"][i]),
+        )
+        assert torch.allclose(probs[i : i + 1], row, atol=1e-6)
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {},
+        {"temperature": 0.7},
+        {"top_k": 5},
+        {"top_p": 0.8},
+        {"min_p": 0.05},
+        {"temperature": 1.3, "top_k": 20, "top_p": 0.9, "min_p": 0.02},
+        {
+            "temperature": torch.tensor([1.0, 0.5, 0.0, 2.0]) if torch is not None else None,
+            "top_k": torch.tensor([3, 0, 5, 11]) if torch is not None else None,
+            "top_p": torch.tensor([1.0, 0.8, 0.5, 0.9]) if torch is not None else None,
+            "min_p": torch.tensor([0.0, 0.1, 0.0, 0.2]) if torch is not None else None,
+        },
+    ],
+)
+def test_post_filter_logprob_matches_distribution(params):
+    mod = importlib.import_module("flash_rl.sglang_patch.sampler_patch")
+    torch.manual_seed(0)
+    logits = torch.randn(4, 64) * 3
+    token_ids = torch.randint(0, 64, (4,))
+    token_ids[0] = logits[0].argmax()
+
+    expected = mod.compute_logprob_of_token(mod.compute_post_filter_distribution(logits, **params), token_ids)
+    out = mod.compute_post_filter_logprob(logits, token_ids, **params)
+    assert torch.allclose(out.logprobs, expected, atol=1e-5)
+    assert out.log_normalizer.shape == token_ids.shape
+    assert bool((out.log_normalizer <= 1e-6).all())
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"top_p": 0.9},
+        {"top_k": 8, "min_p": 0.01},
+        {"top_p": 0.999, "min_p": 1e-6},
+        # wider than the candidate window
+        {"top_k": torch.tensor([1500] * 36 + [3]) if torch is not None else None},
+    ],
+)
+def test_post_filter_logprob_tiled_and_windowed(params):
+    mod = importlib.import_module("flash_rl.sglang_patch.sampler_patch")
+    torch.manual_seed(0)
+    logits = torch.randn(37, 5000)
+    logits[:5] *= 0.01  # flat rows: the top-p cutoff falls outside the candidate window
+    token_ids = torch.randint(0, 5000, (37,))
+
+    expected = mod.compute_post_filter_logprob(logits, token_ids, memory_budget_mb=1e6, **params)
+    tiled = mod.compute_post_filter_logprob(logits, token_ids, memory_budget_mb=0.5, **params)
+    reference = mod.compute_logprob_of_token(mod.compute_post_filter_distribution(logits, **params), token_ids)
+    assert torch.allclose(tiled.logprobs, expected.logprobs, atol=1e-5)
+    assert torch.allclose(tiled.logprobs, reference, atol=1e-3)
+
+
+_FAKE_SAMPLER_SOURCE = '''
+import torch
+
+global_server_args_dict = {"sampling_backend": "pytorch"}
+
+
+def top_k_top_p_min_p_sampling_from_probs_torch(probs, top_ks, top_ps, min_ps, need_min_p_sampling):
+    probs_sort, probs_idx = probs.sort(dim=-1, descending=True)
+    probs_sum = torch.cumsum(probs_sort, dim=-1)
+    probs_sort[torch.arange(0, probs.shape[-1], device=probs.device).view(1, -1) >= top_ks.view(-1, 1)] = 0.0
+    probs_sort[(probs_sum - probs_sort) > top_ps.view(-1, 1)] = 0.0
+    if need_min_p_sampling:
+        min_p_thresholds = probs_sort[:, 0] * min_ps
+        probs_sort[probs_sort < min_p_thresholds.view(-1, 1)] = 0.0
+    sampled_index = torch.multinomial(probs_sort, num_samples=1)
+    probs_idx = probs_idx.to(torch.int32)
+    return torch.gather(probs_idx, dim=1, index=sampled_index).view(-1)
+
+
+class Sampler:
+    def forward(self, logits, sampling_info):
+        probs = torch.softmax(logits / sampling_info.temperatures, dim=-1)
+        if global_server_args_dict["sampling_backend"] != "pytorch":
+            # stand-in for the flashinfer kernels
+            return torch.argmax(probs, dim=-1)
+        return top_k_top_p_min_p_sampling_from_probs_torch(
+            probs, sampling_info.top_ks, sampling_info.top_ps, sampling_info.min_ps, True
+        )
+'''
+
+
+def _install_fake_sampler(monkeypatch):
+    import sys
+    from types import ModuleType
+
+    fake = ModuleType("sglang.srt.layers.sampler")
+    exec(_FAKE_SAMPLER_SOURCE, fake.__dict__)
+    for name in ("sglang", "sglang.srt", "sglang.srt.layers"):
+        monkeypatch.setitem(sys.modules, name, ModuleType(name))
+    monkeypatch.setitem(sys.modules, "sglang.srt.layers.sampler", fake)
+    return fake
+
+
+def test_sampler_patch_captures_sampled_distribution(monkeypatch):
+    from types import SimpleNamespace
+
+    fake = _install_fake_sampler(monkeypatch)
+
+    mod = importlib.import_module("flash_rl.sglang_patch.sampler_patch")
+    importlib.reload(mod)
+    assert mod.patch_sglang_sampler() is True
+
+    torch.manual_seed(0)
+    logits = torch.randn(3, 16)
+    info = SimpleNamespace(
+        temperatures=torch.tensor([[1.0], [0.7], [1.5]]),
+        top_ks=torch.tensor([16, 4, 8]),
+        top_ps=torch.tensor([0.9, 1.0, 0.5]),
+        min_ps=torch.tensor([0.0, 0.05, 0.0]),
+    )
+    monkeypatch.setenv("FLASHRL_POST_FILTER_TOPN", "4")
+    out = fake.Sampler().forward(logits, info)
+
+    assert out.post_filter_logprobs_source == "captured"
+    assert mod.post_filter_path_counts == {"captured": 1, "recomputed": 0}
+    # sampled distribution: SGLang keeps a token while the mass before it is <= top_p
+    probs = torch.softmax(logits / info.temperatures, dim=-1)
+    sorted_probs, sorted_idx = probs.sort(dim=-1, descending=True)
+    ranks = torch.arange(16).view(1, -1)
+    keep = (ranks < info.top_ks.view(-1, 1)) & (sorted_probs.cumsum(-1) - sorted_probs <= info.top_ps.view(-1, 1))
+    keep &= sorted_probs >= sorted_probs[:, :1] * info.min_ps.view(-1, 1)
+    filtered = torch.zeros_like(probs).scatter(-1, sorted_idx, sorted_probs * keep)
+    filtered_logp = torch.log((filtered / filtered.sum(-1, keepdim=True)).clamp_min(1e-20))
+    expected = filtered_logp.gather(-1, out.view(-1, 1)).view(-1)
+    assert torch.allclose(out.post_filter_logprobs, expected, atol=1e-5)
+    assert torch.equal(out.post_filter_topn_ids, sorted_idx[:, :4])
+    assert torch.allclose(out.post_filter_topn_logprobs, filtered_logp.gather(-1, sorted_idx[:, :4]), atol=1e-5)
+
+
+@pytest.mark.parametrize("params", [{}, {"min_p": 0.05}, {"top_k": 6, "top_p": 0.8}, {"top_p": 0.95}])
+def test_post_filter_logprob_topn(params):
+    mod = importlib.import_module("flash_rl.sglang_patch.sampler_patch")
+    torch.manual_seed(0)
+    logits = torch.randn(5, 6000)
+    token_ids = torch.randint(0, 6000, (5,))
+
+    out = mod.compute_post_filter_logprob(logits, token_ids, top_n=8, **params)
+    assert out.topn_ids.shape == (5, 8) and out.topn_logprobs.shape == (5, 8)
+    full = torch.log(mod.compute_post_filter_distribution(logits, **params).clamp_min(1e-20))
+    expected_ids = torch.topk(logits, 8, dim=-1).indices
+    assert torch.equal(out.topn_ids, expected_ids)
+    assert torch.allclose(out.topn_logprobs, full.gather(-1, expected_ids), atol=1e-3)
+
+
+@pytest.mark.parametrize("params", [{}, {"min_p": 0.05}, {"top_k": 6, "top_p": 0.8}, {"temperature": 0.6, "top_p": 0.95}])
+def test_post_filter_logprob_diagnostics(params):
+    mod = importlib.import_module("flash_rl.sglang_patch.sampler_patch")
+    torch.manual_seed(0)
+    logits = torch.randn(5, 300) * 2
+    token_ids = torch.randint(0, 300, (5,))
+
+    out = mod.compute_post_filter_logprob(logits, token_ids, diagnostics=True, memory_budget_mb=0.01, **params)
+    assert out.entropy.dtype == torch.float16 and out.filtered_mass.dtype == torch.float16
+    probs = mod.compute_post_filter_distribution(logits, **params)
+    entropy = torch.special.entr(probs).sum(-1)
+    temperature = params.get("temperature", 1.0)
+    kept = torch.softmax(logits / temperature, dim=-1).masked_fill(probs == 0, 0.0).sum(-1)
+    assert torch.allclose(out.entropy.float(), entropy, atol=1e-2)
+    assert torch.allclose(out.filtered_mass.float(), 1 - kept, atol=1e-3)
+
+
+def test_sampling_params_skip_filters_the_batch_does_not_need():
+    from types import SimpleNamespace
+
+    mod = importlib.import_module("flash_rl.sglang_patch.sampler_patch")
+    info = SimpleNamespace(
+        temperatures=torch.ones(2, 1),
+        top_ks=torch.tensor([4, 8]),
+        top_ps=torch.ones(2),
+        min_ps=torch.zeros(2),
+        need_top_k_sampling=True,
+        need_top_p_sampling=False,
+        need_min_p_sampling=False,
+    )
+    params = mod._sampling_params(None, (torch.zeros(2, 16), info), {})
+    assert params["top_k"] is info.top_ks
+    assert params["top_p"] is None and params["min_p"] is None
+
+
+def test_sampler_patch_keeps_sglang_sampling(monkeypatch):
+    from types import SimpleNamespace
+
+    fake = _install_fake_sampler(monkeypatch)
+    reference = fake.top_k_top_p_min_p_sampling_from_probs_torch
+    mod = importlib.import_module("flash_rl.sglang_patch.sampler_patch")
+    importlib.reload(mod)
+    assert mod.patch_sglang_sampler() is True
+
+    torch.manual_seed(0)
+    logits = torch.randn(64, 100)
+    info = SimpleNamespace(
+        temperatures=torch.full((64, 1), 1.2),
+        top_ks=torch.randint(1, 100, (64,)),
+        top_ps=torch.rand(64),
+        min_ps=torch.rand(64) * 0.1,
+    )
+    probs = torch.softmax(logits / info.temperatures, dim=-1)
+    torch.manual_seed(1)
+    expected = reference(probs, info.top_ks, info.top_ps, info.min_ps, True)
+    torch.manual_seed(1)
+    out = fake.Sampler().forward(logits, info)
+    assert torch.equal(out, expected)
+    assert out.post_filter_logprobs_source == "captured"
+
+
+def test_sampler_patch_recomputes_for_other_backends(monkeypatch, caplog):
+    from types import SimpleNamespace
+
+    fake = _install_fake_sampler(monkeypatch)
+    fake.global_server_args_dict["sampling_backend"] = "flashinfer"
+    mod = importlib.import_module("flash_rl.sglang_patch.sampler_patch")
+    importlib.reload(mod)
+    assert mod.patch_sglang_sampler() is True
+
+    logits = torch.randn(2, 16)
+    info = SimpleNamespace(
+        temperatures=torch.ones(2, 1), top_ks=torch.tensor([16, 4]), top_ps=torch.ones(2), min_ps=torch.zeros(2)
+    )
+    with caplog.at_level("WARNING"):
+        out = fake.Sampler().forward(logits, info)
+    assert getattr(out, "post_filter_logprobs_source", None) != "captured"
+    assert "sampling backend flashinfer" in caplog.text
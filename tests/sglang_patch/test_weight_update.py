@@ -0,0 +1,240 @@
+import importlib
+import sys
+from types import ModuleType
+
+import pytest
+
+
+def _install_fake_model_runner(monkeypatch):
+    root = ModuleType("sglang")
+    srt = ModuleType("sglang.srt")
+    executor = ModuleType("sglang.srt.model_executor")
+    runner_mod = ModuleType("sglang.srt.model_executor.model_runner")
+
+    class FakeModel:
+        def __init__(self):
+            self.loaded = []
+
+        def load_weights(self, weights):
+            self.loaded.extend(weights)
+
+    class ModelRunner:  # noqa: N801 - mimic external class
+        tp_size = 1
+
+        def load_model(self):
+            self.model = FakeModel()
+
+    runner_mod.ModelRunner = ModelRunner
+    for name, mod in (
+        ("sglang", root),
+        ("sglang.srt", srt),
+        ("sglang.srt.model_executor", executor),
+        ("sglang.srt.model_executor.model_runner", runner_mod),
+    ):
+        monkeypatch.setitem(sys.modules, name, mod)
+    return ModelRunner
+
+
+def test_model_runner_requantizes_updates(monkeypatch):
+    ModelRunner = _install_fake_model_runner(monkeypatch)
+    mod = importlib.import_module("flash_rl.sglang_patch.weight_update")
+    importlib.reload(mod)
+
+    def fake_quantize(weights, profile):
+        for name, value in weights:
+            yield (name, value * profile.get(name, 1))
+
+    engine_args = importlib.import_module("flash_rl.sglang_patch.engine_args")
+    monkeypatch.setattr(engine_args, "get_active_flashrl_config", lambda tp_size=1: {"fn": "int8"})
+    monkeypatch.setattr(mod, "get_flashrl_quantize_fn", lambda config: (fake_quantize, {"w": 10}))
+
+    assert mod.patch_sglang_model_runner() is True
+    runner = ModelRunner()
+    runner.load_model()
+    runner.model.load_weights(iter([("w", 2), ("b", 3)]))
+    assert runner.model.loaded == [("w", 20), ("b", 3)]
+    assert runner.flashrl_quant_fn == "int8"
+
+
+def test_model_runner_passthrough_for_bf16(monkeypatch):
+    monkeypatch.setenv("FLASHRL_CONFIG", "bf16")
+    ModelRunner = _install_fake_model_runner(monkeypatch)
+    mod = importlib.import_module("flash_rl.sglang_patch.weight_update")
+    importlib.reload(mod)
+
+    assert mod.patch_sglang_model_runner() is True
+    runner = ModelRunner()
+    runner.load_model()
+    assert not hasattr(runner.model, "beforeflashrl_load_weights")
+
+
+def test_update_weights_from_tensor_in_place(monkeypatch):
+    torch = pytest.importorskip("torch")
+    root = ModuleType("sglang")
+    srt = ModuleType("sglang.srt")
+    executor = ModuleType("sglang.srt.model_executor")
+    runner_mod = ModuleType("sglang.srt.model_executor.model_runner")
+
+    def weight_loader(param, loaded_weight):
+        param.data.copy_(loaded_weight)
+
+    class Linear(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.weight = torch.nn.Parameter(torch.zeros(4, 3), requires_grad=False)
+            self.weight.weight_loader = weight_loader
+            self.workspace = torch.zeros(2)
+
+    class Model(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.proj = Linear()
+
+        def load_weights(self, weights):
+            params = dict(self.named_parameters())
+            for name, w in weights:
+                params[name].weight_loader(params[name], w)
+                self.proj.workspace = None
+
+    class ModelRunner:  # noqa: N801 - mimic external class
+        def __init__(self):
+            self.model = Model()
+
+        def update_weights_from_tensor(self, named_tensors, load_format=None):
+            self.model.load_weights(named_tensors)
+            return True, "Success"
+
+    runner_mod.ModelRunner = ModelRunner
+    for name, m in (
+        ("sglang", root),
+        ("sglang.srt", srt),
+        ("sglang.srt.model_executor", executor),
+        ("sglang.srt.model_executor.model_runner", runner_mod),
+    ):
+        monkeypatch.setitem(sys.modules, name, m)
+    mod = importlib.import_module("flash_rl.sglang_patch.weight_update")
+    importlib.reload(mod)
+    assert mod.patch_sglang_weight_update_entry_points() is True
+
+    runner = ModelRunner()
+    runner.flashrl_module_attribute_to_preserve = ["workspace"]
+    mod.record_loading_state(runner.model)
+    # post-processing: transposed weight, loader attribute dropped
+    runner.model.proj.weight = torch.nn.Parameter(runner.model.proj.weight.data.t(), requires_grad=False)
+    workspace = runner.model.proj.workspace
+    ptr = runner.model.proj.weight.data_ptr()
+
+    new = torch.arange(12, dtype=torch.float32).view(4, 3)
+    assert runner.update_weights_from_tensor([("proj.weight", new)]) == (True, "Success")
+    assert runner.model.proj.weight.shape == (3, 4)
+    assert runner.model.proj.weight.data_ptr() == ptr
+    assert torch.equal(runner.model.proj.weight, new.t())
+    assert runner.model.proj.workspace is workspace
+
+
+def _fp8_linear(scale_name, scale_shape, n=256, k=192):
+    torch = pytest.importorskip("torch")
+    model = torch.nn.Module()
+    model.proj = torch.nn.Module()
+    model.proj.weight = torch.nn.Parameter(torch.zeros(n, k).to(torch.float8_e4m3fn), requires_grad=False)
+    if scale_name is not None:
+        setattr(model.proj, scale_name, torch.nn.Parameter(torch.ones(scale_shape), requires_grad=False))
+    return model
+
+
+@pytest.mark.parametrize("fn, scale_name, scale_shape", [
+    ("fp8_channel", "weight_scale", (256, 1)),
+    ("fp8_tensor", "weight_scale", (256, 1)),
+    ("fp8_block", "weight_scale_inv", (2, 2)),
+])
+def test_fp8_scale_layout_matches_fn(fn, scale_name, scale_shape):
+    mod = importlib.import_module("flash_rl.sglang_patch.weight_update")
+
+    model = _fp8_linear(scale_name, scale_shape)
+    mod.record_loading_state(model)
+    mod.check_fp8_scale_layout(model, fn)
+
+    # a per-tensor checkpoint (one scale per fused shard) cannot take per-row or block scales
+    per_tensor = _fp8_linear("weight_scale", (3,)) if scale_name == "weight_scale" else _fp8_linear(scale_name, (256, 1))
+    mod.record_loading_state(per_tensor)
+    with pytest.raises(ValueError, match="scale layout matches"):
+        mod.check_fp8_scale_layout(per_tensor, fn)
+
+
+def test_fp8_requantization_rejects_a_bf16_checkpoint(monkeypatch):
+    torch = pytest.importorskip("torch")
+    ModelRunner = _install_fake_model_runner(monkeypatch)
+    mod = importlib.import_module("flash_rl.sglang_patch.weight_update")
+    importlib.reload(mod)
+
+    engine_args = importlib.import_module("flash_rl.sglang_patch.engine_args")
+    monkeypatch.setattr(engine_args, "get_active_flashrl_config", lambda tp_size=1: {"fn": "fp8_channel"})
+    monkeypatch.setattr(mod, "get_flashrl_quantize_fn", lambda config: (lambda w, p: w, []))
+    original_load_model = ModelRunner.load_model
+
+    def load_bf16_model(self):
+        original_load_model(self)
+        # SGLang online fp8: bf16 weights at load, no scale params
+        self.model = torch.nn.Linear(4, 4, bias=False).to(torch.bfloat16)
+
+    monkeypatch.setattr(ModelRunner, "load_model", load_bf16_model)
+    assert mod.patch_sglang_model_runner() is True
+    with pytest.raises(ValueError, match="pre-quantized fp8 checkpoint"):
+        ModelRunner().load_model()
+
+
+def test_update_weights_from_distributed_delegates_to_sglang(monkeypatch):
+    torch = pytest.importorskip("torch")
+    ModelRunner = _install_fake_model_runner(monkeypatch)
+
+    def weight_loader(param, loaded_weight):
+        param.data.copy_(loaded_weight)
+
+    class Model(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.weight = torch.nn.Parameter(torch.zeros(4, 3), requires_grad=False)
+            self.weight.weight_loader = weight_loader
+
+        def load_weights(self, weights):
+            params = dict(self.named_parameters())
+            for name, w in weights:
+                params[name].weight_loader(params[name], w)
+
+    def update_weights_from_distributed(self, names, dtypes, shapes, group_name):
+        # upstream: receive every tensor, then load; failures become (False, message)
+        try:
+            self.model.load_weights([(n, self.broadcast[n]) for n in names])
+            return True, "Succeeded to update parameter online."
+        except Exception as e:
+            return False, f"Failed to update parameter online: {e}."
+
+    ModelRunner.update_weights_from_distributed = update_weights_from_distributed
+    mod = importlib.import_module("flash_rl.sglang_patch.weight_update")
+    importlib.reload(mod)
+    assert mod.patch_sglang_weight_update_entry_points() is True
+
+    runner = ModelRunner()
+    runner.model = Model()
+    mod.record_loading_state(runner.model)
+    runner.model.weight = torch.nn.Parameter(runner.model.weight.data.t(), requires_grad=False)
+    ptr = runner.model.weight.data_ptr()
+
+    new = torch.arange(12, dtype=torch.float32).view(4, 3)
+    runner.broadcast = {"weight": new}
+    ok, message = runner.update_weights_from_distributed(["weight"], ["float32"], [(4, 3)], "g")
+    assert ok and message == "Succeeded to update parameter online."
+    assert runner.model.weight.data_ptr() == ptr
+    assert torch.equal(runner.model.weight, new.t())
+
+    runner.broadcast = {"weight": torch.zeros(5, 5)}
+    ok, message = runner.update_weights_from_distributed(["weight"], ["float32"], [(5, 5)], "g")
+    assert not ok and message.startswith("Failed to update parameter online")
+    # the post-processed layout is restored after a failed update
+    assert runner.model.weight.shape == (3, 4) and runner.model.weight.data_ptr() == ptr
+
+
+def test_w4a16_is_rejected():
+    mod = importlib.import_module("flash_rl.sglang_patch.weight_update")
+    with pytest.raises(ValueError, match="w4a16 is not supported with SGLang"):
+        mod.get_flashrl_quantize_fn({"fn": "w4a16"})
@@ -0,0 +1,87 @@
+import pytest
+
+torch = None
+try:
+    import torch  # type: ignore
+except Exception:  # pragma: no cover - allow environments without torch
+    pass
+
+
+pytestmark = pytest.mark.skipif(
+    torch is None, reason="torch is required for adapter tests"
+)
+
+
+def test_llama_adapter_index():
+    from flash_rl.adapters import LLAMA_ADAPTER as adapter
+
+    assert adapter.match('model.layers.3.self_attn.q_proj.weight') == ('model.layers.3.', 'self_attn.q_proj.weight')
+    assert adapter.match('model.layers.3.post_attention_layernorm.weight') == ('model.layers.3.', 'post_attention_layernorm.weight')
+    assert adapter.match('model.layers.3.self_attn.q_proj.bias') is None
+    # suffixes only match whole dotted components
+    assert adapter.match('model.layers.3.xself_attn.q_proj.weight') is None
+    assert adapter.excluded('model.embed_tokens.weight') and not adapter.excluded('model.layers.0.mlp.up_proj.weight')
+    assert adapter.fused_linear_of('model.layers.0.mlp.up_proj.weight') == 'model.layers.0.mlp.gate_up_proj'
+    assert adapter.fused_linear_of('model.layers.0.self_attn.o_proj.weight') == 'model.layers.0.self_attn.o_proj'
+    assert adapter.calibration_inputs == {
+        'self_attn.q_proj.weight': 'input_layernorm.weight',
+        'mlp.gate_proj.weight': 'post_attention_layernorm.weight',
+        'mlp.down_proj.weight': 'mlp.up_proj.weight',
+    }
+
+
+def test_adapter_for_resolves_by_model_type_and_names():
+    from flash_rl.adapters import LLAMA_ADAPTER, PHI3_ADAPTER, adapter_for, get_adapter
+
+    assert get_adapter('qwen2') is LLAMA_ADAPTER
+    assert adapter_for([], 'phi3') is PHI3_ADAPTER
+    phi3 = [f'model.layers.0.{n}.weight' for n in ('input_layernorm', 'self_attn.qkv_proj', 'self_attn.o_proj')]
+    assert adapter_for(phi3) is PHI3_ADAPTER
+    assert adapter_for(['model.layers.0.self_attn.q_proj.weight', 'model.layers.0.self_attn.o_proj.weight']) is LLAMA_ADAPTER
+    moe = ['model.layers.0.self_attn.q_proj.weight'] + [f'model.layers.0.mlp.experts.{e}.up_proj.weight' for e in range(4)]
+    assert adapter_for(moe) is get_adapter('qwen3_moe')
+    assert get_adapter('qwen3_moe').expert_match(moe[2]) == ('model.layers.0.mlp.experts.up_proj.weight', 1)
+    with pytest.raises(ValueError):
+        get_adapter('unknown')
+    with pytest.raises(ValueError):
+        adapter_for(['transformer.h.0.attn.c_attn.weight'])
+
+
+def test_registered_adapter_drives_int8_profiling_and_pruning(monkeypatch):
+    from flash_rl import adapters
+    from flash_rl.adapters import ArchitectureAdapter, register_adapter
+    from flash_rl.flash_quantization import build_int8_profile, flash_quantize_with_prune
+
+    monkeypatch.setattr(adapters, '_adapters', dict(adapters._adapters))
+    register_adapter(ArchitectureAdapter(
+        name='toy',
+        model_types=['toy'],
+        input_linears={'ln_1.weight': ['attn.c_attn.weight']},
+        plain_linears=['attn.c_proj.weight'],
+        exclude=['bias'],
+    ))
+    torch.manual_seed(0)
+    param = {
+        'h.0.ln_1.weight': torch.rand(16) + 0.5,
+        'h.0.attn.c_attn.weight': torch.randn(48, 16),
+        'h.0.attn.c_proj.weight': torch.randn(16, 16),
+        'h.0.attn.c_proj.bias': torch.randn(16),
+    }
+    s = torch.rand(16) + 0.5
+    qparam = {'h.0.ln_1.weight': param['h.0.ln_1.weight'] / s}
+    for name, smooth in (('h.0.attn.c_attn.weight', s), ('h.0.attn.c_proj.weight', torch.ones(16))):
+        w = param[name] * smooth
+        qparam[name + '_scale'] = w.abs().amax(dim=1) / 127.
+        qparam[name] = torch.round(w / qparam[name + '_scale'].view(-1, 1)).to(torch.int8)
+
+    profile = build_int8_profile(param, qparam)
+    assert set(profile) == {'h.0.ln_1.weight', 'h.0.attn.c_attn.weight', 'h.0.attn.c_proj.weight'}
+    assert torch.allclose(profile['h.0.attn.c_attn.weight']['input_scale'], s.view(1, -1))
+    for name in ('h.0.attn.c_attn.weight', 'h.0.attn.c_proj.weight'):
+        assert profile[name]['error'] < 1e-3
+
+    # channels no linear reads any more are pruned from the layernorm
+    param['h.0.attn.c_attn.weight'][:, 3] = 0
+    pruned = dict(flash_quantize_with_prune(param.items(), profile))
+    assert pruned['h.0.ln_1.weight'][3] == 0
+    assert bool((pruned['h.0.ln_1.weight'][4:] != 0).all())
@@ -0,0 +1,131 @@
+import json
+
+import pytest
+
+torch = None
+try:
+    import torch  # type: ignore
+except Exception:  # pragma: no cover - allow environments without torch
+    pass
+
+
+pytestmark = pytest.mark.skipif(
+    torch is None, reason="torch is required for benchmark tests"
+)
+
+TINY_SPEC = {
+    'hidden_size': 64,
+    'intermediate_size': 128,
+    'num_attention_heads': 4,
+    'num_key_value_heads': 2,
+    'vocab_size': 1000,
+}
+
+
+def test_suite_covers_every_path_and_writes_json(tmp_path):
+    from flash_rl.bench import run_suite
+    from flash_rl.flash_quantization import quant_fn_map
+
+    output = tmp_path / "bench.json"
+    results = run_suite(
+        specs={'tiny': TINY_SPEC}, vocab_sizes=(1000,), batch_size=4, warmup=0, repeats=2, output=str(output)
+    )
+
+    assert json.loads(output.read_text()) == results
+    benches = [r['bench'] for r in results['results']]
+    assert benches.count('quantize') == len(quant_fn_map)
+    for bench in ('profiling_int8', 'profile_save', 'profile_load',
+                  'apply_top_k_top_p', 'post_filter_distribution', 'post_filter_logprob'):
+        assert bench in benches
+    for record in results['results']:
+        assert record['latency_ms']['p50'] > 0
+
+
+def test_build_int8_profile_matches_linear_quantize_layout():
+    from flash_rl.bench.shapes import synthetic_layers, synthetic_w8a8_params
+    from flash_rl.flash_quantization import build_int8_profile, flash_quantize
+
+    param = {k: v.float() for k, v in synthetic_layers(TINY_SPEC).items()}
+    profile = build_int8_profile(param, synthetic_w8a8_params(param))
+
+    assert set(profile) == set(param)
+    quantized = dict(flash_quantize(iter(param.items()), profile))
+    for name, q in quantized.items():
+        assert q.dtype == (torch.float32 if 'layernorm' in name else torch.int8)
+        assert q.shape == param[name].shape
+
+
+@pytest.mark.parametrize("fn", ["int8", "fp8_channel"])
+def test_mock_vllm_weight_sync_is_in_place(fn):
+    from flash_rl.bench.mock_vllm import build_mock_model
+    from flash_rl.bench.shapes import synthetic_layers
+    from flash_rl.flash_quantization import get_quantize_fn
+
+    model, profile = build_mock_model(TINY_SPEC, num_layers=2, fn=fn, module_attribute_to_preserve=['workspace'])
+    storages = {n: (p.data_ptr(), p.shape, p.stride()) for n, p in model.named_parameters()}
+    workspaces = {n: m.workspace for n, m in model.named_modules() if hasattr(m, 'workspace')}
+
+    weights = synthetic_layers(TINY_SPEC, num_layers=2, seed=1)
+    updated = model.load_weights(iter(weights.items()))
+
+    assert {n: (p.data_ptr(), p.shape, p.stride()) for n, p in model.named_parameters()} == storages
+    assert all(m.workspace is workspaces[n] for n, m in model.named_modules() if hasattr(m, 'workspace'))
+    assert 'model.layers.1.self_attn.qkv_proj.weight' in updated
+
+    quantized = dict(get_quantize_fn(fn)(iter(weights.items()), profile))
+    params = dict(model.named_parameters())
+    prefix = 'model.layers.1.'
+    qkv = torch.cat([quantized[prefix + f'self_attn.{x}_proj.weight'] for x in 'qkv'])
+    # post-processed layout: transposed weights
+    assert torch.equal(params[prefix + 'self_attn.qkv_proj.weight'].t().float(), qkv.float())
+    assert torch.equal(params[prefix + 'input_layernorm.weight'], quantized[prefix + 'input_layernorm.weight'])
+
+
+def test_weight_sync_bench_reports_allocations():
+    from flash_rl.bench.suite import bench_weight_sync
+
+    records = bench_weight_sync('tiny', TINY_SPEC, num_layers=2, warmup=0, repeats=1)
+    assert [r['params']['fn'] for r in records] == ['int8', 'fp8_channel']
+    for record in records:
+        assert record['allocations'] > 0 and record['allocated_mb'] > 0
+
+
+def test_bench_cli_with_model_config_and_baseline(tmp_path, monkeypatch):
+    import sys
+
+    from flash_rl import commands
+
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps(dict(TINY_SPEC, num_hidden_layers=2, model_type="qwen2")))
+    output = tmp_path / "bench.json"
+    argv = ["flashrl", "bench", "-m", str(tmp_path), "--benches", "quantize", "sampler",
+            "--batch-size", "4", "--warmup", "0", "--repeats", "1", "-o", str(output)]
+    monkeypatch.setattr(sys, "argv", argv)
+    commands.run()
+
+    results = json.loads(output.read_text())
+    assert {r['params'].get('vocab_size') for r in results['results'] if r['bench'] == 'post_filter_logprob'} == {1000}
+    assert all(r['params'].get('model', str(tmp_path)) == str(tmp_path) for r in results['results'])
+
+    # a baseline 100x faster than this run is a regression
+    baseline = tmp_path / "baseline.json"
+    for record in results['results']:
+        record['latency_ms']['p50'] /= 100
+    baseline.write_text(json.dumps(results))
+    monkeypatch.setattr(sys, "argv", argv + ["--baseline", str(baseline)])
+    with pytest.raises(SystemExit) as exc:
+        commands.run()
+    assert exc.value.code == 1
+
+
+def test_compare_results_flags_slowdowns_and_allocation_growth():
+    from flash_rl.bench import compare_results
+
+    def run(p50, allocations):
+        return {'results': [{'bench': 'weight_sync', 'params': {'fn': 'int8'},
+                             'latency_ms': {'p50': p50}, 'allocations': allocations}]}
+
+    assert not compare_results(run(1.05, 10), run(1.0, 10))[0]['regressed']
+    assert compare_results(run(1.5, 10), run(1.0, 10))[0]['regressed']
+    rows = compare_results(run(1.0, 20), run(1.0, 10))
+    assert rows[0]['metrics']['allocations']['regressed'] and not rows[0]['metrics']['latency_p50_ms']['regressed']
@@ -0,0 +1,472 @@
+import pytest
+
+torch = None
+try:
+    import torch  # type: ignore
+except Exception:  # pragma: no cover - allow environments without torch
+    pass
+
+
+pytestmark = pytest.mark.skipif(
+    torch is None, reason="torch is required for quantization tests"
+)
+
+TINY_SPEC = {
+    'hidden_size': 64,
+    'intermediate_size': 128,
+    'num_attention_heads': 4,
+    'num_key_value_heads': 2,
+    'vocab_size': 1000,
+}
+
+
+def test_foreach_fp8_quant_matches_per_tensor_reference():
+    from flash_rl.flash_quantization import dynamic_scaled_fp8_quant, foreach_scaled_fp8_quant
+
+    torch.manual_seed(0)
+    inputs = [torch.randn(32, 16, dtype=torch.bfloat16) * s for s in (0.01, 1.0, 30.0)] + [torch.zeros(8, 16)]
+    outputs = [torch.empty(x.shape, dtype=torch.float8_e4m3fn) for x in inputs]
+    # a non-contiguous output, as the transposed weights of the vllm fast path
+    outputs[1] = torch.empty(16, 32, dtype=torch.float8_e4m3fn).t()
+    scales = [torch.empty(()), torch.empty(1), torch.empty(32, 1), torch.empty(1)]
+    foreach_scaled_fp8_quant(outputs, inputs, scales)
+
+    for output, x, scale in zip(outputs, inputs, scales):
+        ref_output, ref_scale = torch.empty(x.shape, dtype=torch.float8_e4m3fn), torch.empty(1)
+        dynamic_scaled_fp8_quant(ref_output, x, ref_scale)
+        assert torch.equal(output.float(), ref_output.float())
+        assert bool((scale == ref_scale).all())
+
+
+def test_foreach_fp8_quant_uses_the_vllm_kernel_when_loaded(monkeypatch):
+    import flash_rl.flash_quantization as fq
+
+    def kernel(output, x, scale):
+        # vllm's dynamic_scaled_fp8_quant: atomic max into the scale, contiguous output
+        assert output.is_contiguous() and x.is_contiguous()
+        scale.copy_(torch.maximum(scale, (x.abs().amax().float() / fq.FP8_E4M3_MAX).clamp_min(1e-12)))
+        output.copy_((x.float() / scale).clamp(-fq.FP8_E4M3_MAX, fq.FP8_E4M3_MAX))
+
+    torch.manual_seed(0)
+    inputs = [torch.randn(32, 16, dtype=torch.bfloat16) * s for s in (0.01, 30.0)]
+    expected = []
+    for x in inputs:
+        ref_output, ref_scale = torch.empty(x.shape, dtype=torch.float8_e4m3fn), torch.empty(1)
+        fq.dynamic_scaled_fp8_quant(ref_output, x, ref_scale)
+        expected.append((ref_output, ref_scale))
+
+    monkeypatch.setattr(fq, '_vllm_op', lambda name: kernel if name == 'dynamic_scaled_fp8_quant' else None)
+    monkeypatch.setattr(torch, '_foreach_norm', None)
+    outputs = [torch.empty(32, 16, dtype=torch.float8_e4m3fn), torch.empty(16, 32, dtype=torch.float8_e4m3fn).t()]
+    scales = [torch.full((32, 1), 7.0), torch.full((1,), 7.0)]
+    fq.foreach_scaled_fp8_quant(outputs, inputs, scales)
+    for output, scale, (ref_output, ref_scale) in zip(outputs, scales, expected):
+        assert torch.equal(output.float(), ref_output.float())
+        assert bool((scale == ref_scale).all())
+
+
+def test_fp8_tensor_quantize_groups_by_layer():
+    from flash_rl.bench.shapes import synthetic_fp8_profile, synthetic_layers
+    from flash_rl.flash_quantization import Fp8QuantGroup, dynamic_scaled_fp8_quant, flash_quantize_fp8_tensor
+
+    weights = synthetic_layers(TINY_SPEC, num_layers=3)
+    profile = synthetic_fp8_profile(weights)
+    quantized = dict(flash_quantize_fp8_tensor(iter(weights.items()), profile))
+
+    assert set(quantized) == set(weights) | {name + '_scale' for name in profile}
+    for name in profile:
+        weight, scale = torch.empty(weights[name].shape, dtype=torch.float8_e4m3fn), torch.empty(1)
+        dynamic_scaled_fp8_quant(weight, weights[name], scale)
+        assert torch.equal(quantized[name].float(), weight.float())
+        # per-row layout of the per-tensor scale
+        assert torch.equal(quantized[name + '_scale'], scale.expand(weights[name].shape[0], 1))
+
+    flushes = []
+    group = Fp8QuantGroup()
+    original_flush = group.flush
+    group.flush = lambda: flushes.append(len(group.pending)) or original_flush()
+    for name in profile:
+        w = weights[name]
+        group.add(name, torch.empty(w.shape, dtype=torch.float8_e4m3fn), w, torch.empty(1))
+    group.flush()
+    # one multi-tensor group per decoder layer
+    assert flushes == [7, 7, 7]
+
+
+def _block_quant_reference(w, block=128):
+    n, k = w.shape
+    rows, cols = -(-n // block), -(-k // block)
+    output = torch.empty(w.shape, dtype=torch.float8_e4m3fn)
+    scale = torch.empty(rows, cols)
+    for i in range(rows):
+        for j in range(cols):
+            tile = w[i * block:(i + 1) * block, j * block:(j + 1) * block].float()
+            scale[i, j] = (tile.abs().max() / 448.0).clamp_min(1e-12)
+            output[i * block:(i + 1) * block, j * block:(j + 1) * block] = (tile / scale[i, j]).clamp(-448.0, 448.0)
+    return output, scale
+
+
+@pytest.mark.parametrize("shape", [(256, 384), (200, 130)])
+def test_fp8_block_quantize_matches_reference(shape):
+    from flash_rl.flash_quantization import fp8_quantize_block
+
+    torch.manual_seed(0)
+    w = (torch.randn(shape) * torch.logspace(-3, 1, shape[0]).view(-1, 1)).to(torch.bfloat16)
+    (name, output), (scale_name, scale) = fp8_quantize_block('layer.weight', w, ['layer.weight'])
+
+    ref_output, ref_scale = _block_quant_reference(w)
+    assert scale_name == 'layer.weight_scale_inv'
+    assert scale.shape == (-(-shape[0] // 128), -(-shape[1] // 128))
+    assert torch.equal(scale, ref_scale)
+    assert torch.equal(output.float(), ref_output.float())
+    block_scale = scale.repeat_interleave(128, 0)[:shape[0]].repeat_interleave(128, 1)[:, :shape[1]]
+    # e4m3: 3 mantissa bits, subnormal step of 2^-9 in scaled units
+    error = (output.float() * block_scale - w.float()).abs()
+    assert bool((error <= 0.0625 * w.float().abs() + block_scale * 2**-9).all())
+
+
+def test_fp8_block_weight_sync_on_mock_model():
+    from flash_rl.bench.mock_vllm import build_mock_model
+    from flash_rl.bench.shapes import synthetic_layers
+    from flash_rl.flash_quantization import fp8_quantize_block
+
+    spec = dict(TINY_SPEC, hidden_size=256, intermediate_size=512)
+    model, _ = build_mock_model(spec, num_layers=1, fn='fp8_block', module_attribute_to_preserve=['workspace'])
+    storages = {n: p.data_ptr() for n, p in model.named_parameters()}
+    weights = synthetic_layers(spec, seed=1)
+    model.load_weights(iter(weights.items()))
+
+    params = dict(model.named_parameters())
+    assert {n: p.data_ptr() for n, p in params.items()} == storages
+    prefix = 'model.layers.0.mlp.'
+    quantized = [fp8_quantize_block(n, weights[prefix + n], None) for n in ('gate_proj.weight', 'up_proj.weight')]
+    assert torch.equal(params[prefix + 'gate_up_proj.weight'].float(), torch.cat([q[0][1].float() for q in quantized]))
+    assert torch.equal(params[prefix + 'gate_up_proj.weight_scale_inv'], torch.cat([q[1][1] for q in quantized]))
+
+
+def _dequantize_pack_quantized(packed, scale, group_size):
+    from flash_rl.flash_quantization import unpack_int4
+
+    q = unpack_int4(packed, dim=1).float() - 8
+    return q * scale.float().repeat_interleave(group_size, dim=1)
+
+
+def test_int4_pack_unpack_roundtrip():
+    from flash_rl.flash_quantization import pack_int4, unpack_int4
+
+    values = torch.randint(0, 16, (6, 40))
+    for dim in (0, 1):
+        source = values if dim == 1 else values.t()
+        packed = pack_int4(source, dim=dim)
+        assert packed.dtype == torch.int32 and packed.shape[dim] == 5
+        assert torch.equal(unpack_int4(packed, dim=dim).long(), source)
+    # the i-th value of a word sits at bits 4i, as in compressed-tensors `pack_to_int32`
+    assert int(pack_int4(torch.arange(8).view(1, 8))[0, 0]) == 0x76543210
+
+
+@pytest.mark.parametrize("fmt", ["pack_quantized", "gptq"])
+def test_w4a16_quantize_layouts(fmt):
+    from flash_rl.flash_quantization import flash_quantize_w4a16, unpack_int4
+
+    torch.manual_seed(0)
+    w = (torch.randn(48, 256) * 0.02).to(torch.bfloat16)
+    profile = {'layer.weight': {'group_size': 64, 'format': fmt, 'num_bits': 4}}
+    out = dict(flash_quantize_w4a16(iter([('layer.weight', w), ('norm.weight', w[0])]), profile))
+    assert torch.equal(out['norm.weight'], w[0])
+
+    if fmt == 'pack_quantized':
+        assert set(out) == {'layer.weight_packed', 'layer.weight_scale', 'layer.weight_shape', 'norm.weight'}
+        assert out['layer.weight_packed'].shape == (48, 32) and out['layer.weight_scale'].shape == (48, 4)
+        assert out['layer.weight_shape'].tolist() == [48, 256]
+        dequantized = _dequantize_pack_quantized(out['layer.weight_packed'], out['layer.weight_scale'], 64)
+    else:
+        assert out['layer.qweight'].shape == (32, 48) and out['layer.scales'].shape == (4, 48)
+        assert bool((unpack_int4(out['layer.qzeros'], dim=1) == 7).all())
+        assert torch.equal(out['layer.g_idx'], torch.arange(256, dtype=torch.int32) // 64)
+        q = unpack_int4(out['layer.qweight'], dim=0).float() - 8
+        dequantized = (q * out['layer.scales'].float().repeat_interleave(64, dim=0)).t()
+
+    # round to nearest: within half a quantization step of the weight (plus the bf16 rounding of the scale)
+    step = w.float().view(48, 4, 64).abs().amax(-1).repeat_interleave(64, dim=1) / 7.5
+    assert bool(((dequantized - w.float()).abs() <= step * 0.53).all())
+
+
+def test_build_w4a16_profile_from_checkpoint_metadata():
+    from flash_rl.flash_quantization import build_w4a16_profile
+
+    names = ['model.layers.0.self_attn.q_proj.weight_packed', 'model.layers.0.self_attn.q_proj.weight_scale',
+             'model.layers.0.input_layernorm.weight', 'lm_head.weight']
+    config = {
+        'quant_method': 'compressed-tensors', 'format': 'pack-quantized',
+        'config_groups': {'group_0': {'weights': {'num_bits': 4, 'symmetric': True, 'group_size': 128, 'type': 'int'}}},
+    }
+    assert build_w4a16_profile(names, config) == {
+        'model.layers.0.self_attn.q_proj.weight': {'group_size': 128, 'format': 'pack_quantized', 'num_bits': 4},
+    }
+    gptq = {'quant_method': 'gptq', 'bits': 4, 'sym': True, 'group_size': 32, 'desc_act': False}
+    assert build_w4a16_profile(['model.layers.0.mlp.down_proj.qweight'], gptq) == {
+        'model.layers.0.mlp.down_proj.weight': {'group_size': 32, 'format': 'gptq', 'num_bits': 4},
+    }
+    with pytest.raises(ValueError):
+        build_w4a16_profile(names, {'quant_method': 'awq', 'w_bit': 4})
+
+
+def test_w4a16_weight_sync_on_mock_model():
+    from flash_rl.bench.mock_vllm import build_mock_model
+    from flash_rl.bench.shapes import synthetic_layers
+
+    model, profile = build_mock_model(TINY_SPEC, num_layers=2, fn='w4a16', module_attribute_to_preserve=['workspace'])
+    storages = {n: p.data_ptr() for n, p in model.named_parameters()}
+    weights = synthetic_layers(TINY_SPEC, num_layers=2, seed=1)
+    model.load_weights(iter(weights.items()))
+
+    params = dict(model.named_parameters())
+    assert {n: p.data_ptr() for n, p in params.items()} == storages
+    prefix = 'model.layers.1.self_attn.'
+    group_size = profile[prefix + 'q_proj.weight']['group_size']
+    # repacked (transposed) layout after processing
+    packed = params[prefix + 'qkv_proj.weight_packed'].t()
+    dequantized = _dequantize_pack_quantized(packed, params[prefix + 'qkv_proj.weight_scale'], group_size)
+    expected = torch.cat([weights[prefix + f'{x}_proj.weight'] for x in 'qkv']).float()
+    assert torch.allclose(dequantized, expected, atol=float(expected.abs().max()) / 7.5)
+
+
+def _tiny_causal_lm():
+    transformers = pytest.importorskip("transformers")
+    config = transformers.Qwen2Config(
+        hidden_size=64, intermediate_size=128, num_attention_heads=4, num_key_value_heads=2,
+        num_hidden_layers=2, vocab_size=32, max_position_embeddings=64,
+    )
+    torch.manual_seed(0)
+    return transformers.Qwen2ForCausalLM(config).eval()
+
+
+def test_collect_activation_scales_ignores_padding():
+    from flash_rl.flash_quantization import collect_activation_scales
+
+    model = _tiny_causal_lm()
+    short, long = torch.randint(0, 32, (1, 5)), torch.randint(0, 32, (1, 8))
+    padded = {
+        'input_ids': torch.cat([torch.cat([short, torch.zeros(1, 3, dtype=torch.long)], dim=1), long]),
+        'attention_mask': torch.tensor([[1] * 5 + [0] * 3, [1] * 8]),
+    }
+    batched = collect_activation_scales(model, [padded])
+    streamed = collect_activation_scales(model, [{'input_ids': short}, {'input_ids': long}])
+
+    assert len(batched) == 3 * 2
+    assert batched['model.layers.1.mlp.down_proj.weight'].shape == (128,)
+    for name, scale in streamed.items():
+        assert torch.allclose(batched[name], scale, rtol=1e-4, atol=1e-5)
+
+
+def test_smoothquant_calibration_matches_checkpoint_profiling():
+    from flash_rl.flash_quantization import build_int8_profile, build_smoothquant_int8, collect_activation_scales
+
+    model = _tiny_causal_lm()
+    act_scales = collect_activation_scales(model, [{'input_ids': torch.randint(0, 32, (4, 16))}])
+    param = {k: v.detach() for k, v in model.named_parameters()}
+    profile, qparam = build_smoothquant_int8(param, act_scales, alpha=0.5)
+
+    assert len(profile) == 2 * 9
+    assert qparam['model.layers.0.self_attn.q_proj.weight'].dtype == torch.int8
+    # profiling the written checkpoint the usual way recovers the calibrated profile
+    recovered = build_int8_profile(param, qparam)
+    assert set(recovered) == set(profile)
+    for name, entry in profile.items():
+        for key in ('input_scale', 'output_scale'):
+            expected, actual = torch.as_tensor(entry[key]).float(), torch.as_tensor(recovered[name][key]).float()
+            assert torch.allclose(actual.expand_as(expected), expected, rtol=0.05), (name, key)
+
+
+def test_profile_calibrate_writes_profile_and_w8a8_checkpoint(tmp_path, monkeypatch):
+    transformers = pytest.importorskip("transformers")
+    tokenizers = pytest.importorskip("tokenizers")
+    from safetensors.torch import load_file
+
+    import flash_rl.flash_quantization as fq
+    from flash_rl.flash_quantization import flash_quantize, profiling_int8_calibrate
+
+    words = ['[UNK]', '[PAD]'] + [f'w{i}' for i in range(30)]
+    backend = tokenizers.Tokenizer(tokenizers.models.WordLevel({w: i for i, w in enumerate(words)}, unk_token='[UNK]'))
+    backend.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    tokenizer = transformers.PreTrainedTokenizerFast(tokenizer_object=backend, unk_token='[UNK]', pad_token='[PAD]')
+    model = _tiny_causal_lm()
+    model.save_pretrained(tmp_path / "model")
+    tokenizer.save_pretrained(tmp_path / "model")
+    # the saved config names a qwen2 model, which would make AutoTokenizer swap in the qwen2 tokenizer class
+    monkeypatch.setattr(fq.AutoTokenizer, "from_pretrained", lambda *args, **kwargs: tokenizer)
+    dataset = tmp_path / "calibration.txt"
+    dataset.write_text('\n'.join(' '.join(f'w{(i * j) % 30}' for j in range(3 + i)) for i in range(10)))
+
+    profiling_int8_calibrate(
+        str(tmp_path / "model"), str(dataset), str(tmp_path / "w8a8"), str(tmp_path / "profile.pt"), batch_size=4,
+    )
+
+    profile = torch.load(tmp_path / "profile.pt")
+    checkpoint = load_file(tmp_path / "w8a8" / "model.safetensors")
+    config = transformers.AutoConfig.from_pretrained(tmp_path / "w8a8")
+    assert config.quantization_config['quant_method'] == 'compressed-tensors'
+    assert checkpoint['model.layers.0.mlp.up_proj.weight'].dtype == torch.int8
+    assert checkpoint['model.layers.0.mlp.up_proj.weight_scale'].shape == (128, 1)
+    # online re-quantization of the original weights lands on the checkpoint
+    param = {k: v.detach() for k, v in model.named_parameters()}
+    for name, q in flash_quantize(iter(param.items()), profile):
+        if name in profile and profile[name]['type'] == torch.int8:
+            assert (q.int() - checkpoint[name].int()).abs().max() <= 1
+
+
+def _calibrated_int8(model):
+    from flash_rl.flash_quantization import build_smoothquant_int8, collect_activation_scales
+
+    act_scales = collect_activation_scales(model, [{'input_ids': torch.randint(0, 32, (4, 16))}])
+    param = {k: v.detach() for k, v in model.named_parameters()}
+    return param, *build_smoothquant_int8(param, act_scales)
+
+
+def test_mixed_precision_plan_keeps_fused_linears_within_budget():
+    from flash_rl.flash_quantization import plan_mixed_precision
+
+    _, profile, _ = _calibrated_int8(_tiny_causal_lm())
+    int8 = {k: e for k, e in profile.items() if e['type'] == torch.int8}
+    assert all(e['error'] > 0 for e in int8.values())
+
+    assert plan_mixed_precision(profile, 0.0) == []
+    assert plan_mixed_precision(profile, 1.0) == sorted(int8)
+    profile['model.layers.1.self_attn.k_proj.weight']['error'] = 1.0
+    plan = plan_mixed_precision(profile, 0.2)
+    assert {'model.layers.1.self_attn.q_proj.weight', 'model.layers.1.self_attn.k_proj.weight',
+            'model.layers.1.self_attn.v_proj.weight'} <= set(plan)
+    assert sum(profile[k]['numel'] for k in plan) <= 0.2 * sum(e['numel'] for e in int8.values())
+
+    with pytest.raises(ValueError):
+        plan_mixed_precision({'layer.weight': {'input_scale': 1., 'output_scale': 1., 'type': torch.int8}}, 0.1)
+
+
+def test_all_bf16_plan_reproduces_the_original_model():
+    from flash_rl.flash_quantization import apply_mixed_precision_plan, flash_quantize, plan_mixed_precision
+
+    model = _tiny_causal_lm()
+    param, profile, _ = _calibrated_int8(model)
+    mixed = apply_mixed_precision_plan(profile, plan_mixed_precision(profile, 1.0))
+    # smoothed layernorms and re-scaled bf16 linears compute the same function
+    smoothed = _tiny_causal_lm()
+    smoothed.load_state_dict(dict(flash_quantize(iter(param.items()), mixed)))
+
+    input_ids = torch.randint(0, 32, (2, 12))
+    with torch.no_grad():
+        expected, actual = model(input_ids).logits, smoothed(input_ids).logits
+    assert torch.allclose(actual, expected, atol=1e-4)
+
+
+def test_save_mixed_precision_checkpoint(tmp_path):
+    transformers = pytest.importorskip("transformers")
+    tokenizers = pytest.importorskip("tokenizers")
+    from safetensors.torch import load_file
+
+    from flash_rl.flash_quantization import (
+        apply_mixed_precision_plan, flash_quantize, save_mixed_precision_checkpoint, save_w8a8_checkpoint,
+    )
+
+    model = _tiny_causal_lm()
+    param, profile, qparam = _calibrated_int8(model)
+    model.save_pretrained(tmp_path / "model")
+    backend = tokenizers.Tokenizer(tokenizers.models.WordLevel({'[UNK]': 0}, unk_token='[UNK]'))
+    tokenizer = transformers.PreTrainedTokenizerFast(tokenizer_object=backend, unk_token='[UNK]')
+    save_w8a8_checkpoint(model, tokenizer, qparam, str(tmp_path / "w8a8"))
+    plan = [f'model.layers.0.mlp.{x}_proj.weight' for x in ('gate', 'up')]
+
+    save_mixed_precision_checkpoint(str(tmp_path / "model"), str(tmp_path / "w8a8"), profile, plan, str(tmp_path / "mixed"))
+
+    checkpoint = load_file(tmp_path / "mixed" / "model.safetensors")
+    config = transformers.AutoConfig.from_pretrained(tmp_path / "mixed")
+    assert config.quantization_config['ignore'] == ['lm_head', 'model.layers.0.mlp.gate_proj', 'model.layers.0.mlp.up_proj']
+    mixed = dict(flash_quantize(iter(param.items()), apply_mixed_precision_plan(profile, plan)))
+    for name in plan:
+        assert name + '_scale' not in checkpoint
+        assert torch.equal(checkpoint[name], mixed[name])
+    assert checkpoint['model.layers.0.mlp.down_proj.weight'].dtype == torch.int8
+    assert 'model.layers.0.mlp.down_proj.weight_scale' in checkpoint
+
+
+def _moe_weights(num_layers=2, num_experts=4, hidden=32, inter=16):
+    torch.manual_seed(0)
+    weights = []
+    for layer in range(num_layers):
+        prefix = f'model.layers.{layer}.'
+        weights.append((prefix + 'self_attn.o_proj.weight', torch.randn(hidden, hidden, dtype=torch.bfloat16)))
+        for e in range(num_experts):
+            for proj, shape in (('gate_proj', (inter, hidden)), ('up_proj', (inter, hidden)), ('down_proj', (hidden, inter))):
+                weights.append((prefix + f'mlp.experts.{e}.{proj}.weight', torch.randn(shape, dtype=torch.bfloat16)))
+        weights.append((prefix + 'mlp.gate.weight', torch.randn(num_experts, hidden, dtype=torch.bfloat16)))
+    return weights
+
+
+def test_expert_batcher_stacks_complete_weights():
+    from flash_rl.flash_quantization import ExpertBatcher
+
+    batcher = ExpertBatcher('cpu')
+    weights = [(n, t) for n, t in _moe_weights(num_layers=2, num_experts=3) if '.experts.' in n]
+    ready = []
+    for name, tensor in reversed(weights[:9]):
+        ready += batcher.add(name, tensor, num_experts=3)
+    # each weight is handed out once its three experts arrived, in expert order
+    assert [b.name for b in ready] == [f'model.layers.0.mlp.experts.{p}.weight' for p in ('down_proj', 'up_proj', 'gate_proj')]
+    assert ready[0].experts == [0, 1, 2] and ready[0].tensor.shape == (3, 32, 16)
+    assert torch.equal(ready[0].tensor[1], dict(weights)['model.layers.0.mlp.experts.1.down_proj.weight'])
+
+    # without expert counts, pending weights are handed out when the stream leaves the layer
+    assert batcher.add(weights[9][0], weights[9][1]) == []
+    assert [b.name for b in batcher.add(*weights[0])] == ['model.layers.1.mlp.experts.gate_proj.weight']
+    assert [b.experts for b in batcher.flush()] == [[0]]
+
+
+@pytest.mark.parametrize("fn", ['fp8_channel', 'fp8_tensor', 'fp8_block'])
+def test_batched_expert_fp8_quantization_matches_per_expert(fn):
+    from flash_rl.flash_quantization import get_quantize_fn, stack_expert_names
+
+    weights = _moe_weights()
+    names = [n for n, _ in weights if 'proj' in n]
+    quantize = get_quantize_fn(fn)
+
+    batched = dict(quantize(iter(weights), stack_expert_names(names)))
+    reference = dict(quantize(iter(weights), names))
+
+    assert len(stack_expert_names(names)) == 2 * 4
+    assert set(batched) == set(reference)
+    for name, tensor in reference.items():
+        assert batched[name].shape == tensor.shape, name
+        assert torch.equal(batched[name].float(), tensor.float()), name
+
+
+def test_stacked_expert_tensor_is_quantized_per_row():
+    from flash_rl.flash_quantization import flash_quantize_fp8_channel
+
+    stacked = torch.randn(4, 16, 32, dtype=torch.bfloat16)
+    name = 'model.layers.0.mlp.experts.gate_up_proj'
+    (_, weight), (_, scale) = flash_quantize_fp8_channel(iter([(name, stacked)]), [name])
+    assert weight.shape == (4, 16, 32) and scale.shape == (4, 16, 1)
+    assert torch.allclose(scale, stacked.float().abs().amax(dim=-1, keepdim=True) / 448.)
+
+
+def test_int8_moe_profile_is_stacked_and_batched():
+    from flash_rl.flash_quantization import build_int8_profile, flash_quantize, plan_mixed_precision
+
+    param = dict(_moe_weights())
+    qparam = dict()
+    for name, w in param.items():
+        if 'proj' in name:
+            qparam[name + '_scale'] = w.float().abs().amax(dim=1) / 127.
+            qparam[name] = torch.round(w.float() / qparam[name + '_scale'].view(-1, 1)).to(torch.int8)
+
+    profile = build_int8_profile(param, qparam)
+    entry = profile['model.layers.1.mlp.experts.down_proj.weight']
+    assert entry['num_experts'] == 4 and entry['output_scale'].shape == (4, 32, 1)
+    assert entry['numel'] == 4 * 32 * 16 and 0 < entry['error'] < 1e-3
+    assert not any('.experts.0.' in k for k in profile)
+    assert all('experts' not in k for k in plan_mixed_precision(profile, 1.0))
+
+    quantized = dict(flash_quantize(iter(param.items()), profile))
+    assert set(quantized) == set(param)
+    for name in qparam:
+        if not name.endswith('_scale'):
+            assert (quantized[name].int() - qparam[name].int()).abs().max() <= 1, name
@@ -0,0 +1,135 @@
+import pytest
+
+torch = None
+try:
+    import torch  # type: ignore
+except Exception:  # pragma: no cover - allow environments without torch
+    pass
+
+
+pytestmark = pytest.mark.skipif(
+    torch is None, reason="torch is required for packed output tests"
+)
+
+
+def test_pack_groups_per_request_in_step_order():
+    from flash_rl.packed_outputs import PackedLogprobCollector
+
+    batch = {}
+    collector = PackedLogprobCollector(lambda: batch["ids"])
+    schedule = [
+        [("a", -1.0), ("b", -2.0)],
+        [("a", -1.1), ("b", -2.1)],
+        [("b", -2.2), ("c", -3.0)],
+        [("c", -3.1)],
+    ]
+    for step in schedule:
+        batch["ids"] = [r for r, _ in step]
+        collector.record(torch.tensor([v for _, v in step]))
+
+    packed = collector.pack()
+    assert packed.request_ids == ["a", "b", "c"]
+    assert packed.offsets.tolist() == [0, 2, 5, 7]
+    assert torch.allclose(packed.values, torch.tensor([-1.0, -1.1, -2.0, -2.1, -2.2, -3.0, -3.1]))
+
+    # selected order, and leading samples beyond the output length dropped (discarded prefill chunk)
+    packed = collector.pack([("c", 2), ("b", 2)])
+    assert packed.request_ids == ["c", "b"]
+    assert packed.offsets.tolist() == [0, 2, 4]
+    assert torch.allclose(packed.values, torch.tensor([-3.0, -3.1, -2.1, -2.2]))
+
+
+def test_pack_carries_diagnostics_with_the_logprobs():
+    from flash_rl.packed_outputs import PackedLogprobCollector
+
+    batch = {}
+    collector = PackedLogprobCollector(lambda: batch["ids"])
+    for ids, values in ((["a", "b"], [-1.0, -2.0]), (["b"], [-2.5])):
+        batch["ids"] = ids
+        values = torch.tensor(values)
+        collector.record(values, post_filter_entropy=(-values).half(), filtered_mass=torch.zeros_like(values).half())
+
+    packed = collector.pack([("b", 2), ("a", 1)])
+    assert set(packed.diagnostics) == {"post_filter_entropy", "filtered_mass"}
+    assert packed.diagnostics["post_filter_entropy"].dtype == torch.float16
+    assert torch.equal(packed.diagnostics["post_filter_entropy"].float(), -packed.values)
+    assert PackedLogprobCollector(lambda: []).pack().diagnostics == {}
+
+
+def test_active_collector_is_scoped():
+    from flash_rl import packed_outputs
+
+    collector = packed_outputs.PackedLogprobCollector(lambda: [])
+    assert packed_outputs.get_active_collector() is None
+    with collector.active():
+        assert packed_outputs.get_active_collector() is collector
+    assert packed_outputs.get_active_collector() is None
+
+
+def _fake_llm(engine_core):
+    from types import SimpleNamespace
+
+    return SimpleNamespace(llm_engine=SimpleNamespace(engine_core=engine_core))
+
+
+def test_generate_packed_with_an_in_process_v1_engine():
+    from types import SimpleNamespace
+
+    from flash_rl.packed_outputs import find_model_runner, generate_packed, get_active_collector
+
+    # V1 with the engine core in process and no `model_executor` on the engine, as with a
+    # bf16 config, where the quantized-load branch never touches the engine
+    runner = SimpleNamespace(input_batch=SimpleNamespace(req_ids=["0", "1"]))
+    executor = SimpleNamespace(driver_worker=SimpleNamespace(worker=SimpleNamespace(model_runner=runner)))
+    llm = _fake_llm(SimpleNamespace(engine_core=SimpleNamespace(model_executor=executor)))
+    assert find_model_runner(llm) is runner
+
+    def generate(prompts):
+        for step in range(2):
+            values = torch.tensor([-1.0, -2.0]) - step
+            get_active_collector().record(values, post_filter_entropy=torch.ones(2).half())
+        return [
+            SimpleNamespace(request_id=r, outputs=[SimpleNamespace(token_ids=[7, 8])]) for r in ("1", "0")
+        ]
+
+    llm.generate = generate
+    outputs, packed = generate_packed(llm, ["a", "b"])
+    assert [o.request_id for o in outputs] == packed.request_ids == ["1", "0"]
+    assert torch.allclose(packed.values, torch.tensor([-2.0, -3.0, -1.0, -2.0]))
+    assert torch.equal(packed.diagnostics["post_filter_entropy"], torch.ones(4).half())
+    assert get_active_collector() is None
+
+
+def test_generate_packed_with_several_completions_per_request():
+    from types import SimpleNamespace
+
+    from flash_rl.packed_outputs import generate_packed, get_active_collector
+
+    # n=2: vLLM V1 schedules one child request "{index}_{parent}" per completion
+    runner = SimpleNamespace(input_batch=SimpleNamespace(req_ids=["0_a", "1_a"]))
+    executor = SimpleNamespace(driver_worker=SimpleNamespace(worker=SimpleNamespace(model_runner=runner)))
+    llm = _fake_llm(SimpleNamespace(engine_core=SimpleNamespace(model_executor=executor)))
+
+    def generate(prompts):
+        get_active_collector().record(torch.tensor([-1.0, -2.0]))
+        runner.input_batch.req_ids = ["1_a"]
+        get_active_collector().record(torch.tensor([-3.0]))
+        completions = [SimpleNamespace(index=1, token_ids=[5, 6]), SimpleNamespace(index=0, token_ids=[4])]
+        return [SimpleNamespace(request_id="a", outputs=completions)]
+
+    llm.generate = generate
+    _, packed = generate_packed(llm, ["a"])
+    assert packed.request_ids == ["1_a", "0_a"]
+    assert torch.equal(packed.offsets, torch.tensor([0, 2, 3]))
+    assert torch.allclose(packed.values, torch.tensor([-2.0, -3.0, -1.0]))
+
+
+def test_find_model_runner_rejects_an_out_of_process_engine():
+    from types import SimpleNamespace
+
+    from flash_rl.packed_outputs import find_model_runner
+
+    # V1 multiprocessing: the client only talks to the engine core over a socket
+    llm = _fake_llm(SimpleNamespace(outputs_queue=None))
+    with pytest.raises(RuntimeError, match="model runner in this process"):
+        find_model_runner(llm)
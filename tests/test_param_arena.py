@@ -0,0 +1,70 @@
+import pytest
+
+torch = None
+try:
+    import torch  # type: ignore
+except Exception:  # pragma: no cover - allow environments without torch
+    pass
+
+
+pytestmark = pytest.mark.skipif(
+    torch is None, reason="torch is required for param arena tests"
+)
+
+
+def _make_module():
+    m = torch.nn.Module()
+    m.a = torch.nn.Parameter(torch.randn(4, 6), requires_grad=False)
+    # transposed layout, as produced by fp8 process_weights_after_loading
+    m.b = torch.nn.Parameter(torch.randn(5, 3).t(), requires_grad=False)
+    m.c = torch.nn.Parameter(torch.arange(7, dtype=torch.int8), requires_grad=False)
+    return m
+
+
+def test_arena_rebinds_params_with_same_layout():
+    from flash_rl.param_arena import ParamArena
+
+    m = _make_module()
+    before = {n: (p.detach().clone(), p.stride()) for n, p in m.named_parameters()}
+    arena = ParamArena.from_module(m)
+
+    assert len(arena.buffers) == 2  # float32 and int8
+    for name, p in m.named_parameters():
+        value, stride = before[name]
+        assert torch.equal(p.data, value)
+        assert p.stride() == stride
+        assert arena.owns(p.data)
+        assert (p.data.data_ptr() - arena.buffers[(p.device, p.dtype)].data_ptr()) % 256 == 0
+
+
+def test_arena_bulk_copy():
+    from flash_rl.param_arena import ParamArena
+
+    src, dst = _make_module(), _make_module()
+    src_arena = ParamArena.from_module(src)
+    dst_arena = ParamArena.from_module(dst)
+    dst_arena.copy_from(src_arena)
+    for (_, p), (_, q) in zip(src.named_parameters(), dst.named_parameters()):
+        assert torch.equal(p.data, q.data)
+
+
+@pytest.mark.parametrize("fn", ["int8", "fp8_channel"])
+def test_arena_built_at_load_keeps_pointers_across_reloads(fn, monkeypatch):
+    from flash_rl import weight_reload
+    from flash_rl.bench.mock_vllm import build_mock_model
+    from flash_rl.bench.shapes import synthetic_layers
+
+    spec = {'hidden_size': 64, 'intermediate_size': 128, 'num_attention_heads': 4, 'num_key_value_heads': 2}
+    monkeypatch.setattr(weight_reload, 'flat_param_arena_on_load', True)
+    model, _ = build_mock_model(spec, num_layers=2, fn=fn, module_attribute_to_preserve=['workspace'])
+
+    # built by the initial post-processing, i.e., before an engine would capture graphs
+    arena = model.flashrl_param_arena
+    assert all(arena.owns(p.data) for _, p in model.named_parameters())
+    pointers = {n: (p.data_ptr(), p.shape, p.stride()) for n, p in model.named_parameters()}
+
+    for seed in (1, 2):
+        weights = synthetic_layers(spec, num_layers=2, seed=seed)
+        model.load_weights(iter(weights.items()))
+        assert {n: (p.data_ptr(), p.shape, p.stride()) for n, p in model.named_parameters()} == pointers
+    assert model.flashrl_param_arena is arena
@@ -0,0 +1,79 @@
+import pytest
+
+torch = None
+try:
+    import torch  # type: ignore
+except Exception:  # pragma: no cover - allow environments without torch
+    pass
+
+
+pytestmark = pytest.mark.skipif(
+    torch is None, reason="torch is required for pinned staging tests"
+)
+
+
+def test_stage_to_cpu_is_passthrough():
+    from flash_rl.pinned_staging import stage_to_device
+
+    t = torch.randn(3, 5)
+    assert torch.equal(stage_to_device(t, 'cpu'), t)
+
+
+class _FakeEvent:
+    def __init__(self, log, seq):
+        self.log, self.seq = log, seq
+        log.append(('record', seq))
+
+    def synchronize(self):
+        self.log.append(('wait', self.seq))
+
+
+def _fake_ring(slot_bytes, num_slots):
+    from flash_rl.pinned_staging import PinnedStagingRing
+
+    class FakeRing(PinnedStagingRing):
+        """Host-only ring: pageable slots and events that log when they are waited on."""
+
+        def _allocate(self):
+            self.slots = [torch.empty(self.slot_bytes, dtype=torch.uint8) for _ in range(self.num_slots)]
+            self.log = []
+
+        def _record_event(self, device):
+            return _FakeEvent(self.log, sum(kind == 'record' for kind, _ in self.log))
+
+    return FakeRing(slot_bytes=slot_bytes, num_slots=num_slots)
+
+
+def test_ring_slot_bookkeeping_without_cuda():
+    ring = _fake_ring(slot_bytes=64, num_slots=3)
+    src = torch.randint(0, 256, (300,), dtype=torch.uint8)  # 5 chunks, the last one partial
+    dst = torch.empty_like(src)
+    ring._stage(src, dst, 'cpu')
+
+    assert torch.equal(dst, src)
+    # slots are reused round-robin, each only after the upload recorded on it completed
+    assert ring.log == [
+        ('record', 0), ('record', 1), ('record', 2),
+        ('wait', 0), ('record', 3), ('wait', 1), ('record', 4),
+    ]
+    assert ring.next_slot == 2
+
+    # the ring position and pending events carry over to the next tensor
+    small = torch.arange(10, dtype=torch.uint8)
+    out = torch.empty_like(small)
+    ring._stage(small, out, 'cpu')
+    assert torch.equal(out, small)
+    assert ring.log[7:] == [('wait', 2), ('record', 5)]
+    assert ring.next_slot == 0
+
+
+@pytest.mark.skipif(torch is None or not torch.cuda.is_available(), reason="requires CUDA")
+def test_ring_chunks_large_tensor():
+    from flash_rl.pinned_staging import PinnedStagingRing
+
+    ring = PinnedStagingRing(slot_bytes=1024, num_slots=2)
+    src = torch.randn(33, 97).to(torch.bfloat16)  # spans several slots, not slot aligned
+    out = ring.to_device(src, torch.device('cuda'))
+    torch.cuda.synchronize()
+    assert out.device.type == 'cuda'
+    assert torch.equal(out.cpu(), src)
@@ -0,0 +1,90 @@
+import multiprocessing
+
+import pytest
+
+torch = None
+try:
+    import torch  # type: ignore
+except Exception:  # pragma: no cover - allow environments without torch
+    pass
+
+
+pytestmark = pytest.mark.skipif(
+    torch is None, reason="torch is required for shared weights tests"
+)
+
+
+def _expected_weights():
+    g = torch.Generator().manual_seed(0)
+    return [
+        ('model.layers.0.self_attn.q_proj.weight', torch.randn(8, 8, generator=g).to(torch.bfloat16)),
+        ('model.layers.0.input_layernorm.weight', torch.randn(8, generator=g)),
+        ('model.layers.0.mlp.down_proj.weight', torch.randint(-128, 127, (4, 8), dtype=torch.int8, generator=g)),
+    ]
+
+
+def _trainer(manifest_queue, done_event):
+    from flash_rl.shared_weights import SharedWeightPublisher
+
+    publisher = SharedWeightPublisher(device='cpu')
+    manifest_queue.put(publisher.publish(_expected_weights()))
+    done_event.wait(timeout=60)
+    publisher.close()
+
+
+def test_shared_weights_two_processes():
+    from flash_rl.shared_weights import open_shared_weights
+
+    ctx = multiprocessing.get_context('spawn')
+    manifest_queue, done_event = ctx.Queue(), ctx.Event()
+    trainer = ctx.Process(target=_trainer, args=(manifest_queue, done_event))
+    trainer.start()
+    try:
+        manifest = manifest_queue.get(timeout=60)
+        with open_shared_weights(manifest) as shared:
+            received = [(name, tensor.clone()) for name, tensor in shared.iter_weights()]
+    finally:
+        done_event.set()
+        trainer.join(timeout=60)
+
+    expected = _expected_weights()
+    assert [n for n, _ in received] == [n for n, _ in expected]
+    for (_, r), (_, e) in zip(received, expected):
+        assert r.dtype == e.dtype
+        assert torch.equal(r, e)
+
+
+def test_shared_weights_reuses_buffer_in_process():
+    from flash_rl.shared_weights import SharedWeightPublisher, open_shared_weights
+
+    publisher = SharedWeightPublisher(device='cpu')
+    try:
+        first = publisher.publish(_expected_weights())
+        second = publisher.publish(_expected_weights())
+        assert first['handle'] == second['handle']
+        assert second['version'] == first['version'] + 1
+        with open_shared_weights(second) as shared:
+            views = dict(shared.iter_weights())
+            # same-process receivers map the publisher buffer directly
+            assert views['model.layers.0.input_layernorm.weight'].data_ptr() >= publisher.buffer.data_ptr()
+            del views
+    finally:
+        publisher.close()
+
+
+def test_shared_weights_unlinked_while_views_are_alive():
+    from multiprocessing import shared_memory
+
+    from flash_rl.shared_weights import SharedWeightPublisher
+
+    publisher = SharedWeightPublisher(device='cpu')
+    manifest = publisher.publish(_expected_weights())
+    _, name = manifest['handle']
+    shm = publisher._shm
+    exported = shm.buf[:8]  # a live export of the mapping makes close() raise BufferError
+    publisher.close()
+
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+    exported.release()
+    shm.close()
@@ -0,0 +1,75 @@
+import pytest
+
+torch = None
+try:
+    import torch  # type: ignore
+except Exception:  # pragma: no cover - allow environments without torch
+    pass
+
+
+pytestmark = pytest.mark.skipif(
+    torch is None, reason="torch is required for snapshot tests"
+)
+
+
+def _make_module(fill=None):
+    m = torch.nn.Module()
+    m.layer = torch.nn.Module()
+    m.layer.weight = torch.nn.Parameter(torch.randn(8, 4).t(), requires_grad=False)
+    m.layer.weight_scale = torch.nn.Parameter(torch.rand(8, 1), requires_grad=False)
+    m.layer.workspace = torch.zeros(16, dtype=torch.int32)
+    if fill is not None:
+        for p in m.parameters():
+            p.data.fill_(fill)
+    return m
+
+
+def test_snapshot_roundtrip(tmp_path):
+    from flash_rl import snapshot
+
+    config_hash = snapshot.flashrl_config_hash({'fn': 'fp8_channel'}, 'some/model')
+    src = _make_module()
+    src.layer.workspace.fill_(3)
+    path = snapshot.snapshot_path(str(tmp_path), config_hash, 0, 12)
+    snapshot.save_snapshot(src, path, 12, config_hash, ['workspace'])
+
+    assert snapshot.find_snapshot(str(tmp_path), config_hash, 0) == path
+    assert snapshot.find_snapshot(str(tmp_path), config_hash, 1) is None
+
+    dst = _make_module(fill=0.0)
+    step = snapshot.load_snapshot(dst, path, ['workspace'])
+    assert step == 12
+    for (_, p), (_, q) in zip(src.named_parameters(), dst.named_parameters()):
+        assert torch.equal(p.data, q.data)
+        assert p.stride() == q.stride()
+    assert torch.equal(dst.layer.workspace, src.layer.workspace)
+
+
+def test_snapshot_prune_keeps_latest(tmp_path):
+    from flash_rl import snapshot
+
+    m = _make_module()
+    for step in (1, 2, 3):
+        snapshot.save_snapshot(m, snapshot.snapshot_path(str(tmp_path), 'abc', 0, step), step, 'abc')
+    snapshot.prune_snapshots(str(tmp_path), 'abc', 0, keep_last=1)
+    assert [s for s, _ in snapshot.list_snapshots(str(tmp_path), 'abc', 0)] == [3]
+
+
+def test_snapshot_attributes_are_copied_in_place(tmp_path):
+    from flash_rl import snapshot
+
+    src = _make_module()
+    src.layer.workspace.fill_(3)
+    path = snapshot.snapshot_path(str(tmp_path), 'abc', 0, 1)
+    snapshot.save_snapshot(src, path, 1, 'abc', ['workspace'])
+
+    dst = _make_module(fill=0.0)
+    workspace = dst.layer.workspace
+    snapshot.load_snapshot(dst, path, ['workspace'])
+    assert dst.layer.workspace is workspace
+    assert torch.equal(workspace, src.layer.workspace)
+
+    # a differently sized attribute would need a new storage, which captured graphs never see
+    dst.layer.workspace = torch.zeros(8, dtype=torch.int32)
+    with pytest.raises(ValueError, match="layer.workspace"):
+        snapshot.load_snapshot(dst, path, ['workspace'])
@@ -0,0 +1,98 @@
+import math
+
+import pytest
+
+torch = None
+try:
+    import torch  # type: ignore
+except Exception:  # pragma: no cover - allow environments without torch
+    pass
+
+
+pytestmark = pytest.mark.skipif(
+    torch is None, reason="torch is required for TIS tests"
+)
+
+
+def _reference(trainer, rollout, lengths, cap):
+    token, sequence, start = [], [], 0
+    for n in lengths:
+        log_ratio = trainer[start:start + n] - rollout[start:start + n]
+        token.append(torch.exp(log_ratio).clamp(max=cap))
+        sequence.append(min(math.exp(float(log_ratio.sum())), cap))
+        start += n
+    return torch.cat(token), torch.tensor(sequence)
+
+
+def _batch():
+    torch.manual_seed(0)
+    lengths = [5, 1, 0, 9]
+    rollout = -torch.rand(sum(lengths)) * 3
+    trainer = rollout + torch.randn(sum(lengths)) * 0.3
+    return trainer, rollout, lengths
+
+
+def test_packed_offsets_and_lengths_match_reference():
+    from flash_rl.tis import truncated_importance_weights
+
+    trainer, rollout, lengths = _batch()
+    token, sequence = _reference(trainer, rollout, lengths, 1.5)
+    offsets = torch.tensor([0, 5, 6, 6, 15])
+
+    for kwargs in ({"offsets": offsets}, {"lengths": torch.tensor(lengths)}):
+        out = truncated_importance_weights(trainer, rollout, cap=1.5, **kwargs)
+        assert torch.allclose(out.token_weights, token, atol=1e-6)
+        assert torch.allclose(out.sequence_weights, sequence, atol=1e-5)
+        assert float(out.stats["token_truncated_fraction"]) == pytest.approx(float((token == 1.5).float().mean()))
+
+
+def test_padded_ragged_and_numpy_layouts_agree():
+    np = pytest.importorskip("numpy")
+    from flash_rl.tis import truncated_importance_weights
+
+    trainer, rollout, lengths = _batch()
+    packed = truncated_importance_weights(trainer, rollout, lengths=torch.tensor(lengths))
+
+    ragged = truncated_importance_weights(
+        list(torch.split(trainer, lengths)), list(torch.split(rollout, lengths))
+    )
+    assert torch.allclose(ragged.token_weights, packed.token_weights)
+
+    padded_trainer = torch.zeros(len(lengths), max(lengths))
+    padded_rollout = torch.full((len(lengths), max(lengths)), 5.0)
+    mask = torch.arange(max(lengths)).view(1, -1) < torch.tensor(lengths).view(-1, 1)
+    padded_trainer[mask], padded_rollout[mask] = trainer, rollout
+    padded = truncated_importance_weights(padded_trainer, padded_rollout, mask=mask)
+    assert torch.allclose(padded.token_weights[mask], packed.token_weights)
+    assert bool((padded.token_weights[~mask] == 0).all())
+    assert torch.allclose(padded.sequence_weights, packed.sequence_weights)
+    assert torch.allclose(padded.stats["kl"], packed.stats["kl"])
+
+    numpy_out = truncated_importance_weights(trainer.numpy(), rollout.numpy(), lengths=np.array(lengths))
+    assert isinstance(numpy_out.token_weights, np.ndarray)
+    assert np.allclose(numpy_out.sequence_weights, packed.sequence_weights.numpy())
+
+
+def test_weights_are_detached_and_empty_ragged_input_is_rejected():
+    from flash_rl.tis import truncated_importance_weights
+
+    trainer, rollout, lengths = _batch()
+    trainer = trainer.clone().requires_grad_(True)
+    for out in (
+        truncated_importance_weights(trainer, rollout, lengths=torch.tensor(lengths)),
+        truncated_importance_weights(list(torch.split(trainer, lengths)), list(torch.split(rollout, lengths))),
+    ):
+        assert not out.token_weights.requires_grad
+        assert not out.sequence_weights.requires_grad
+        assert not out.log_ratio.requires_grad
+
+    with pytest.raises(ValueError, match="at least one sequence"):
+        truncated_importance_weights([], [])
+
+
+def test_ragged_sequence_length_mismatch_is_rejected():
+    from flash_rl.tis import truncated_importance_weights
+
+    trainer = [torch.zeros(3), torch.zeros(2)]
+    with pytest.raises(ValueError, match="different sequence lengths"):
+        truncated_importance_weights(trainer, [torch.zeros(2), torch.zeros(3)])
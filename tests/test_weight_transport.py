@@ -0,0 +1,139 @@
+import threading
+
+import pytest
+
+torch = None
+try:
+    import torch  # type: ignore
+except Exception:  # pragma: no cover - allow environments without torch
+    pass
+
+
+pytestmark = pytest.mark.skipif(
+    torch is None, reason="torch is required for weight transport tests"
+)
+
+
+def _weights():
+    g = torch.Generator().manual_seed(0)
+    return [
+        ('model.embed_tokens.weight', torch.randn(64, 16, generator=g).to(torch.bfloat16)),
+        ('model.layers.0.input_layernorm.weight', torch.randn(16, generator=g)),
+        ('model.layers.0.mlp.down_proj.weight_scale', torch.rand(16, 1, generator=g)),
+        ('model.layers.0.mlp.down_proj.weight', torch.randint(-128, 127, (16, 32), dtype=torch.int8, generator=g)),
+    ]
+
+
+def _roundtrip(**sender_kwargs):
+    from flash_rl.weight_transport import WeightReceiver, WeightSender
+
+    receiver = WeightReceiver(host='127.0.0.1', port=0, chunk_bytes=256, max_inflight=2)
+    received, stats = [], {}
+
+    def rollout():
+        receiver.accept(timeout=30)
+        for _ in range(2):  # two consecutive syncs over the same connection
+            received.append([(n, t.clone()) for n, t in receiver.receive()])
+
+    thread = threading.Thread(target=rollout)
+    thread.start()
+    sender = WeightSender('127.0.0.1', receiver.port, chunk_bytes=256, max_inflight=2, **sender_kwargs)
+    try:
+        for _ in range(2):
+            stats = sender.send(iter(_weights()))
+    finally:
+        thread.join(timeout=30)
+        sender.close()
+        receiver.close()
+    return received, stats
+
+
+def test_transport_raw_roundtrip():
+    received, stats = _roundtrip()
+    assert stats['tensors'] == 4
+    for sync in received:
+        for (n, r), (m, e) in zip(sync, _weights()):
+            assert n == m and r.dtype == e.dtype
+            assert torch.equal(r, e)
+
+
+def test_transport_int8_wire_quantization():
+    received, _ = _roundtrip(wire_quantization='int8')
+    for (n, r), (_, e) in zip(received[-1], _weights()):
+        assert r.dtype == e.dtype and r.shape == e.shape
+        if e.is_floating_point():
+            tol = e.float().abs().amax() / 127.0
+            assert (r.float() - e.float()).abs().max() <= tol
+        else:
+            assert torch.equal(r, e)
+
+
+def test_transport_producer_failure_aborts_the_receiver():
+    from flash_rl.weight_transport import WeightReceiver, WeightSender
+
+    def failing_weights():
+        yield from _weights()[:2]
+        raise ValueError("trainer weights unavailable")
+
+    receiver = WeightReceiver(host='127.0.0.1', port=0, chunk_bytes=256, max_inflight=2)
+    received, errors = [], []
+
+    def rollout():
+        receiver.accept(timeout=30)
+        try:
+            for n, t in receiver.receive():
+                received.append(n)
+        except RuntimeError as e:
+            errors.append(e)
+        # the abort frame leaves the connection usable for the next sync
+        received.append([n for n, _ in receiver.receive()])
+
+    thread = threading.Thread(target=rollout)
+    thread.start()
+    sender = WeightSender('127.0.0.1', receiver.port, chunk_bytes=256, max_inflight=2)
+    try:
+        with pytest.raises(ValueError, match="unavailable"):
+            sender.send(failing_weights())
+        sender.send(iter(_weights()))
+    finally:
+        thread.join(timeout=30)
+        sender.close()
+        receiver.close()
+
+    assert not thread.is_alive()
+    assert len(errors) == 1 and "trainer weights unavailable" in str(errors[0])
+    assert received[:2] == [n for n, _ in _weights()[:2]]
+    assert received[2] == [n for n, _ in _weights()]
+
+
+def test_transport_abandoned_receive_stops_the_reader():
+    from flash_rl.weight_transport import WeightReceiver, WeightSender
+
+    receiver = WeightReceiver(host='127.0.0.1', port=0, chunk_bytes=256, max_inflight=1)
+    sender_errors = []
+
+    def trainer():
+        sender = WeightSender('127.0.0.1', receiver.port, chunk_bytes=256, max_inflight=1)
+        try:
+            sender.send((f'w.{i}', torch.randn(256, 256)) for i in range(64))
+        except OSError as e:
+            sender_errors.append(e)
+        finally:
+            sender.close()
+
+    thread = threading.Thread(target=trainer)
+    thread.start()
+    try:
+        receiver.accept(timeout=30)
+        weights = receiver.receive()
+        next(weights)
+        # the reader is now blocked on the full queue or on the socket
+        weights.close()
+        assert receiver.sock is None
+        assert not any(t.name == 'flashrl-weight-receiver' for t in threading.enumerate())
+    finally:
+        thread.join(timeout=30)
+        receiver.close()
+
+    assert not thread.is_alive()
+    assert len(sender_errors) == 1